@@ -10,8 +10,6 @@ from flask import (
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_cors import CORS
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_jwt_extended import (
     JWTManager, create_access_token, create_refresh_token,
     jwt_required, get_jwt_identity, get_jwt
@@ -20,6 +18,7 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from dotenv import load_dotenv
 
 from config import config
+from app.ratelimit import RateLimiter, get_remote_address
 
 # Configuração de logging
 logging.basicConfig(
@@ -31,10 +30,8 @@ logger = logging.getLogger(__name__)
 # Inicialização das extensões
 db = SQLAlchemy()
 jwt = JWTManager()
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
-)
+# Limites padrão em RATELIMIT_DEFAULT (config.py)
+limiter = RateLimiter(key_func=get_remote_address)
 
 def create_app(config_name: str = 'default') -> Flask:
     """
@@ -1,26 +1,29 @@
 import os
 import logging
+import time
 import click
-from datetime import timedelta
+from datetime import datetime, timedelta
 from logging.handlers import RotatingFileHandler
 from flask import Flask, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
+from flask_migrate import Migrate, stamp
 from flask_jwt_extended import JWTManager
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_cors import CORS
-from .config import config
-from .models import User, Task, db as db_model
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import config
+from .models import User, Task, TaskTombstone, db as db_model
+from .cache import task_cache
+from .events import StreamsSaturated, task_events
+from .security import HashingOverloaded, password_hasher
+from .metrics import init_metrics, metrics_bp, use_instrumented_pool
+from .profiler import init_profiler
+from .ratelimit import RateLimitUnavailable, limiter
+from .replicas import replica_router
 
 # Initialize extensions
 db = SQLAlchemy()
 migrate = Migrate()
 jwt = JWTManager()
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
-)
 
 def create_app(config_name=None):
     """Create and configure the Flask application.
@@ -38,13 +41,26 @@ def create_app(config_name=None):
     config[config_name].init_app(app)
     
     # Set up logging
-    from .utils import setup_logging
+    from .utils import init_connection_pools, setup_logging
     setup_logging(app)
     
     # Initialize extensions
+    use_instrumented_pool(app)
+    replica_router.init_app(app)
     db_model.init_app(app)
     jwt.init_app(app)
     migrate.init_app(app, db_model)
+    task_cache.init_app(app)
+    task_events.init_app(app)
+    password_hasher.init_app(app)
+    init_connection_pools(app)
+    init_metrics(app)
+    init_profiler(app)
+    
+    # Atrás do Traefik, remote_addr é o do proxy: o endereço do cliente vem do
+    # X-Forwarded-For, contado a partir dos proxies confiáveis
+    if app.config.get('PROXY_FIX_X_FOR'):
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
     
     # Rate limiting configuration
     limiter.init_app(app)
@@ -56,18 +72,113 @@ def create_app(config_name=None):
     # Registra os blueprints
     from .auth import auth_bp
     from .api import api_bp
+    from .health import health_bp, init_health
     
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(api_bp, url_prefix='/api/v1')
+    app.register_blueprint(health_bp)
+    app.register_blueprint(metrics_bp)
+    
+    # Probes (Docker HEALTHCHECK, blackbox) e scrapes não contam no rate limit
+    limiter.exempt(health_bp)
+    limiter.exempt(metrics_bp)
+    init_health(app)
     
     # Adiciona o comando init-db para inicializar o banco de dados
     @app.cli.command('init-db')
     def init_db():
         """Inicializa o banco de dados"""
         with app.app_context():
-            db.create_all()
+            db_model.create_all()
+            # O esquema criado já é o da última migração
+            stamp()
             print('Banco de dados inicializado com sucesso!')
     
+    # Adiciona o comando recount-tasks para recalcular os contadores de tarefas
+    @app.cli.command('recount-tasks')
+    def recount_tasks():
+        """Recalcula os contadores de tarefas de todos os usuários"""
+        with app.app_context():
+            User.recount_task_stats()
+            db_model.session.commit()
+            print('Contadores de tarefas recalculados com sucesso!')
+    
+    # Adiciona o comando prune-tombstones para limpar lápides de tarefas removidas
+    @app.cli.command('prune-tombstones')
+    @click.option('--days', type=int, default=None,
+                  help='Remove lápides mais antigas que N dias')
+    def prune_tombstones(days):
+        """Remove lápides antigas da sincronização incremental"""
+        if days is None:
+            days = app.config['TASKS_TOMBSTONE_RETENTION_DAYS']
+        with app.app_context():
+            removed = TaskTombstone.prune(datetime.utcnow() - timedelta(days=days))
+            db_model.session.commit()
+            print(f'{removed} lápides removidas')
+    
+    # Adiciona o comando delete-user para remover uma conta e suas tarefas
+    @app.cli.command('delete-user')
+    @click.argument('email')
+    @click.option('--batch-size', type=int, default=None,
+                  help='Tarefas removidas por transação')
+    def delete_user(email, batch_size):
+        """Remove um usuário, suas tarefas e lápides em lotes"""
+        if batch_size is None:
+            batch_size = app.config['USER_DELETE_BATCH_SIZE']
+        with app.app_context():
+            user = User.query.filter_by(email=email).first()
+            if user is None:
+                print('Usuário não encontrado')
+                return
+            user_id, total = user.id, user.tasks_total
+            # Desativada primeiro, a conta não recebe escritas durante os lotes
+            user.is_active = False
+            db_model.session.commit()
+            removed = 0
+            while True:
+                count = User.delete_tasks_batch(user_id, batch_size)
+                db_model.session.commit()
+                if not count:
+                    break
+                removed += count
+                print(f'{removed}/{total} tarefas removidas')
+            # O que restou (lápides) sai pelo ON DELETE CASCADE
+            db_model.session.execute(db_model.delete(User).where(User.id == user_id))
+            db_model.session.commit()
+            task_cache.invalidate(user_id)
+            print('Usuário removido com sucesso!')
+    
+    # Adiciona o comando seed para gerar dados sintéticos (testes de escala)
+    @app.cli.command('seed')
+    @click.option('--users', type=int, default=100, help='Número de usuários')
+    @click.option('--tasks', type=int, default=10000, help='Número de tarefas')
+    @click.option('--seed', 'random_seed', type=int, default=42,
+                  help='Semente do gerador (mesma semente, mesmos dados)')
+    @click.option('--batch-size', type=int, default=10000,
+                  help='Linhas por lote (COPY no PostgreSQL, INSERT nos demais)')
+    @click.option('--anchor', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+                  help='Data de referência dos dados (padrão: hoje)')
+    @click.option('--prefix', default='seed', help='Prefixo dos nomes de usuário')
+    def seed(users, tasks, random_seed, batch_size, anchor, prefix):
+        """Gera usuários e tarefas sintéticos em lote"""
+        from .seed import SEED_PASSWORD, seed_database
+        
+        def progress(kind, count):
+            total = users if kind == 'users' else tasks
+            print(f'{kind}: {count}/{total}')
+        
+        with app.app_context():
+            started = time.perf_counter()
+            try:
+                seed_database(users, tasks, seed=random_seed, batch_size=batch_size,
+                              anchor=anchor, prefix=prefix, progress=progress)
+            except ValueError as e:
+                print(str(e))
+                return
+            elapsed = time.perf_counter() - started
+            print(f'{users} usuários e {tasks} tarefas em {elapsed:.1f}s '
+                  f'(senha: {SEED_PASSWORD})')
+    
     # Adiciona o comando create-admin para criar um usuário administrador
     @app.cli.command('create-admin')
     @click.argument('username')
@@ -123,7 +234,29 @@ def create_app(config_name=None):
         return jsonify({
             'error': 'Limite de requisições excedido',
             'message': str(e.description)
-        }), 429
+        }), 429, {'Retry-After': str(getattr(e, 'retry_after', 60))}
+    
+    @app.errorhandler(RateLimitUnavailable)
+    def ratelimit_unavailable_handler(e):
+        return jsonify({
+            'error': 'Serviço temporariamente indisponível',
+            'message': str(e.description)
+        }), 503, {'Retry-After': str(e.retry_after)}
+    
+    @app.errorhandler(HashingOverloaded)
+    def hashing_overloaded_handler(e):
+        db_model.session.rollback()
+        return jsonify({
+            'error': 'Serviço temporariamente sobrecarregado',
+            'message': 'Muitas autenticações simultâneas. Tente novamente em instantes.'
+        }), 503, {'Retry-After': str(e.retry_after)}
+    
+    @app.errorhandler(StreamsSaturated)
+    def streams_saturated_handler(e):
+        return jsonify({
+            'error': 'Serviço temporariamente sobrecarregado',
+            'message': 'Muitos streams abertos. Tente novamente em instantes.'
+        }), 503, {'Retry-After': str(e.retry_after)}
     
     # Shell context
     @app.shell_context_processor
@@ -1,13 +1,340 @@
-from flask import Blueprint, request, jsonify, current_app
+import base64
+import binascii
+import csv
+import io
+import json
+import re
+import time
+from functools import wraps
+
+from flask import (
+    Blueprint, Response, request, jsonify, current_app, g, make_response,
+    stream_with_context
+)
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import tuple_
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 
-from ..models import Task, db
+from ..cache import task_cache
+from ..events import task_events
+from ..models import SEARCH_CONFIG, Task, TaskTombstone, User, db
+from ..ratelimit import get_user_or_remote_address, limiter
+from ..replicas import replica_read
+from ..utils import dumps_json, json_response
 
 # Cria o blueprint da API
 api_bp = Blueprint('api', __name__)
 
+# Um orçamento por usuário, compartilhado por todas as rotas de tarefas
+limiter.limit(
+    lambda: current_app.config['RATELIMIT_TASKS'],
+    key_func=get_user_or_remote_address,
+    scope='tasks'
+)(api_bp)
+
+# Campos aceitos em sort_by; due_date é o único que pode ser nulo
+SORT_FIELDS = ('created_at', 'due_date', 'priority')
+NULLABLE_SORT_FIELDS = ('due_date',)
+
+# Campos de uma tarefa, na ordem de Task.to_dict e do cabeçalho CSV. As
+# leituras selecionam só estas colunas como tuplas, sem montar objetos do ORM
+TASK_FIELDS = ('id', 'title', 'description', 'completed', 'created_at',
+               'updated_at', 'due_date', 'priority', 'user_id')
+TASK_COLUMNS = tuple(getattr(Task, name) for name in TASK_FIELDS)
+
+# Tabela FTS5 do SQLite (ver SQLITE_SEARCH_DDL em models)
+TASKS_FTS = db.table('tasks_fts', db.column('rowid'))
+
+EXPORT_FORMATS = {
+    'ndjson': ('application/x-ndjson', 'ndjson'),
+    'csv': ('text/csv', 'csv'),
+}
+
+def _export_value(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def task_row_dict(row):
+    """Equivalente a Task.to_dict para uma linha de TASK_COLUMNS"""
+    return dict(zip(TASK_FIELDS, row))
+
+def render_ndjson(partitions):
+    """Gera um bloco de linhas JSON por partição de resultados"""
+    for rows in partitions:
+        yield b''.join(dumps_json(task_row_dict(row)) + b'\n' for row in rows)
+
+def render_csv(partitions):
+    """Gera o cabeçalho e depois um bloco CSV por partição de resultados"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(TASK_FIELDS)
+    yield buffer.getvalue()
+    for rows in partitions:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(tuple(map(_export_value, row)) for row in rows)
+        yield buffer.getvalue()
+
+def encode_cursor(sort_by, sort_order, value, task_id):
+    """Gera o token opaco que aponta para a posição após a última tarefa"""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    payload = json.dumps([sort_by, sort_order, value, task_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_cursor(token, sort_by, sort_order):
+    """Decodifica um cursor, validando que ele pertence à mesma ordenação
+
+    Retorna a tupla (valor da coluna de ordenação, id). Lança ValueError se o
+    token estiver corrompido ou tiver sido gerado para outra ordenação.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        cursor_sort_by, cursor_order, value, task_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError('cursor malformado')
+    
+    if cursor_sort_by != sort_by or cursor_order != sort_order:
+        raise ValueError('cursor gerado para outra ordenação')
+    if not isinstance(task_id, int):
+        raise ValueError('cursor malformado')
+    
+    if value is not None:
+        if sort_by == 'priority':
+            if not isinstance(value, int):
+                raise ValueError('cursor malformado')
+        elif sort_by == 'rank':
+            if not isinstance(value, (int, float)):
+                raise ValueError('cursor malformado')
+        else:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValueError('cursor malformado')
+    
+    return value, task_id
+
+# Id acima de qualquer tarefa: (change_seq, SEQ_COMPLETE) é a posição logo
+# após todas as mudanças de um change_seq
+SEQ_COMPLETE = 2 ** 31 - 1
+
+def encode_sync_token(user_id, change_seq, task_id):
+    """Gera o token de sincronização: posição (change_seq, id) já entregue"""
+    payload = json.dumps(['s', user_id, change_seq, task_id], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def decode_sync_token(token, user_id):
+    """Retorna a posição (change_seq, id) de um token do mesmo usuário
+
+    Lança ValueError se o token estiver corrompido ou for de outro usuário.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        kind, token_user_id, change_seq, task_id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise ValueError('token malformado')
+    
+    if kind != 's' or token_user_id != user_id:
+        raise ValueError('token de outro usuário')
+    if not all(isinstance(v, int) and not isinstance(v, bool) for v in (change_seq, task_id)):
+        raise ValueError('token malformado')
+    
+    return change_seq, task_id
+
+def task_changes(user_id, position, limit, include_deleted=True):
+    """Lê as mudanças do usuário após a posição (change_seq, id)
+
+    Retorna (tarefas, ids removidos, nova posição, has_more), com no máximo
+    ``limit`` mudanças na ordem (change_seq, id).
+    """
+    changes = [
+        (row.change_seq, row.id, row)
+        for row in db.session.execute(
+            db.select(*TASK_COLUMNS, Task.change_seq)
+            .where(Task.user_id == user_id, tuple_(Task.change_seq, Task.id) > position)
+            .order_by(Task.change_seq, Task.id)
+            .limit(limit + 1)
+        )
+    ]
+    if include_deleted:
+        changes += [
+            (row.change_seq, row.task_id, None)
+            for row in db.session.execute(
+                db.select(TaskTombstone.change_seq, TaskTombstone.task_id)
+                .where(TaskTombstone.user_id == user_id,
+                       tuple_(TaskTombstone.change_seq, TaskTombstone.task_id) > position)
+                .order_by(TaskTombstone.change_seq, TaskTombstone.task_id)
+                .limit(limit + 1)
+            )
+        ]
+    
+    changes.sort(key=lambda change: change[:2])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    if changes:
+        position = changes[-1][:2]
+    
+    tasks = [task_row_dict(row) for _, _, row in changes if row is not None]
+    deleted = [task_id for _, task_id, row in changes if row is None]
+    return tasks, deleted, tuple(position), has_more
+
+def paginate_tasks(stmt, sort_by, sort_order, limit, cursor=None, sort_field=None,
+                   pinned=False):
+    """Aplica paginação por cursor (keyset) a um SELECT de tarefas
+
+    A ordenação é sempre (coluna, id) no mesmo sentido, com nulos por último,
+    de modo que a página seguinte é obtida por comparação de tupla em vez de
+    OFFSET: o custo de cada página independe da profundidade.
+    
+    ``sort_field`` permite ordenar por uma expressão (ex.: relevância da
+    busca) selecionada em ``stmt`` com o rótulo ``sort_by``. ``pinned``
+    indica que um filtro de igualdade já fixa a coluna de ordenação: o
+    cursor compara só o id (com a tupla, o SQLite deixa de usar a igualdade
+    no índice e volta a ordenar).
+    
+    Retorna (linhas, next_cursor), onde next_cursor é None na última página.
+    """
+    descending = sort_order == 'desc'
+    if sort_field is None:
+        sort_field = getattr(Task, sort_by)
+    
+    value = last_id = None
+    if cursor is not None:
+        value, last_id = decode_cursor(cursor, sort_by, sort_order)
+    
+    def after(key, position):
+        return key < position if descending else key > position
+    
+    def ordered(*columns):
+        return [column.desc() if descending else column.asc() for column in columns]
+    
+    # Busca um registro extra só para saber se existe próxima página
+    if sort_by in NULLABLE_SORT_FIELDS:
+        # Em vez de NULLS LAST (que nenhum índice do SQLite atende e que no
+        # PostgreSQL só casa com um dos sentidos), lê primeiro os valores
+        # não nulos e completa a página com o bloco de nulos ordenado por
+        # id; as duas partes percorrem o índice (user_id, coluna, id)
+        rows = []
+        if cursor is None or value is not None:
+            present = stmt.where(sort_field.isnot(None))
+            if cursor is not None:
+                present = present.where(after(tuple_(sort_field, Task.id), (value, last_id)))
+            rows = db.session.execute(
+                present.order_by(*ordered(sort_field, Task.id)).limit(limit + 1)
+            ).all()
+        if len(rows) <= limit:
+            missing = stmt.where(sort_field.is_(None))
+            if cursor is not None and value is None:
+                missing = missing.where(after(Task.id, last_id))
+            # Ordenar também pela coluna (toda nula) deixa o PostgreSQL ver
+            # que a ordem do índice já serve
+            rows += db.session.execute(
+                missing.order_by(*ordered(sort_field, Task.id)).limit(limit + 1 - len(rows))
+            ).all()
+    else:
+        if cursor is not None and pinned:
+            stmt = stmt.where(after(Task.id, last_id))
+        elif cursor is not None:
+            stmt = stmt.where(after(tuple_(sort_field, Task.id), (value, last_id)))
+        rows = db.session.execute(
+            stmt.order_by(*ordered(sort_field, Task.id)).limit(limit + 1)
+        ).all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(sort_by, sort_order, getattr(last, sort_by), last.id)
+    
+    return rows, next_cursor
+
+def parse_due_date(value):
+    """Converte a data ISO 8601 recebida na API (aceita sufixo Z)"""
+    return datetime.fromisoformat(value.replace('Z', '+00:00')) if value else None
+
+def make_task_etag(task_id, updated_at):
+    """ETag forte de uma tarefa, derivado do id e do updated_at"""
+    return f't{task_id}.{updated_at:%Y%m%d%H%M%S%f}'
+
+def task_list_etag(user_id):
+    """ETag da listagem: muda a cada escrita nas tarefas do usuário"""
+    version = db.session.scalar(db.select(User.task_version).where(User.id == user_id))
+    return None if version is None else f'u{user_id}.v{version}'
+
+def task_etag(user_id, task_id):
+    """ETag atual de uma tarefa, sem carregar o objeto completo"""
+    updated_at = db.session.scalar(
+        db.select(Task.updated_at).where(Task.id == task_id, Task.user_id == user_id)
+    )
+    return None if updated_at is None else make_task_etag(task_id, updated_at)
+
+def conditional(etag_for):
+    """Responde 304 Not Modified quando o If-None-Match coincide com o ETag
+
+    O ETag é calculado por uma consulta barata antes da view; só quando ele
+    mudou a consulta completa e a serialização são executadas.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            etag = etag_for(get_jwt_identity(), *kwargs.values())
+            if etag is None:
+                return view(*args, **kwargs)
+            
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(etag)
+                return response
+            
+            # Lido pelo cache para nunca servir um corpo mais antigo que o ETag
+            g.task_etag = etag
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+        return wrapper
+    return decorator
+
+def if_match_criteria(task_id):
+    """Condição do If-Match para o WHERE das escritas (vazia sem If-Match ou com *)
+
+    Os ETags fortes da tarefa viram os updated_at aceitos, então a checagem
+    acontece no próprio UPDATE/DELETE e não numa leitura anterior.
+    """
+    if not request.if_match or request.if_match.star_tag:
+        return []
+    accepted = []
+    for etag in request.if_match.as_set():
+        match = re.fullmatch(rf't{task_id}\.(\d{{20}})', etag)
+        if match:
+            accepted.append(datetime.strptime(match.group(1), '%Y%m%d%H%M%S%f'))
+    return [Task.updated_at.in_(accepted)]
+
+def next_change_seq(user_id):
+    """CTE com o próximo change_seq do usuário, bloqueando a linha dele
+
+    Usada no WHERE das escritas de uma tarefa: o usuário é bloqueado antes
+    da tarefa, na mesma ordem de record_task_changes, e o valor lido depois
+    da espera é o da última escrita confirmada. O record_task_changes que
+    vem em seguida confirma exatamente essa versão.
+    """
+    return (
+        db.select(User.id, (User.task_version + 1).label('seq'))
+        .where(User.id == user_id).with_for_update()
+        .cte('next_seq').prefix_with('MATERIALIZED')
+    )
+
+def write_failed(task_id, user_id):
+    """Resposta de uma escrita que não encontrou linha: 404 ou, se a tarefa
+    existe, 412 (o If-Match não corresponde mais)"""
+    db.session.rollback()
+    exists = db.session.scalar(
+        db.select(Task.id).where(Task.id == task_id, Task.user_id == user_id)
+    )
+    if exists is None:
+        return jsonify({'error': 'Tarefa não encontrada'}), 404
+    return jsonify({'error': 'A tarefa foi alterada por outra requisição'}), 412
+
 def validate_task_data(data):
     """Valida os dados de uma tarefa"""
     errors = {}
@@ -31,57 +358,363 @@ def validate_task_data(data):
     
     return errors if errors else None
 
+def search_statement(user_id, query):
+    """SELECT das tarefas do usuário que casam com a busca, com a relevância
+
+    No PostgreSQL usa a coluna tsvector indexada (GIN) e websearch_to_tsquery,
+    que aceita qualquer texto digitado; no SQLite usa a tabela FTS5, com cada
+    palavra como termo de prefixo. Retorna (stmt, expressão de relevância), ou
+    (None, None) quando a busca não tem nenhum termo.
+    """
+    if db.session.get_bind().dialect.name == 'postgresql':
+        tsquery = db.func.websearch_to_tsquery(SEARCH_CONFIG, query)
+        search_vector = db.literal_column('tasks.search_vector')
+        # float8 para o valor do cursor voltar idêntico na comparação
+        rank = db.cast(db.func.ts_rank_cd(search_vector, tsquery), db.Float)
+        stmt = db.select(*TASK_COLUMNS, rank.label('rank')).where(
+            search_vector.op('@@')(tsquery)
+        )
+    else:
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return None, None
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # bm25 é menor para os mais relevantes
+        rank = -db.func.bm25(db.literal_column('tasks_fts'))
+        stmt = (
+            db.select(*TASK_COLUMNS, rank.label('rank'))
+            .join(TASKS_FTS, TASKS_FTS.c.rowid == Task.id)
+            .where(db.literal_column('tasks_fts').op('MATCH')(match))
+        )
+    return stmt.where(*task_filters(user_id)), rank
+
+def task_filters(user_id):
+    """Monta os critérios de filtro (completed, priority) a partir da query string"""
+    criteria = [Task.user_id == user_id]
+    
+    completed = request.args.get('completed', type=lambda v: v.lower() == 'true')
+    priority = request.args.get('priority', type=int)
+    
+    if completed is not None:
+        # Literal (e não parâmetro) para casar com o índice parcial de abertas
+        criteria.append(Task.completed == (db.true() if completed else db.false()))
+    
+    if priority in [1, 2, 3]:
+        criteria.append(Task.priority == priority)
+    
+    return criteria
+
 @api_bp.route('/tasks', methods=['GET'])
 @jwt_required()
+@replica_read
+@conditional(task_list_etag)
+@task_cache.cached('list')
 def get_tasks():
-    """Obtém todas as tarefas do usuário"""
+    """Obtém as tarefas do usuário
+
+    Sem ``limit`` nem ``cursor`` na query string, responde como antes da
+    paginação: um array com todas as tarefas. Com qualquer um dos dois, a
+    resposta vira ``{'tasks', 'next_cursor', 'limit'}``, paginada por cursor.
+    """
     try:
         user_id = get_jwt_identity()
-        
-        # Filtros
-        completed = request.args.get('completed', type=lambda v: v.lower() == 'true')
-        priority = request.args.get('priority', type=int)
-        
-        query = Task.query.filter_by(user_id=user_id)
-        
-        if completed is not None:
-            query = query.filter_by(completed=completed)
-            
-        if priority in [1, 2, 3]:
-            query = query.filter_by(priority=priority)
+        stmt = db.select(*TASK_COLUMNS).where(*task_filters(user_id))
         
         # Ordenação
         sort_by = request.args.get('sort_by', 'created_at')
-        sort_order = request.args.get('sort_order', 'desc')
+        sort_order = request.args.get('sort_order', 'desc').lower()
         
-        if sort_by not in ['created_at', 'due_date', 'priority']:
+        if sort_by not in SORT_FIELDS:
             sort_by = 'created_at'
         
-        sort_field = getattr(Task, sort_by)
+        if sort_order != 'asc':
+            sort_order = 'desc'
         
-        if sort_order.lower() == 'asc':
-            tasks = query.order_by(sort_field.asc()).all()
-        else:
-            tasks = query.order_by(sort_field.desc()).all()
+        if 'limit' not in request.args and 'cursor' not in request.args:
+            # Contrato original, mantido para os clientes que não paginam
+            columns = (getattr(Task, sort_by), Task.id)
+            if sort_order == 'desc':
+                ordering = [column.desc() for column in columns]
+            else:
+                ordering = [column.asc() for column in columns]
+            rows = db.session.execute(stmt.order_by(*ordering)).all()
+            return json_response([task_row_dict(row) for row in rows])
+        
+        # Paginação
+        max_limit = current_app.config.get('TASKS_MAX_PAGE_SIZE', 200)
+        limit = request.args.get('limit', current_app.config.get('TASKS_PAGE_SIZE', 50), type=int)
+        limit = max(1, min(limit, max_limit))
+        
+        try:
+            rows, next_cursor = paginate_tasks(
+                stmt, sort_by, sort_order, limit,
+                cursor=request.args.get('cursor') or None,
+                pinned=sort_by == 'priority' and request.args.get('priority', type=int) in [1, 2, 3]
+            )
+        except ValueError:
+            return jsonify({'error': 'Cursor inválido'}), 400
+        
+        return json_response({
+            'tasks': [task_row_dict(row) for row in rows],
+            'next_cursor': next_cursor,
+            'limit': limit
+        })
+    
+    except Exception as e:
+        current_app.logger.error(f'Erro ao buscar tarefas: {str(e)}')
+        return jsonify({'error': 'Erro ao buscar tarefas'}), 500
+
+@api_bp.route('/tasks/search', methods=['GET'])
+@jwt_required()
+def search_tasks():
+    """Busca textual nas tarefas do usuário, por relevância e paginada por cursor
+
+    Aceita os mesmos filtros completed/priority da listagem.
+    """
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'error': 'Informe o termo de busca em q'}), 400
+    
+    try:
+        user_id = get_jwt_identity()
+        max_limit = current_app.config.get('TASKS_MAX_PAGE_SIZE', 200)
+        limit = request.args.get('limit', current_app.config.get('TASKS_PAGE_SIZE', 50), type=int)
+        limit = max(1, min(limit, max_limit))
+        
+        stmt, rank = search_statement(user_id, query)
+        if stmt is None:
+            return json_response({'tasks': [], 'next_cursor': None, 'limit': limit})
         
-        return jsonify([task.to_dict() for task in tasks])
+        try:
+            rows, next_cursor = paginate_tasks(
+                stmt, 'rank', 'desc', limit,
+                cursor=request.args.get('cursor') or None,
+                sort_field=rank
+            )
+        except ValueError:
+            return jsonify({'error': 'Cursor inválido'}), 400
+        
+        return json_response({
+            'tasks': [dict(task_row_dict(row), rank=row.rank) for row in rows],
+            'next_cursor': next_cursor,
+            'limit': limit
+        })
     
     except Exception as e:
         current_app.logger.error(f'Erro ao buscar tarefas: {str(e)}')
         return jsonify({'error': 'Erro ao buscar tarefas'}), 500
 
+@api_bp.route('/tasks/changes', methods=['GET'])
+@jwt_required()
+def get_task_changes():
+    """Sincronização incremental: o que mudou desde o token ``since``
+
+    Retorna as tarefas criadas ou alteradas e os ids das removidas depois da
+    posição do token, na ordem (change_seq, id), e o token da nova posição.
+    As duas consultas usam os índices (user_id, change_seq), então o custo
+    acompanha o número de mudanças e não o total de tarefas. Sem ``since``,
+    começa do zero (sincronização completa, também paginada).
+    """
+    try:
+        user_id = get_jwt_identity()
+        max_limit = current_app.config.get('TASKS_MAX_PAGE_SIZE', 200)
+        limit = request.args.get('limit', max_limit, type=int)
+        limit = max(1, min(limit, max_limit))
+        
+        since = request.args.get('since')
+        position = (0, 0)
+        if since:
+            try:
+                position = decode_sync_token(since, user_id)
+            except ValueError:
+                return jsonify({'error': 'Token de sincronização inválido'}), 400
+            
+            sync_floor = db.session.scalar(db.select(User.sync_floor).where(User.id == user_id))
+            if position[0] < (sync_floor or 0):
+                return jsonify({
+                    'error': 'Token de sincronização expirado',
+                    'message': 'Faça uma sincronização completa, sem o parâmetro since.'
+                }), 410
+        
+        tasks, deleted, position, has_more = task_changes(
+            user_id, position, limit, include_deleted=bool(since)
+        )
+        
+        return json_response({
+            'tasks': tasks,
+            'deleted': deleted,
+            'sync_token': encode_sync_token(user_id, *position),
+            'has_more': has_more
+        })
+    
+    except Exception as e:
+        current_app.logger.error(f'Erro ao buscar alterações de tarefas: {str(e)}')
+        return jsonify({'error': 'Erro ao buscar alterações de tarefas'}), 500
+
+def sse_event(event, data, event_id=None):
+    """Formata um evento Server-Sent Events"""
+    head = f'id: {event_id}\n' if event_id else ''
+    return f'{head}event: {event}\ndata: '.encode() + dumps_json(data) + b'\n\n'
+
+@api_bp.route('/tasks/stream', methods=['GET'])
+@jwt_required()
+def stream_tasks():
+    """Envia as mudanças das tarefas do usuário por Server-Sent Events
+
+    Cada evento ``changes`` traz as tarefas alteradas e os ids removidos, e
+    tem como id um token de sincronização: ao reconectar, o navegador manda
+    o Last-Event-ID e o stream continua dali, lendo do banco o que perdeu.
+    As notificações chegam pelo pub/sub do Redis; entre elas a conexão com o
+    banco volta ao pool e só comentários de heartbeat são enviados. Cada
+    stream ocupa uma thread do worker: acima de TASKS_STREAM_MAX_PER_WORKER
+    a resposta é 503 com Retry-After. Para manter milhares de streams
+    abertos, esta rota é servida por workers gevent (serviço ``stream`` do
+    docker-compose.yml, ver gunicorn.conf.py).
+    """
+    user_id = get_jwt_identity()
+    token = request.headers.get('Last-Event-ID') or request.args.get('since')
+    if token:
+        try:
+            position = decode_sync_token(token, user_id)
+        except ValueError:
+            return jsonify({'error': 'Token de sincronização inválido'}), 400
+        sync_floor = db.session.scalar(db.select(User.sync_floor).where(User.id == user_id))
+        if position[0] < (sync_floor or 0):
+            return jsonify({
+                'error': 'Token de sincronização expirado',
+                'message': 'Faça uma sincronização completa, sem o parâmetro since.'
+            }), 410
+    else:
+        # Sem token, apenas o que mudar a partir de agora
+        version = db.session.scalar(db.select(User.task_version).where(User.id == user_id))
+        position = (version or 0, SEQ_COMPLETE)
+    db.session.close()
+    
+    config = current_app.config
+    heartbeat = config.get('TASKS_STREAM_HEARTBEAT', 15)
+    max_duration = config.get('TASKS_STREAM_MAX_DURATION', 300)
+    limit = config.get('TASKS_MAX_PAGE_SIZE', 200)
+    # Inscrito antes da leitura inicial: nenhuma escrita cai entre as duas
+    listener = task_events.listen(user_id)
+    
+    @stream_with_context
+    def generate():
+        nonlocal position
+        deadline = time.monotonic() + max_duration
+        try:
+            # Reconexão do EventSource; o stream é encerrado após max_duration
+            yield f'retry: {config.get("TASKS_STREAM_RETRY_MS", 3000)}\n\n'.encode()
+            pending = True
+            while True:
+                while pending:
+                    tasks, deleted, position, pending = task_changes(user_id, position, limit)
+                    db.session.close()
+                    if tasks or deleted:
+                        yield sse_event('changes', {'tasks': tasks, 'deleted': deleted},
+                                        encode_sync_token(user_id, *position))
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return
+                pending = listener.wait(min(heartbeat, remaining))
+                if not pending:
+                    yield b': heartbeat\n\n'
+        except Exception as e:
+            current_app.logger.error(f'Erro no stream de tarefas: {str(e)}')
+        finally:
+            listener.close()
+    
+    response = Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+    # Também quando o cliente desconecta antes do primeiro evento
+    response.call_on_close(listener.close)
+    return response
+
+@api_bp.route('/tasks/export', methods=['GET'])
+@jwt_required()
+def export_tasks():
+    """Exporta todas as tarefas do usuário em NDJSON ou CSV via streaming
+
+    As linhas são lidas com um cursor do lado do servidor (yield_per) e
+    enviadas em blocos à medida que chegam, sem montar objetos do ORM nem o
+    payload completo em memória.
+    """
+    export_format = request.args.get('format', 'ndjson').lower()
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({'error': 'Formato inválido. Use ndjson ou csv'}), 400
+    
+    user_id = get_jwt_identity()
+    batch_size = current_app.config.get('EXPORT_BATCH_SIZE', 1000)
+    stmt = (
+        db.select(*TASK_COLUMNS)
+        .where(*task_filters(user_id))
+        .order_by(Task.id)
+        .execution_options(yield_per=batch_size)
+    )
+    render = render_ndjson if export_format == 'ndjson' else render_csv
+    
+    @stream_with_context
+    def generate():
+        try:
+            result = db.session.execute(stmt)
+            yield from render(result.partitions())
+        except Exception as e:
+            # Os cabeçalhos já foram enviados; resta registrar e encerrar o stream
+            current_app.logger.error(f'Erro ao exportar tarefas: {str(e)}')
+    
+    mimetype, extension = EXPORT_FORMATS[export_format]
+    return Response(generate(), mimetype=mimetype, headers={
+        'Content-Disposition': f'attachment; filename=tasks.{extension}'
+    })
+
+@api_bp.route('/tasks/stats', methods=['GET'])
+@jwt_required()
+def get_task_stats():
+    """Obtém os contadores de tarefas do usuário
+
+    Total, concluídas e por prioridade vêm dos contadores desnormalizados em
+    users; apenas as atrasadas, que dependem do horário atual, são contadas
+    na hora por uma consulta indexada.
+    """
+    try:
+        user_id = get_jwt_identity()
+        user = db.session.get(User, user_id)
+        
+        if not user:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        overdue = db.session.scalar(
+            db.select(db.func.count(Task.id)).where(
+                Task.user_id == user_id,
+                Task.completed == db.false(),
+                Task.due_date < datetime.utcnow()
+            )
+        )
+        
+        return jsonify({**user.task_stats(), 'overdue': overdue})
+    
+    except Exception as e:
+        current_app.logger.error(f'Erro ao buscar estatísticas: {str(e)}')
+        return jsonify({'error': 'Erro ao buscar estatísticas'}), 500
+
 @api_bp.route('/tasks/<int:task_id>', methods=['GET'])
 @jwt_required()
+@replica_read
+@conditional(task_etag)
+@task_cache.cached('task')
 def get_task(task_id):
     """Obtém uma tarefa específica"""
     try:
         user_id = get_jwt_identity()
-        task = Task.query.filter_by(id=task_id, user_id=user_id).first()
+        row = db.session.execute(
+            db.select(*TASK_COLUMNS).where(Task.id == task_id, Task.user_id == user_id)
+        ).first()
         
-        if not task:
+        if not row:
             return jsonify({'error': 'Tarefa não encontrada'}), 404
             
-        return jsonify(task.to_dict())
+        return json_response(task_row_dict(row))
     
     except Exception as e:
         current_app.logger.error(f'Erro ao buscar tarefa {task_id}: {str(e)}')
@@ -100,17 +733,23 @@ def create_task():
         if errors:
             return jsonify({'errors': errors}), 400
         
+        priority = data.get('priority', 2)  # Prioridade padrão: Média
+        change_seq = User.record_task_changes(user_id, added=[(False, priority)])
+        
         # Cria a nova tarefa
         task = Task(
             title=data['title'],
             description=data.get('description', ''),
-            due_date=datetime.fromisoformat(data['due_date'].replace('Z', '+00:00')) if data.get('due_date') else None,
-            priority=data.get('priority', 2),  # Prioridade padrão: Média
-            user_id=user_id
+            due_date=parse_due_date(data.get('due_date')),
+            priority=priority,
+            user_id=user_id,
+            change_seq=change_seq
         )
         
         db.session.add(task)
         db.session.commit()
+        task_cache.invalidate(user_id)
+        task_events.publish(user_id, change_seq)
         
         return jsonify({
             'message': 'Tarefa criada com sucesso',
@@ -125,14 +764,15 @@ def create_task():
 @api_bp.route('/tasks/<int:task_id>', methods=['PUT'])
 @jwt_required()
 def update_task(task_id):
-    """Atualiza uma tarefa existente"""
+    """Atualiza uma tarefa existente
+
+    Um único UPDATE ... RETURNING restrito ao usuário (e ao If-Match, quando
+    enviado) aplica a alteração e devolve também o estado anterior, lido
+    numa CTE com a tarefa bloqueada; depois, um só UPDATE em users acerta
+    contadores e versão.
+    """
     try:
         user_id = get_jwt_identity()
-        task = Task.query.filter_by(id=task_id, user_id=user_id).first()
-        
-        if not task:
-            return jsonify({'error': 'Tarefa não encontrada'}), 404
-        
         data = request.get_json()
         
         # Validação dos dados
@@ -140,29 +780,49 @@ def update_task(task_id):
         if errors:
             return jsonify({'errors': errors}), 400
         
-        # Atualiza os campos
-        task.title = data.get('title', task.title)
-        
-        if 'description' in data:
-            task.description = data['description']
-            
+        values = {'title': data['title'], 'updated_at': datetime.utcnow()}
+        for field in ('description', 'priority', 'completed'):
+            if field in data:
+                values[field] = data[field]
         if 'due_date' in data:
-            task.due_date = datetime.fromisoformat(data['due_date'].replace('Z', '+00:00')) if data['due_date'] else None
-            
-        if 'priority' in data:
-            task.priority = data['priority']
-            
-        if 'completed' in data:
-            task.completed = data['completed']
+            values['due_date'] = parse_due_date(data['due_date'])
         
-        task.updated_at = datetime.utcnow()
+        seq = next_change_seq(user_id)
+        # Materializada no WHERE, antes da alteração: guarda o estado anterior
+        previous = (
+            db.select(Task.id, Task.completed, Task.priority, seq.c.seq)
+            .join(seq, seq.c.id == Task.user_id)
+            .where(Task.id == task_id, *if_match_criteria(task_id))
+            .with_for_update(of=Task)
+            .cte('previous').prefix_with('MATERIALIZED')
+        )
+        row = db.session.execute(
+            db.update(Task).where(Task.id.in_(db.select(previous.c.id)))
+            .values(change_seq=db.select(previous.c.seq).scalar_subquery(), **values)
+            .returning(
+                *TASK_COLUMNS,
+                db.select(previous.c.completed).scalar_subquery().label('was_completed'),
+                db.select(previous.c.priority).scalar_subquery().label('was_priority'),
+            )
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            return write_failed(task_id, user_id)
         
+        change_seq = User.record_task_changes(
+            user_id, added=[(row.completed, row.priority)],
+            removed=[(row.was_completed, row.was_priority)]
+        )
         db.session.commit()
+        task_cache.invalidate(user_id)
+        task_events.publish(user_id, change_seq)
         
-        return jsonify({
+        response = json_response({
             'message': 'Tarefa atualizada com sucesso',
-            'task': task.to_dict()
+            'task': task_row_dict(row)
         })
+        response.set_etag(make_task_etag(row.id, row.updated_at))
+        return response
     
     except Exception as e:
         db.session.rollback()
@@ -172,16 +832,28 @@ def update_task(task_id):
 @api_bp.route('/tasks/<int:task_id>', methods=['DELETE'])
 @jwt_required()
 def delete_task(task_id):
-    """Remove uma tarefa"""
+    """Remove uma tarefa com um único DELETE ... RETURNING"""
     try:
         user_id = get_jwt_identity()
-        task = Task.query.filter_by(id=task_id, user_id=user_id).first()
+        seq = next_change_seq(user_id)
+        row = db.session.execute(
+            db.delete(Task)
+            .where(Task.id == task_id, Task.user_id.in_(db.select(seq.c.id)),
+                   *if_match_criteria(task_id))
+            .returning(Task.completed, Task.priority)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            return write_failed(task_id, user_id)
         
-        if not task:
-            return jsonify({'error': 'Tarefa não encontrada'}), 404
-        
-        db.session.delete(task)
+        change_seq = User.record_task_changes(user_id, removed=[(row.completed, row.priority)])
+        db.session.execute(db.insert(TaskTombstone).values(
+            task_id=task_id, user_id=user_id, change_seq=change_seq,
+            deleted_at=datetime.utcnow()
+        ))
         db.session.commit()
+        task_cache.invalidate(user_id)
+        task_events.publish(user_id, change_seq)
         
         return jsonify({'message': 'Tarefa removida com sucesso'})
     
@@ -193,25 +865,226 @@ def delete_task(task_id):
 @api_bp.route('/tasks/toggle/<int:task_id>', methods=['POST'])
 @jwt_required()
 def toggle_task(task_id):
-    """Alterna o status de conclusão de uma tarefa"""
+    """Alterna o status de conclusão de uma tarefa
+
+    ``SET completed = NOT completed`` no próprio banco: alternâncias
+    simultâneas não se perdem, e o RETURNING dá o novo estado.
+    """
     try:
         user_id = get_jwt_identity()
-        task = Task.query.filter_by(id=task_id, user_id=user_id).first()
-        
-        if not task:
+        seq = next_change_seq(user_id)
+        row = db.session.execute(
+            db.update(Task)
+            .where(Task.id == task_id, Task.user_id.in_(db.select(seq.c.id)))
+            .values(completed=~Task.completed, updated_at=datetime.utcnow(),
+                    change_seq=db.select(seq.c.seq).scalar_subquery())
+            .returning(Task.completed, Task.priority)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            db.session.rollback()
             return jsonify({'error': 'Tarefa não encontrada'}), 404
         
-        task.completed = not task.completed
-        task.updated_at = datetime.utcnow()
-        
+        change_seq = User.record_task_changes(
+            user_id, added=[(row.completed, row.priority)],
+            removed=[(not row.completed, row.priority)]
+        )
         db.session.commit()
+        task_cache.invalidate(user_id)
+        task_events.publish(user_id, change_seq)
         
         return jsonify({
             'message': 'Status da tarefa atualizado com sucesso',
-            'completed': task.completed
+            'completed': row.completed
         })
     
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Erro ao alternar status da tarefa {task_id}: {str(e)}')
         return jsonify({'error': 'Erro ao atualizar status da tarefa'}), 500
+
+BATCH_OPERATIONS = ('create', 'update', 'delete', 'toggle')
+
+def validate_batch(operations):
+    """Valida todas as operações de um lote antes de executar qualquer uma
+
+    Retorna um dicionário {índice: erros}, vazio quando o lote é válido.
+    """
+    errors = {}
+    seen_ids = set()
+    
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in BATCH_OPERATIONS:
+            errors[index] = {'op': f'Operação deve ser uma de: {", ".join(BATCH_OPERATIONS)}'}
+            continue
+        
+        if operation['op'] != 'create':
+            task_id = operation.get('id')
+            if not isinstance(task_id, int) or isinstance(task_id, bool):
+                errors[index] = {'id': 'O id da tarefa é obrigatório'}
+                continue
+            if task_id in seen_ids:
+                errors[index] = {'id': 'Cada tarefa pode aparecer apenas uma vez por lote'}
+                continue
+            seen_ids.add(task_id)
+        
+        if operation['op'] in ('create', 'update'):
+            data = operation.get('data')
+            if not isinstance(data, dict):
+                errors[index] = {'data': 'Os dados da tarefa são obrigatórios'}
+                continue
+            data_errors = validate_task_data(data)
+            if data_errors:
+                errors[index] = data_errors
+    
+    return errors
+
+@api_bp.route('/tasks/batch', methods=['POST'])
+@jwt_required()
+def batch_tasks():
+    """Executa um lote de operações (create, update, delete, toggle)
+
+    Todas as operações são validadas antes da execução e aplicadas numa única
+    transação, agrupadas por tipo em comandos SQL sobre conjuntos: um INSERT
+    de várias linhas, um UPDATE em lote por chave primária e UPDATE/DELETE
+    com ``id IN (...)`` restritos ao usuário.
+    """
+    try:
+        user_id = get_jwt_identity()
+        data = request.get_json(silent=True) or {}
+        operations = data.get('operations')
+        max_operations = current_app.config.get('BATCH_MAX_OPERATIONS', 1000)
+        
+        if not isinstance(operations, list) or not operations:
+            return jsonify({'error': 'Informe uma lista de operações em "operations"'}), 400
+        
+        if len(operations) > max_operations:
+            return jsonify({
+                'error': f'O lote pode ter no máximo {max_operations} operações'
+            }), 400
+        
+        errors = validate_batch(operations)
+        if errors:
+            return jsonify({'errors': errors}), 400
+        
+        indexed = {op: [] for op in BATCH_OPERATIONS}
+        for index, operation in enumerate(operations):
+            indexed[operation['op']].append((index, operation))
+        
+        results = [None] * len(operations)
+        added, removed = [], []
+        now = datetime.utcnow()
+        # Bloqueia a linha do usuário primeiro e reserva o change_seq do lote;
+        # os contadores são ajustados no fim, sem nova versão
+        change_seq = User.record_task_changes(user_id)
+        
+        # INSERT de várias linhas, com os ids na ordem dos parâmetros
+        if indexed['create']:
+            rows = [{
+                'title': op['data']['title'],
+                'description': op['data'].get('description', ''),
+                'due_date': parse_due_date(op['data'].get('due_date')),
+                'priority': op['data'].get('priority', 2),
+                'completed': False,
+                'created_at': now,
+                'updated_at': now,
+                'user_id': user_id,
+                'change_seq': change_seq
+            } for _, op in indexed['create']]
+            new_ids = db.session.scalars(
+                db.insert(Task).returning(Task.id, sort_by_parameter_order=True),
+                rows
+            ).all()
+            for (index, _), task_id in zip(indexed['create'], new_ids):
+                results[index] = {'op': 'create', 'id': task_id, 'status': 201}
+            added.extend((False, row['priority']) for row in rows)
+        
+        # UPDATE em lote por chave primária, apenas para tarefas do usuário
+        if indexed['update']:
+            requested = [op['id'] for _, op in indexed['update']]
+            # Estado anterior (bloqueado até o commit) para ajustar os contadores
+            owned = {
+                row.id: (row.completed, row.priority)
+                for row in db.session.execute(
+                    db.select(Task.id, Task.completed, Task.priority)
+                    .where(Task.user_id == user_id, Task.id.in_(requested))
+                    .with_for_update()
+                )
+            }
+            rows = []
+            for index, op in indexed['update']:
+                if op['id'] not in owned:
+                    results[index] = {'op': 'update', 'id': op['id'], 'status': 404}
+                    continue
+                completed, priority = owned[op['id']]
+                removed.append((completed, priority))
+                added.append((op['data'].get('completed', completed),
+                              op['data'].get('priority', priority)))
+                values = {'id': op['id'], 'title': op['data']['title'], 'updated_at': now,
+                          'change_seq': change_seq}
+                for field in ('description', 'priority', 'completed'):
+                    if field in op['data']:
+                        values[field] = op['data'][field]
+                if 'due_date' in op['data']:
+                    values['due_date'] = parse_due_date(op['data']['due_date'])
+                rows.append(values)
+                results[index] = {'op': 'update', 'id': op['id'], 'status': 200}
+            if rows:
+                db.session.execute(db.update(Task), rows)
+        
+        # UPDATE ... SET completed = NOT completed WHERE user_id = ? AND id IN (...)
+        if indexed['toggle']:
+            toggled = {
+                row.id: row
+                for row in db.session.execute(
+                    db.update(Task)
+                    .where(Task.user_id == user_id,
+                           Task.id.in_([op['id'] for _, op in indexed['toggle']]))
+                    .values(completed=~Task.completed, updated_at=now, change_seq=change_seq)
+                    .returning(Task.id, Task.completed, Task.priority)
+                    .execution_options(synchronize_session=False)
+                )
+            }
+            for row in toggled.values():
+                removed.append((not row.completed, row.priority))
+                added.append((row.completed, row.priority))
+            for index, op in indexed['toggle']:
+                if op['id'] in toggled:
+                    results[index] = {'op': 'toggle', 'id': op['id'], 'status': 200,
+                                      'completed': toggled[op['id']].completed}
+                else:
+                    results[index] = {'op': 'toggle', 'id': op['id'], 'status': 404}
+        
+        # DELETE ... WHERE user_id = ? AND id IN (...)
+        if indexed['delete']:
+            deleted = set()
+            for row in db.session.execute(
+                db.delete(Task)
+                .where(Task.user_id == user_id,
+                       Task.id.in_([op['id'] for _, op in indexed['delete']]))
+                .returning(Task.id, Task.completed, Task.priority)
+                .execution_options(synchronize_session=False)
+            ):
+                deleted.add(row.id)
+                removed.append((row.completed, row.priority))
+            for index, op in indexed['delete']:
+                results[index] = {'op': 'delete', 'id': op['id'],
+                                  'status': 200 if op['id'] in deleted else 404}
+            if deleted:
+                db.session.execute(db.insert(TaskTombstone), [
+                    {'task_id': task_id, 'user_id': user_id, 'change_seq': change_seq,
+                     'deleted_at': now}
+                    for task_id in sorted(deleted)
+                ])
+        
+        User.record_task_changes(user_id, added=added, removed=removed, bump_version=False)
+        db.session.commit()
+        task_cache.invalidate(user_id)
+        task_events.publish(user_id, change_seq)
+        
+        return jsonify({'results': results})
+    
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Erro ao processar lote de tarefas: {str(e)}')
+        return jsonify({'error': 'Erro ao processar lote de tarefas'}), 500
@@ -3,12 +3,15 @@ from flask_jwt_extended import (
     create_access_token, create_refresh_token,
     jwt_required, get_jwt_identity, get_jwt
 )
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy.exc import SQLAlchemyError
 from email_validator import validate_email, EmailNotValidError
 from datetime import timedelta
 import re
 
 from ..models import User, db
+from ..ratelimit import limiter
+from ..replicas import replica_read
+from ..security import HashingOverloaded
 
 # Cria o blueprint de autenticação
 auth_bp = Blueprint('auth', __name__)
@@ -40,7 +43,10 @@ def register():
     
     # Validação do email
     try:
-        email = validate_email(data['email']).email
+        email = validate_email(
+            data['email'],
+            check_deliverability=current_app.config.get('EMAIL_CHECK_DELIVERABILITY', True)
+        ).email
     except EmailNotValidError as e:
         return jsonify({'error': 'Email inválido'}), 400
     
@@ -80,12 +86,17 @@ def register():
             **tokens
         }), 201
         
+    except HashingOverloaded:
+        # Vira 503 com Retry-After no handler da aplicação
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f'Erro ao registrar usuário: {str(e)}')
         return jsonify({'error': 'Erro interno do servidor'}), 500
 
 @auth_bp.route('/login', methods=['POST'])
+@limiter.limit(lambda: current_app.config['RATELIMIT_AUTH_LOGIN'], scope='login')
 def login():
     """Endpoint para login de usuários"""
     data = request.get_json()
@@ -101,6 +112,18 @@ def login():
     if not user.is_active:
         return jsonify({'error': 'Conta desativada'}), 403
     
+    # Atualiza de forma transparente hashes gerados com parâmetros antigos
+    if user.password_needs_rehash():
+        try:
+            user.set_password(data['password'])
+            db.session.commit()
+        except HashingOverloaded:
+            # A senha já foi conferida: sob carga, atualiza num próximo login
+            pass
+        except SQLAlchemyError as e:
+            db.session.rollback()
+            current_app.logger.warning(f'Erro ao atualizar hash da senha: {str(e)}')
+    
     # Gera tokens de acesso
     tokens = user.generate_auth_token()
     
@@ -124,6 +147,7 @@ def refresh():
 
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
+@replica_read
 def get_current_user():
     """Endpoint para obter informações do usuário atual"""
     current_user_id = get_jwt_identity()
@@ -0,0 +1,211 @@
+"""Read-through cache for per-user task reads.
+
+Entries are keyed by user, view and query string. Every entry is stored
+together with the user's version number; writes bump that version, so
+stale entries are never served and simply age out through their TTL.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import redis
+from flask import Flask, current_app, g, make_response, request
+from flask_jwt_extended import get_jwt_identity
+
+from ..utils import redis_pool
+
+
+class SimpleBackend:
+    """In-process backend with TTL and an entry cap (development/tests)."""
+
+    def __init__(self, threshold: int = 500):
+        self.threshold = threshold
+        self._data: 'OrderedDict[str, tuple]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> List[Optional[bytes]]:
+        now = time.monotonic()
+        values = []
+        with self._lock:
+            for key in keys:
+                value, expires_at = self._data.get(key, (None, None))
+                if expires_at is not None and expires_at <= now:
+                    del self._data[key]
+                    value = None
+                values.append(value)
+        return values
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (value, time.monotonic() + ttl)
+            while len(self._data) > self.threshold:
+                self._data.popitem(last=False)
+
+    def incr(self, key: str) -> int:
+        with self._lock:
+            value, _ = self._data.get(key, (b'0', None))
+            value = str(int(value) + 1).encode()
+            # Version keys never expire, like in Redis
+            self._data[key] = (value, None)
+            return int(value)
+
+
+class RedisBackend:
+    """Redis backend.
+
+    Entries are written with SETEX and version keys without a TTL, so a
+    Redis configured with ``maxmemory-policy volatile-lru`` evicts cached
+    pages under memory pressure but never the versions that guard them.
+    """
+
+    def __init__(self, pool: redis.ConnectionPool):
+        self.client = redis.Redis(connection_pool=pool)
+
+    def get_many(self, keys: Iterable[str]) -> List[Optional[bytes]]:
+        return self.client.mget(list(keys))
+
+    def set(self, key: str, value: bytes, ttl: int) -> None:
+        self.client.setex(key, ttl, value)
+
+    def incr(self, key: str) -> int:
+        return self.client.incr(key)
+
+
+class _CacheState:
+    """Per-application cache state stored in ``app.extensions``."""
+
+    def __init__(self, backend: Any, config: Dict[str, Any]):
+        self.backend = backend
+        self.prefix = config.get('CACHE_KEY_PREFIX', 'tm:')
+        self.timeout = config.get('CACHE_DEFAULT_TIMEOUT', 30)
+        self.max_entry_bytes = config.get('CACHE_MAX_ENTRY_BYTES', 256 * 1024)
+        self.retry_interval = config.get('CACHE_RETRY_INTERVAL', 5)
+        self.retry_at = 0.0
+        self.pending: Set[Any] = set()
+        self.lock = threading.Lock()
+
+
+class TaskCache:
+    """Flask extension that caches task reads per user."""
+
+    def __init__(self, app: Optional[Flask] = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        cache_type = str(app.config.get('CACHE_TYPE', 'null')).lower()
+        if cache_type == 'redis':
+            backend = RedisBackend(redis_pool(
+                app, 'cache', app.config['CACHE_REDIS_URL'],
+                app.config.get('CACHE_REDIS_SOCKET_TIMEOUT', 0.25),
+            ))
+        elif cache_type == 'simple':
+            backend = SimpleBackend(app.config.get('CACHE_THRESHOLD', 500))
+        else:
+            backend = None
+        app.extensions['task_cache'] = _CacheState(backend, app.config)
+
+    @staticmethod
+    def _state() -> Optional[_CacheState]:
+        state = current_app.extensions.get('task_cache')
+        if state is None or state.backend is None:
+            return None
+        return state
+
+    def _available(self, state: _CacheState) -> bool:
+        """Skip the backend for a while after a failure, then retry."""
+        if time.monotonic() < state.retry_at:
+            return False
+        if state.pending:
+            with state.lock:
+                pending, state.pending = state.pending, set()
+            try:
+                for user_id in pending:
+                    state.backend.incr(f'{state.prefix}ver:{user_id}')
+            except redis.RedisError as e:
+                with state.lock:
+                    state.pending |= pending
+                self._failed(state, e)
+                return False
+        return True
+
+    def _failed(self, state: _CacheState, error: Exception) -> None:
+        state.retry_at = time.monotonic() + state.retry_interval
+        current_app.logger.warning(
+            f'Task cache unavailable, falling back to the database: {str(error)}'
+        )
+
+    def invalidate(self, user_id: Any) -> None:
+        """Bump the user's version; call after every committed task write."""
+        state = self._state()
+        if state is None:
+            return
+        if not self._available(state):
+            # Replayed once the backend answers again
+            with state.lock:
+                state.pending.add(user_id)
+            return
+        try:
+            state.backend.incr(f'{state.prefix}ver:{user_id}')
+        except redis.RedisError as e:
+            with state.lock:
+                state.pending.add(user_id)
+            self._failed(state, e)
+
+    def cached(self, scope: str) -> Callable:
+        """Cache successful JSON responses of a JWT-protected view."""
+
+        def decorator(view: Callable) -> Callable:
+            @wraps(view)
+            def wrapper(*args: Any, **kwargs: Any) -> Any:
+                state = self._state()
+                if state is None or not self._available(state):
+                    return view(*args, **kwargs)
+
+                user_id = get_jwt_identity()
+                params = sorted(request.args.items(multi=True)) + sorted(kwargs.items())
+                digest = hashlib.sha1(repr(params).encode()).hexdigest()
+                version_key = f'{state.prefix}ver:{user_id}'
+                entry_key = f'{state.prefix}tasks:{user_id}:{scope}:{digest}'
+
+                try:
+                    version, entry = state.backend.get_many([version_key, entry_key])
+                except redis.RedisError as e:
+                    self._failed(state, e)
+                    return view(*args, **kwargs)
+
+                # A ETag validated upstream is part of the version, so a hit
+                # never returns a body older than the ETag sent with it
+                version = (version or b'0') + b':' + g.get('task_etag', '').encode()
+                if entry is not None:
+                    entry_version, _, body = entry.partition(b'\n')
+                    if entry_version == version:
+                        response = current_app.response_class(
+                            body, mimetype='application/json'
+                        )
+                        response.headers['X-Cache'] = 'HIT'
+                        return response
+
+                response = make_response(view(*args, **kwargs))
+                response.headers['X-Cache'] = 'MISS'
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+
+                body = response.get_data()
+                if len(body) <= state.max_entry_bytes:
+                    try:
+                        state.backend.set(entry_key, version + b'\n' + body, state.timeout)
+                    except redis.RedisError as e:
+                        self._failed(state, e)
+                return response
+
+            return wrapper
+
+        return decorator
+
+
+task_cache = TaskCache()
@@ -0,0 +1,242 @@
+"""Per-user task change notifications over Redis pub/sub.
+
+Writes publish the user's new change_seq on ``<prefix>events:<user_id>``
+after commit. Each process keeps a single subscriber connection whose
+reader thread fans messages out to the listeners of that process (one per
+open stream), so thousands of streams cost one Redis connection per
+worker. A notification carries no task data: the stream reads the delta
+from the database, so a listener buffer that overflows loses nothing.
+
+Only the reader thread touches the PubSub object: request threads queue
+their subscribe/unsubscribe requests for it. Once Redis confirms a
+subscription the reader wakes that channel's listeners, so a stream
+re-reads whatever was committed while its subscription was in flight.
+
+Each stream holds a worker thread on gthread workers, so a process serves
+at most TASKS_STREAM_MAX_PER_WORKER streams at once; past that,
+``listen`` raises StreamsSaturated (503 + Retry-After).
+"""
+import math
+import os
+import queue
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+import redis
+from flask import Flask, current_app
+
+from ..utils import redis_pool
+
+
+class StreamsSaturated(Exception):
+    """Raised when this process already serves its maximum of streams."""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Too many open task streams in this worker')
+        self.retry_after = retry_after
+
+
+class Listener:
+    """Bounded buffer of notifications for one stream."""
+
+    def __init__(self, broker: '_Broker', user_id: Any, size: int):
+        self.broker = broker
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize=size)
+
+    def put(self, change_seq: int) -> None:
+        try:
+            self.queue.put_nowait(change_seq)
+        except queue.Full:
+            # The next delta read covers the dropped notifications too
+            pass
+
+    def wait(self, timeout: float) -> bool:
+        """Block until a notification arrives; drain the buffer and return True."""
+        try:
+            self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return False
+        while True:
+            try:
+                self.queue.get_nowait()
+            except queue.Empty:
+                break
+        return True
+
+    def close(self) -> None:
+        """Stop receiving notifications; safe to call more than once."""
+        self.broker.remove(self)
+
+
+class _Broker:
+    """Process-wide fan-out from one subscription to local listeners."""
+
+    poll_interval = 0.25  # seconds the reader waits before applying queued commands
+
+    def __init__(self, client: Optional[redis.Redis], prefix: str, max_streams: int = 0):
+        self.client = client
+        self.prefix = prefix
+        self.max_streams = max_streams
+        self.listeners: Dict[str, Set[Listener]] = {}
+        self.streams = 0
+        self.lock = threading.Lock()
+        # (method, channel) for the reader thread, in the order they were decided
+        self.commands: 'queue.SimpleQueue' = queue.SimpleQueue()
+        self.pubsub = None
+        self.thread = None
+        self.pid = os.getpid()
+
+    def channel(self, user_id: Any) -> str:
+        return f'{self.prefix}events:{user_id}'
+
+    def add(self, listener: Listener, retry_after: int = 1) -> None:
+        channel = self.channel(listener.user_id)
+        with self.lock:
+            if self.max_streams and self.streams >= self.max_streams:
+                raise StreamsSaturated(retry_after)
+            self.streams += 1
+            first = channel not in self.listeners
+            self.listeners.setdefault(channel, set()).add(listener)
+            if first and self.client is not None:
+                self._subscriber()
+                self.commands.put(('subscribe', channel))
+
+    def remove(self, listener: Listener) -> None:
+        channel = self.channel(listener.user_id)
+        with self.lock:
+            listeners = self.listeners.get(channel)
+            if listeners is None or listener not in listeners:
+                return
+            listeners.discard(listener)
+            self.streams -= 1
+            if not listeners:
+                del self.listeners[channel]
+                if self.pubsub is not None:
+                    self.commands.put(('unsubscribe', channel))
+
+    def dispatch(self, channel: str, change_seq: int) -> None:
+        with self.lock:
+            listeners = list(self.listeners.get(channel, ()))
+        for listener in listeners:
+            listener.put(change_seq)
+
+    def _subscriber(self) -> 'redis.client.PubSub':
+        if self.pubsub is None:
+            # Subscribe confirmations are kept: they wake the new listeners
+            self.pubsub = self.client.pubsub()
+            self.thread = threading.Thread(target=self._read, name='task-events', daemon=True)
+            self.thread.start()
+        return self.pubsub
+
+    def _read(self) -> None:
+        while True:
+            try:
+                self._apply_commands()
+                message = self.pubsub.get_message(timeout=self.poll_interval)
+            except redis.RedisError:
+                # Streams keep their heartbeats and catch up from the database
+                time.sleep(1.0)
+                self._resubscribe()
+                continue
+            except (RuntimeError, ValueError):
+                # Not subscribed to anything yet
+                time.sleep(0.1)
+                continue
+            if message is None or message['type'] not in ('message', 'subscribe'):
+                continue
+            channel = message['channel']
+            if isinstance(channel, bytes):
+                channel = channel.decode()
+            if message['type'] == 'subscribe':
+                # Writes committed before this point are read from the database
+                self.dispatch(channel, 0)
+            else:
+                self.dispatch(channel, int(message['data']))
+
+    def _apply_commands(self) -> None:
+        while True:
+            try:
+                method, channel = self.commands.get_nowait()
+            except queue.Empty:
+                return
+            getattr(self.pubsub, method)(channel)
+
+    def _resubscribe(self) -> None:
+        with self.lock:
+            # Every channel is subscribed again below, whatever was queued
+            while not self.commands.empty():
+                self.commands.get_nowait()
+            channels = list(self.listeners)
+            # Wake every stream so it re-reads what it may have missed
+            listeners = [l for group in self.listeners.values() for l in group]
+        for listener in listeners:
+            listener.put(0)
+        try:
+            self.pubsub.reset()
+            if channels:
+                self.pubsub.subscribe(*channels)
+        except redis.RedisError:
+            pass
+
+
+class TaskEvents:
+    """Flask extension publishing task changes and serving listeners."""
+
+    def __init__(self, app: Optional[Flask] = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        backend = str(app.config.get('EVENTS_BACKEND', 'redis')).lower()
+        if backend == 'redis':
+            client = redis.Redis(connection_pool=redis_pool(
+                app, 'events', app.config['EVENTS_REDIS_URL'],
+                app.config.get('EVENTS_REDIS_SOCKET_TIMEOUT', 0.25),
+            ))
+        else:
+            client = None
+        app.extensions['task_events'] = _Broker(
+            client, app.config.get('CACHE_KEY_PREFIX', 'tm:'),
+            app.config.get('TASKS_STREAM_MAX_PER_WORKER', 0),
+        )
+
+    @staticmethod
+    def _broker() -> _Broker:
+        broker = current_app.extensions['task_events']
+        if broker.pid != os.getpid():
+            # The reader thread and its connection do not survive fork
+            broker = current_app.extensions['task_events'] = _Broker(
+                broker.client, broker.prefix, broker.max_streams
+            )
+        return broker
+
+    def publish(self, user_id: Any, change_seq: Optional[int]) -> None:
+        """Notify streams of a committed write; never fails the write."""
+        if change_seq is None:
+            return
+        broker = self._broker()
+        channel = broker.channel(user_id)
+        if broker.client is None:
+            broker.dispatch(channel, change_seq)
+            return
+        try:
+            broker.client.publish(channel, change_seq)
+        except redis.RedisError as e:
+            current_app.logger.warning(f'Task event not published: {str(e)}')
+
+    def listen(self, user_id: Any) -> Listener:
+        """Register a stream; call ``close()`` on the listener when it ends.
+
+        Raises StreamsSaturated when the process is at TASKS_STREAM_MAX_PER_WORKER.
+        """
+        broker = self._broker()
+        config = current_app.config
+        listener = Listener(broker, user_id, config.get('TASKS_STREAM_BUFFER', 16))
+        # The EventSource reconnects on its own after the retry interval
+        broker.add(listener, math.ceil(config.get('TASKS_STREAM_RETRY_MS', 3000) / 1000))
+        return listener
+
+
+task_events = TaskEvents()
@@ -1,13 +1,133 @@
-"""Health check blueprint for the application."""
-from flask import Blueprint, jsonify
+"""Health check blueprint for the application.
 
-from ..utils import check_health
+``/health/live`` answers without any I/O. ``/health/ready`` (and the legacy
+``/health``) report dependency checks that run concurrently, each with its
+own timeout. Results are cached for HEALTH_CHECK_TTL seconds and refreshed
+in the background, so a burst of probes triggers at most one round of
+checks per worker.
+"""
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError
+from datetime import datetime
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Blueprint, Flask, current_app, jsonify
+
+from ..utils import check_database_health, check_redis_health
 
 health_bp = Blueprint('health', __name__)
 
+
+class HealthMonitor:
+    """Runs, caches and refreshes the readiness checks of one application."""
+
+    def __init__(self, app: Flask, checks: Dict[str, Callable[[], Tuple[bool, str]]]):
+        self.app = app
+        self.checks = checks
+        self.ttl = app.config.get('HEALTH_CHECK_TTL', 5)
+        self.max_stale = app.config.get('HEALTH_CHECK_MAX_STALE', 30)
+        self.timeout = app.config.get('HEALTH_CHECK_TIMEOUT', 2)
+        self.lock = threading.Lock()
+        self.result: Optional[Dict[str, Any]] = None
+        self.checked_at = 0.0
+        self.refreshing: Optional[Future] = None
+        self.running: Dict[str, Future] = {}
+        self.pid: Optional[int] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+    def _pool(self) -> ThreadPoolExecutor:
+        # Called with self.lock held; threads do not survive fork
+        if self.pid != os.getpid():
+            self.executor = ThreadPoolExecutor(
+                max_workers=len(self.checks) + 1, thread_name_prefix='health-check'
+            )
+            self.refreshing = None
+            self.running = {}
+            self.pid = os.getpid()
+        return self.executor
+
+    def _run_check(self, check: Callable[[], Tuple[bool, str]]) -> Tuple[bool, str]:
+        with self.app.app_context():
+            return check()
+
+    def _refresh(self) -> Dict[str, Any]:
+        try:
+            result = self._collect()
+        finally:
+            with self.lock:
+                self.refreshing = None
+        with self.lock:
+            self.result, self.checked_at = result, time.monotonic()
+        return result
+
+    def _collect(self) -> Dict[str, Any]:
+        futures = {}
+        with self.lock:
+            pool = self._pool()
+            for name, check in self.checks.items():
+                previous = self.running.get(name)
+                # Never stack a new probe on top of one that is still hanging
+                if previous is None or previous.done():
+                    self.running[name] = pool.submit(self._run_check, check)
+                futures[name] = self.running[name]
+
+        deadline = time.monotonic() + self.timeout
+        services = {}
+        for name, future in futures.items():
+            try:
+                healthy, message = future.result(timeout=max(0, deadline - time.monotonic()))
+            except TimeoutError:
+                healthy, message = False, f'Check timed out after {self.timeout}s'
+            except Exception as e:
+                healthy, message = False, f'Check failed: {str(e)}'
+            services[name] = {
+                'status': 'healthy' if healthy else 'unhealthy',
+                'message': message
+            }
+
+        return {
+            'status': 'healthy' if all(
+                service['status'] == 'healthy' for service in services.values()
+            ) else 'unhealthy',
+            'services': services,
+            'timestamp': datetime.utcnow().isoformat()
+        }
+
+    def status(self) -> Dict[str, Any]:
+        """Return the cached result, refreshing it at most once at a time."""
+        with self.lock:
+            age = time.monotonic() - self.checked_at
+            if self.result is not None and age < self.ttl:
+                return self.result
+            refresh = self.refreshing
+            if refresh is None:
+                refresh = self.refreshing = self._pool().submit(self._refresh)
+            if self.result is not None and age < self.max_stale:
+                # Serve the previous result while the refresh runs in background
+                return self.result
+        return refresh.result()
+
+
+def init_health(app: Flask) -> None:
+    """Attach a HealthMonitor with the default dependency checks."""
+    app.extensions['health'] = HealthMonitor(app, {
+        'database': check_database_health,
+        'redis': check_redis_health,
+    })
+
+
+@health_bp.route('/health/live', methods=['GET'])
+def liveness_check():
+    """Liveness probe: the process is up and serving requests."""
+    return jsonify({'status': 'alive'}), 200
+
+
+@health_bp.route('/health/ready', methods=['GET'])
 @health_bp.route('/health', methods=['GET'])
 def health_check():
-    """Health check endpoint."""
-    health_status = check_health()
+    """Readiness probe: cached result of the dependency checks."""
+    health_status = current_app.extensions['health'].status()
     status_code = 200 if health_status['status'] == 'healthy' else 503
     return jsonify(health_status), status_code
@@ -0,0 +1,180 @@
+"""Prometheus metrics for the application.
+
+Request metrics cover the ``auth`` and ``api`` blueprints; SQL metrics come
+from SQLAlchemy engine events and pool gauges are refreshed on every
+checkout/checkin, labelled by engine (``primary``, a bind key or a
+replica name). When PROMETHEUS_MULTIPROC_DIR is set (gunicorn), every
+worker writes to shared files and ``/metrics`` aggregates them, so any
+worker can answer the scrape.
+"""
+import os
+from time import perf_counter
+from typing import Any
+
+from flask import Blueprint, Flask, Response, g, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Gauge, Histogram, Summary,
+    generate_latest, multiprocess
+)
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+
+from ..models import db
+
+INSTRUMENTED_BLUEPRINTS = ('auth', 'api')
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Request latency by endpoint',
+    ['method', 'endpoint', 'status'],
+    buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+)
+REQUEST_SIZE = Summary(
+    'http_request_size_bytes', 'Request body size by endpoint', ['endpoint']
+)
+RESPONSE_SIZE = Summary(
+    'http_response_size_bytes', 'Response body size by endpoint', ['endpoint']
+)
+IN_FLIGHT = Gauge(
+    'http_requests_in_progress', 'Requests currently being served',
+    ['endpoint'], multiprocess_mode='livesum'
+)
+DB_QUERIES = Counter(
+    'db_queries_total', 'SQL statements executed', ['operation']
+)
+DB_QUERY_LATENCY = Histogram(
+    'db_query_duration_seconds', 'SQL statement latency', ['operation'],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1)
+)
+POOL_CHECKED_OUT = Gauge(
+    'db_pool_checked_out_connections', 'Connections checked out of the pool',
+    ['engine'], multiprocess_mode='livesum'
+)
+POOL_OVERFLOW = Gauge(
+    'db_pool_overflow_connections', 'Connections opened beyond pool_size',
+    ['engine'], multiprocess_mode='livesum'
+)
+POOL_SIZE = Gauge(
+    'db_pool_size', 'Configured pool_size', ['engine'], multiprocess_mode='livesum'
+)
+POOL_WAIT = Histogram(
+    'db_pool_wait_seconds', 'Time spent waiting for a pooled connection',
+    buckets=(.0001, .001, .005, .01, .05, .1, .5, 1, 5, 30)
+)
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    def _do_get(self) -> Any:
+        start = perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(perf_counter() - start)
+
+
+def _operation(statement: str) -> str:
+    operation = statement.lstrip()[:6].lower()
+    return operation if operation in ('select', 'insert', 'update', 'delete') else 'other'
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # Kept on the execution context rather than on the connection: a statement
+    # that raises never reaches after_cursor_execute, and its start time goes
+    # away with the context instead of piling up in conn.info
+    if context is not None:
+        context.metrics_query_start = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    operation = _operation(statement)
+    DB_QUERIES.labels(operation).inc()
+    start = getattr(context, 'metrics_query_start', None)
+    if start is not None:
+        DB_QUERY_LATENCY.labels(operation).observe(perf_counter() - start)
+
+
+def _update_pool_gauges(name: str, pool: QueuePool, returning: int = 0) -> None:
+    # checkin fires before the connection is back in the queue; a full queue
+    # closes it instead, which releases an overflow slot
+    overflow = pool.overflow()
+    if returning and pool.checkedin() >= pool.size():
+        overflow -= returning
+    POOL_CHECKED_OUT.labels(name).set(pool.checkedout() - returning)
+    POOL_OVERFLOW.labels(name).set(max(overflow, 0))
+
+
+def _before_request() -> None:
+    if request.blueprint in INSTRUMENTED_BLUEPRINTS:
+        g.metrics_start = perf_counter()
+        g.metrics_in_flight = request.endpoint
+        IN_FLIGHT.labels(request.endpoint).inc()
+
+
+def _after_request(response: Response) -> Response:
+    start = g.pop('metrics_start', None)
+    if start is not None:
+        endpoint = request.endpoint
+        REQUEST_LATENCY.labels(request.method, endpoint, response.status_code).observe(
+            perf_counter() - start
+        )
+        REQUEST_SIZE.labels(endpoint).observe(request.content_length or 0)
+        if response.content_length is not None:
+            RESPONSE_SIZE.labels(endpoint).observe(response.content_length)
+    return response
+
+
+def _teardown_request(exc: Any) -> None:
+    # Runs even when the request failed before after_request
+    endpoint = g.pop('metrics_in_flight', None)
+    if endpoint is not None:
+        IN_FLIGHT.labels(endpoint).dec()
+
+
+def use_instrumented_pool(app: Flask) -> None:
+    """Make server databases use InstrumentedQueuePool (call before db.init_app)."""
+    uri = app.config.get('SQLALCHEMY_DATABASE_URI') or ''
+    if uri.startswith('sqlite'):
+        return
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+        'poolclass': InstrumentedQueuePool,
+        **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+    }
+
+
+def init_metrics(app: Flask) -> None:
+    """Attach request hooks and engine/pool listeners (call after db.init_app)."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    with app.app_context():
+        engines = {bind or 'primary': engine for bind, engine in db.engines.items()}
+    replicas = app.extensions.get('replica_router')
+    if replicas is not None:
+        engines.update(replicas.engines)
+
+    for name, engine in engines.items():
+        event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
+        pool = engine.pool
+        if isinstance(pool, QueuePool):
+            POOL_SIZE.labels(name).set(pool.size())
+            event.listen(pool, 'checkout', lambda *args, name=name, pool=pool:
+                         _update_pool_gauges(name, pool))
+            event.listen(pool, 'checkin', lambda *args, name=name, pool=pool:
+                         _update_pool_gauges(name, pool, returning=1))
+
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus scrape endpoint."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        data = generate_latest(registry)
+    else:
+        data = generate_latest()
+    return Response(data, content_type=CONTENT_TYPE_LATEST)
@@ -1,11 +1,16 @@
+import sqlite3
+from collections import Counter
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, Iterable, Optional, Tuple
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import create_access_token, create_refresh_token
+from sqlalchemy.engine import Engine
 
-# Inicialização do SQLAlchemy
-db = SQLAlchemy()
+from .replicas import RoutingSession
+from .security import password_hasher
+
+# Inicialização do SQLAlchemy (leituras podem ir para réplicas, ver app.replicas)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     """Modelo de usuário para autenticação"""
@@ -16,17 +21,126 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False, index=True)
     password_hash = db.Column(db.String(128))
     is_active = db.Column(db.Boolean, default=True)
+    is_admin = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    tasks = db.relationship('Task', backref='author', lazy='dynamic', 
-                          cascade='all, delete-orphan')
+    # Incrementado a cada escrita em tarefas do usuário (ETag da listagem)
+    task_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Contadores agregados, mantidos na mesma transação das escritas em tarefas
+    tasks_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tasks_completed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tasks_priority_1 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tasks_priority_2 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    tasks_priority_3 = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # change_seq mais alto cujas lápides já foram removidas; tokens anteriores
+    # a ele não conseguem mais ver todas as remoções
+    sync_floor = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # passive_deletes: remover o usuário não carrega as tarefas, o banco
+    # apaga tarefas e lápides pelo ON DELETE CASCADE das chaves estrangeiras
+    tasks = db.relationship('Task', back_populates='author', lazy='dynamic',
+                          cascade='all, delete-orphan', passive_deletes=True)
     
     def set_password(self, password: str) -> None:
-        """Gera o hash da senha"""
-        self.password_hash = generate_password_hash(password)
+        """Gera o hash da senha (no pool de hashing)"""
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password: str) -> bool:
-        """Verifica a senha"""
-        return check_password_hash(self.password_hash, password)
+        """Verifica a senha (no pool de hashing)"""
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self) -> bool:
+        """Indica se o hash foi gerado com parâmetros diferentes dos atuais"""
+        return password_hasher.needs_rehash(self.password_hash)
+    
+    @staticmethod
+    def record_task_changes(user_id: int,
+                            added: Iterable[Tuple[bool, int]] = (),
+                            removed: Iterable[Tuple[bool, int]] = (),
+                            bump_version: bool = True) -> Optional[int]:
+        """Atualiza contadores e versão na transação corrente
+
+        ``added`` e ``removed`` são estados (completed, priority) de tarefas
+        que entraram ou saíram do conjunto do usuário; uma edição é a remoção
+        do estado antigo mais a adição do novo. Tudo vira um único UPDATE
+        com incrementos relativos, seguro sob concorrência.
+        
+        Retorna a nova versão, que é também o change_seq das tarefas escritas
+        na transação: o UPDATE bloqueia a linha do usuário até o commit, então
+        as versões de um usuário são confirmadas em ordem crescente.
+        """
+        deltas = Counter()
+        for sign, states in ((1, added), (-1, removed)):
+            for completed, priority in states:
+                deltas['tasks_total'] += sign
+                if completed:
+                    deltas['tasks_completed'] += sign
+                if priority in (1, 2, 3):
+                    deltas[f'tasks_priority_{priority}'] += sign
+        
+        values = {'task_version': User.task_version + 1} if bump_version else {}
+        for name, delta in deltas.items():
+            if delta:
+                values[name] = getattr(User, name) + delta
+        if not values:
+            return None
+        return db.session.scalar(
+            db.update(User).where(User.id == user_id).values(**values)
+            .returning(User.task_version)
+        )
+    
+    @staticmethod
+    def delete_tasks_batch(user_id: int, batch_size: int) -> int:
+        """Remove até ``batch_size`` tarefas do usuário sem carregá-las
+
+        Usado antes de remover contas grandes, um lote por transação, para
+        que nenhuma transação segure milhões de linhas. Não mexe em
+        contadores nem cria lápides: a conta inteira vai embora em seguida.
+        """
+        batch = (
+            db.select(Task.id).where(Task.user_id == user_id)
+            .order_by(Task.id).limit(batch_size)
+        )
+        result = db.session.execute(
+            db.delete(Task).where(Task.id.in_(batch))
+            .execution_options(synchronize_session=False)
+        )
+        return result.rowcount
+    
+    @staticmethod
+    def recount_task_stats(user_ids: Optional[Iterable[int]] = None) -> None:
+        """Recalcula os contadores a partir da tabela de tarefas
+        
+        Sem ``user_ids``, recalcula os de todos os usuários.
+        """
+        def count(*criteria):
+            return (
+                db.select(db.func.count(Task.id))
+                .where(Task.user_id == User.id, *criteria)
+                .scalar_subquery()
+            )
+        
+        stmt = db.update(User)
+        if user_ids is not None:
+            stmt = stmt.where(User.id.in_(list(user_ids)))
+        db.session.execute(stmt.values(
+            tasks_total=count(),
+            tasks_completed=count(Task.completed.is_(True)),
+            tasks_priority_1=count(Task.priority == 1),
+            tasks_priority_2=count(Task.priority == 2),
+            tasks_priority_3=count(Task.priority == 3),
+        ))
+    
+    def task_stats(self) -> Dict[str, Any]:
+        """Estatísticas de tarefas a partir dos contadores, sem consultar tasks"""
+        return {
+            'total': self.tasks_total,
+            'completed': self.tasks_completed,
+            'pending': self.tasks_total - self.tasks_completed,
+            'by_priority': {
+                '1': self.tasks_priority_1,
+                '2': self.tasks_priority_2,
+                '3': self.tasks_priority_3
+            }
+        }
     
     def generate_auth_token(self) -> Dict[str, str]:
         """Gera tokens de acesso e refresh"""
@@ -43,7 +157,8 @@ class User(db.Model):
             'email': self.email,
             'is_active': self.is_active,
             'created_at': self.created_at.isoformat(),
-            'tasks_count': self.tasks.count()
+            'tasks_count': self.tasks_total,
+            'task_stats': self.task_stats()
         }
 
 class Task(db.Model):
@@ -59,8 +174,31 @@ class Task(db.Model):
                          onupdate=datetime.utcnow)
     due_date = db.Column(db.DateTime, nullable=True)
     priority = db.Column(db.Integer, default=2)  # 1: Alta, 2: Média, 3: Baixa
-    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), 
-                       nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), 
+                       nullable=False)
+    # Versão do usuário (task_version) na última escrita desta tarefa
+    change_seq = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Índices da listagem: igualdade em user_id (e no filtro, quando há),
+    # depois a coluna de ordenação e o id, na ordem do cursor. Cada
+    # combinação filtro/ordenação de GET /tasks lê a página direto do
+    # índice, sem ordenar (tests/test_indexes.py confere os planos); o
+    # filtro que não está no índice vira uma condição sobre a varredura
+    __table_args__ = (
+        db.Index('ix_tasks_user_id_change_seq', 'user_id', 'change_seq', 'id'),
+        db.Index('ix_tasks_user_id_created_at', 'user_id', 'created_at', 'id'),
+        db.Index('ix_tasks_user_id_completed_created_at',
+                 'user_id', 'completed', 'created_at', 'id'),
+        db.Index('ix_tasks_user_id_due_date', 'user_id', 'due_date', 'id'),
+        # Tarefas abertas por prazo (completed=false ordenado por due_date)
+        # e as atrasadas de /tasks/stats
+        db.Index('ix_tasks_user_id_open_due_date', 'user_id', 'due_date', 'id',
+                 postgresql_where=db.text('completed = false'),
+                 sqlite_where=db.text('completed = 0')),
+        db.Index('ix_tasks_user_id_priority', 'user_id', 'priority', 'id'),
+        db.Index('ix_tasks_user_id_completed_priority',
+                 'user_id', 'completed', 'priority', 'id'),
+    )
     
     def to_dict(self) -> Dict[str, Any]:
         """Converte o objeto para dicionário"""
@@ -83,6 +221,96 @@ class Task(db.Model):
                 setattr(self, key, value)
         self.updated_at = datetime.utcnow()
 
+class TaskTombstone(db.Model):
+    """Registro de uma tarefa removida, para a sincronização incremental"""
+    __tablename__ = 'task_tombstones'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    task_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'),
+                        nullable=False)
+    change_seq = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        db.Index('ix_task_tombstones_user_id_change_seq', 'user_id', 'change_seq', 'task_id'),
+        db.Index('ix_task_tombstones_deleted_at', 'deleted_at'),
+    )
+    
+    @staticmethod
+    def prune(before: datetime) -> int:
+        """Remove lápides antigas, subindo o sync_floor dos usuários afetados"""
+        pruned = (
+            db.select(db.func.max(TaskTombstone.change_seq))
+            .where(TaskTombstone.user_id == User.id, TaskTombstone.deleted_at < before)
+            .scalar_subquery()
+        )
+        db.session.execute(
+            db.update(User)
+            .where(db.exists().where(TaskTombstone.user_id == User.id,
+                                     TaskTombstone.deleted_at < before))
+            .values(sync_floor=pruned)
+        )
+        result = db.session.execute(
+            db.delete(TaskTombstone).where(TaskTombstone.deleted_at < before)
+        )
+        return result.rowcount
+
+# Busca textual em título e descrição. No PostgreSQL, uma coluna tsvector
+# gerada (mantida pelo próprio banco a cada escrita) com índice GIN; no
+# SQLite, uma tabela FTS5 de conteúdo externo mantida por triggers
+SEARCH_CONFIG = 'portuguese'
+
+POSTGRES_SEARCH_DDL = (
+    f"""ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(description, '')), 'B')
+    ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING gin (search_vector)',
+)
+
+SQLITE_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, description, content='tasks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+)
+
+@db.event.listens_for(Task.__table__, 'after_create')
+def create_search_index(target, connection, **kw):
+    ddl = {'postgresql': POSTGRES_SEARCH_DDL, 'sqlite': SQLITE_SEARCH_DDL}
+    for statement in ddl.get(connection.dialect.name, ()):
+        connection.exec_driver_sql(statement)
+
+@db.event.listens_for(Task.__table__, 'before_drop')
+def drop_search_index(target, connection, **kw):
+    # A coluna e o índice do PostgreSQL somem com a tabela; a FTS5 não
+    if connection.dialect.name == 'sqlite':
+        connection.exec_driver_sql('DROP TABLE IF EXISTS tasks_fts')
+
 # Relacionamentos adicionais
-User.tasks = db.relationship('Task', back_populates='author', lazy='dynamic')
 Task.author = db.relationship('User', back_populates='tasks')
+
+# O SQLite só aplica chaves estrangeiras (e o ON DELETE CASCADE) quando
+# pedido em cada conexão
+@db.event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
@@ -0,0 +1,139 @@
+"""Opt-in per-request SQL profiler.
+
+A request is profiled when it is sampled (PROFILER_ENABLED with
+PROFILER_SAMPLE_RATE) or when an admin sends the ``X-Profile`` header. The
+profiler counts statements and DB time, groups them by statement shape
+and flags shapes repeated PROFILER_N_PLUS_ONE_THRESHOLD times or more as
+likely N+1 queries. Results go to a ``Server-Timing`` header and one
+structured log line. Unprofiled requests only pay a ``g`` lookup per query.
+"""
+import json
+import random
+import re
+from time import perf_counter
+from typing import Any, Dict, List
+
+from flask import Flask, Response, current_app, g, has_request_context, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import event
+
+from ..models import User, db
+from ..replicas import replica_engines
+
+# "IN (?, ?, ?)" and "VALUES (...), (...)" vary with the number of
+# parameters; collapse them so they count as one shape
+_PARAM_LIST = re.compile(r'\((?:\s*(?:\?|%\(\w+\)s|%s|:\w+)\s*,?)+\)')
+_VALUES_LIST = re.compile(r'(VALUES\s*\(\.\.\.\))(?:\s*,\s*\(\.\.\.\))+', re.IGNORECASE)
+
+
+def statement_shape(statement: str) -> str:
+    """Normalize a statement so repeated executions share one key."""
+    shape = _PARAM_LIST.sub('(...)', ' '.join(statement.split()))
+    return _VALUES_LIST.sub(r'\1', shape)
+
+
+class RequestProfile:
+    """SQL statistics of a single request."""
+
+    def __init__(self) -> None:
+        self.started = perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.shapes: Dict[str, List[Any]] = {}
+
+    def record(self, statement: str, elapsed: float) -> None:
+        self.queries += 1
+        self.db_time += elapsed
+        stats = self.shapes.get(statement)
+        if stats is None:
+            self.shapes[statement] = [1, elapsed]
+        else:
+            stats[0] += 1
+            stats[1] += elapsed
+
+    def repeated(self, threshold: int) -> List[Dict[str, Any]]:
+        """Statement shapes executed at least ``threshold`` times."""
+        merged: Dict[str, List[Any]] = {}
+        for statement, (count, elapsed) in self.shapes.items():
+            stats = merged.setdefault(statement_shape(statement), [0, 0.0])
+            stats[0] += count
+            stats[1] += elapsed
+        return [
+            {'statement': shape, 'count': count, 'db_ms': round(elapsed * 1000, 3)}
+            for shape, (count, elapsed) in sorted(
+                merged.items(), key=lambda item: item[1][0], reverse=True
+            )
+            if count >= threshold
+        ]
+
+
+def _requested_by_admin() -> bool:
+    try:
+        verify_jwt_in_request(optional=True)
+        user_id = get_jwt_identity()
+    except Exception:
+        return False
+    if user_id is None:
+        return False
+    return bool(db.session.scalar(db.select(User.is_admin).where(User.id == user_id)))
+
+
+def _before_request() -> None:
+    config = current_app.config
+    if request.headers.get('X-Profile') and _requested_by_admin():
+        g.sql_profile = RequestProfile()
+    elif config.get('PROFILER_ENABLED') and \
+            random.random() < config.get('PROFILER_SAMPLE_RATE', 0.01):
+        g.sql_profile = RequestProfile()
+
+
+def _after_request(response: Response) -> Response:
+    profile = g.pop('sql_profile', None)
+    if profile is None:
+        return response
+
+    total_ms = (perf_counter() - profile.started) * 1000
+    db_ms = profile.db_time * 1000
+    threshold = current_app.config.get('PROFILER_N_PLUS_ONE_THRESHOLD', 5)
+    repeated = profile.repeated(threshold)
+
+    response.headers.add(
+        'Server-Timing',
+        f'db;dur={db_ms:.2f};desc="{profile.queries} queries", app;dur={total_ms:.2f}'
+    )
+    record = {
+        'event': 'sql_profile',
+        'method': request.method,
+        'endpoint': request.endpoint,
+        'status': response.status_code,
+        'queries': profile.queries,
+        'db_ms': round(db_ms, 3),
+        'total_ms': round(total_ms, 3),
+        'n_plus_one': repeated,
+    }
+    log = current_app.logger.warning if repeated else current_app.logger.info
+    log(json.dumps(record, ensure_ascii=False))
+    return response
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, like the metrics hooks: a statement that
+    # raises must not leave its start time on the pooled connection
+    if context is not None and has_request_context() and 'sql_profile' in g:
+        context.profiler_query_start = perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, 'profiler_query_start', None)
+    if start is not None and has_request_context() and 'sql_profile' in g:
+        g.sql_profile.record(statement, perf_counter() - start)
+
+
+def init_profiler(app: Flask) -> None:
+    """Attach the profiler hooks (call after db.init_app)."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    with app.app_context():
+        for engine in [*db.engines.values(), *replica_engines(app)]:
+            event.listen(engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(engine, 'after_cursor_execute', _after_cursor_execute)
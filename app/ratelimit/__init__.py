@@ -0,0 +1,406 @@
+"""Distributed sliding-window rate limiting.
+
+Each limit ("5 per minute") is approximated with two fixed-window counters:
+the current window plus the previous one weighted by how much of it still
+overlaps the sliding window. Against Redis, a Lua script reads and bumps
+the counters of every limit of a route atomically, so all workers and
+replicas share one budget.
+
+With leasing enabled, a worker that sees a key sustain a lease's worth
+of requests within RATELIMIT_LEASE_TTL takes a slice of its budget in one
+round trip and spends it locally until it runs out or expires; quieter
+keys keep acquiring one unit per request. Units left in an expired or
+replaced lease are credited back to Redis, and a lease is never larger
+than a tenth of the smallest limit of the route.
+"""
+import math
+import os
+import re
+import threading
+import time
+import weakref
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import redis
+from flask import Blueprint, Flask, current_app, request
+from werkzeug.exceptions import ServiceUnavailable, TooManyRequests
+
+from ..utils import redis_pool
+
+UNITS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+SLIDING_WINDOW_SCRIPT = """
+local want = tonumber(ARGV[1])
+local grant = want
+local binding = 0
+for i = 1, #KEYS / 2 do
+    local limit = tonumber(ARGV[i * 3 - 1])
+    local weight = tonumber(ARGV[i * 3])
+    local current = tonumber(redis.call('GET', KEYS[i * 2 - 1]) or '0')
+    local previous = tonumber(redis.call('GET', KEYS[i * 2]) or '0')
+    local available = math.floor(limit - previous * weight - current)
+    if available < grant then
+        grant = available
+        binding = i
+    end
+end
+if grant < 0 then
+    grant = 0
+end
+if grant > 0 then
+    for i = 1, #KEYS / 2 do
+        redis.call('INCRBY', KEYS[i * 2 - 1], grant)
+        redis.call('EXPIRE', KEYS[i * 2 - 1], tonumber(ARGV[i * 3 + 1]))
+    end
+end
+return {grant, binding}
+"""
+
+# Credits back the unused part of a lease to the counters it was taken from
+RELEASE_SCRIPT = """
+local amount = tonumber(ARGV[1])
+for i = 1, #KEYS do
+    if redis.call('EXISTS', KEYS[i]) == 1 then
+        local left = redis.call('DECRBY', KEYS[i], amount)
+        if left < 0 then
+            redis.call('INCRBY', KEYS[i], -left)
+        end
+    end
+end
+return 0
+"""
+
+
+class RateLimit(NamedTuple):
+    amount: int
+    window: int  # segundos
+
+
+def parse_limits(spec: str) -> List[RateLimit]:
+    """Parse "5 per minute; 20/hour" into RateLimit tuples."""
+    limits = []
+    for part in filter(None, (p.strip() for p in re.split(r'[;,]', spec))):
+        match = re.fullmatch(r'(\d+)\s*(?:per|/)\s*(\d+)?\s*(second|minute|hour|day)s?', part)
+        if match is None:
+            raise ValueError(f'Invalid rate limit: {part!r}')
+        amount, multiplier, unit = match.groups()
+        limits.append(RateLimit(int(amount), int(multiplier or 1) * UNITS[unit]))
+    return limits
+
+
+def get_remote_address() -> str:
+    return request.remote_addr or '127.0.0.1'
+
+
+def get_user_or_remote_address() -> str:
+    """Key by JWT identity when the request carries a valid token, else by IP."""
+    from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        identity = None
+    return f'user:{identity}' if identity is not None else get_remote_address()
+
+
+def _window_keys(base: str, limits: List[RateLimit], now: float) -> Tuple[List[str], List[Any]]:
+    keys, args = [], []
+    for limit in limits:
+        index, elapsed = divmod(now, limit.window)
+        index = int(index)
+        keys += [f'{base}:{limit.window}:{index}', f'{base}:{limit.window}:{index - 1}']
+        args += [limit.amount, 1 - elapsed / limit.window, limit.window * 2]
+    return keys, args
+
+
+class MemoryBackend:
+    """In-process backend (development/tests); same algorithm as the script."""
+
+    def __init__(self):
+        self._counters: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, keys: List[str], want: int, args: List[Any]) -> Tuple[int, int]:
+        now = time.monotonic()
+        with self._lock:
+            def value(key: str) -> int:
+                count, expires_at = self._counters.get(key, (0, 0.0))
+                return count if expires_at > now else 0
+
+            grant, binding = want, 0
+            for i in range(len(keys) // 2):
+                limit, weight, _ = args[i * 3:i * 3 + 3]
+                available = math.floor(
+                    limit - value(keys[i * 2 + 1]) * weight - value(keys[i * 2])
+                )
+                if available < grant:
+                    grant, binding = available, i + 1
+            grant = max(grant, 0)
+            if grant:
+                for i in range(len(keys) // 2):
+                    key, ttl = keys[i * 2], args[i * 3 + 2]
+                    self._counters[key] = (value(key) + grant, now + ttl)
+            if len(self._counters) > 10000:
+                self._counters = {k: v for k, v in self._counters.items() if v[1] > now}
+        return grant, binding
+
+    def release(self, keys: List[str], amount: int) -> None:
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                count, expires_at = self._counters.get(key, (0, 0.0))
+                if expires_at > now:
+                    self._counters[key] = (max(count - amount, 0), expires_at)
+
+
+class RedisBackend:
+    """Redis backend running the sliding-window script (EVALSHA)."""
+
+    def __init__(self, pool: redis.ConnectionPool):
+        self.client = redis.Redis(connection_pool=pool)
+        self.script = self.client.register_script(SLIDING_WINDOW_SCRIPT)
+        self.release_script = self.client.register_script(RELEASE_SCRIPT)
+
+    def acquire(self, keys: List[str], want: int, args: List[Any]) -> Tuple[int, int]:
+        grant, binding = self.script(keys=keys, args=[want] + args)
+        return int(grant), int(binding)
+
+    def release(self, keys: List[str], amount: int) -> None:
+        self.release_script(keys=keys, args=[amount])
+
+
+class RateLimitExceeded(TooManyRequests):
+    def __init__(self, retry_after: int):
+        super().__init__('Muitas requisições. Tente novamente em instantes.')
+        self.retry_after = retry_after
+
+
+class RateLimitUnavailable(ServiceUnavailable):
+    """Raised when the storage is down and the limiter fails closed."""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Limite de requisições indisponível no momento.')
+        self.retry_after = retry_after
+
+
+class RouteLimit(NamedTuple):
+    limits: Union[str, Callable[[], str]]
+    key_func: Optional[Callable[[], str]]
+    scope: Optional[str]
+
+
+class _Lease:
+    """Budget taken ahead by this worker for one key."""
+
+    __slots__ = ('keys', 'remaining', 'expires_at')
+
+    def __init__(self, keys: List[str], remaining: int, expires_at: float):
+        self.keys = keys  # counters the lease was added to
+        self.remaining = remaining
+        self.expires_at = expires_at
+
+
+class _LimiterState:
+    """Per-application limiter state stored in ``app.extensions``."""
+
+    def __init__(self, backend: Any, config: Dict[str, Any]):
+        self.backend = backend
+        self.prefix = config.get('RATELIMIT_KEY_PREFIX', 'rl:')
+        self.fail_open = config.get('RATELIMIT_FAIL_OPEN', True)
+        self.lease_size = config.get('RATELIMIT_LEASE_SIZE', 0)
+        self.lease_ttl = config.get('RATELIMIT_LEASE_TTL', 1.0)
+        self.retry_interval = config.get('RATELIMIT_RETRY_INTERVAL', 5)
+        self.retry_at = 0.0
+        self.leases: Dict[str, _Lease] = {}
+        # chave -> [requisições de uma unidade, desde]: quem merece um lease
+        self.rates: Dict[str, List[float]] = {}
+        self.next_sweep = 0.0
+        self.lock = threading.Lock()
+        _states.add(self)
+
+
+_states = weakref.WeakSet()
+
+
+def _reset_leases_after_fork() -> None:
+    # A lease belongs to the process that took it; children start empty
+    for state in list(_states):
+        state.leases = {}
+        state.rates = {}
+        state.lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_leases_after_fork)
+
+
+class RateLimiter:
+    """Flask extension enforcing default, blueprint and per-view limits."""
+
+    def __init__(self, key_func: Callable[[], str] = get_remote_address,
+                 app: Optional[Flask] = None):
+        self.key_func = key_func
+        self._blueprint_limits: Dict[str, RouteLimit] = {}
+        self._exempt_blueprints = set()
+        self._exempt_views = set()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        url = app.config.get('RATELIMIT_STORAGE_URL', 'memory://')
+        if url.startswith('memory://'):
+            backend = MemoryBackend()
+        else:
+            backend = RedisBackend(redis_pool(
+                app, 'ratelimit', url, app.config.get('RATELIMIT_SOCKET_TIMEOUT', 0.25)
+            ))
+        app.extensions['rate_limiter'] = _LimiterState(backend, app.config)
+        app.before_request(self._check_request)
+
+    def limit(self, limits: Union[str, Callable[[], str]],
+              key_func: Optional[Callable[[], str]] = None,
+              scope: Optional[str] = None) -> Callable:
+        """Attach limits to a view or to every view of a blueprint.
+
+        ``limits`` may be a callable so it can be read from the config at
+        request time. Views sharing a ``scope`` share one budget.
+        """
+        route_limit = RouteLimit(limits, key_func, scope)
+
+        def decorator(obj: Any) -> Any:
+            if isinstance(obj, Blueprint):
+                self._blueprint_limits[obj.name] = route_limit
+            else:
+                obj._rate_limit = route_limit
+            return obj
+
+        return decorator
+
+    def exempt(self, obj: Any) -> Any:
+        if isinstance(obj, Blueprint):
+            self._exempt_blueprints.add(obj.name)
+        else:
+            self._exempt_views.add(obj)
+        return obj
+
+    def _route_limit(self) -> Optional[RouteLimit]:
+        view = current_app.view_functions.get(request.endpoint)
+        if view is None or view in self._exempt_views:
+            return None
+        if request.blueprint in self._exempt_blueprints:
+            return None
+        route_limit = getattr(view, '_rate_limit', None)
+        if route_limit is None and request.blueprint:
+            route_limit = self._blueprint_limits.get(request.blueprint.split('.')[0])
+        if route_limit is None:
+            default = current_app.config.get('RATELIMIT_DEFAULT')
+            route_limit = RouteLimit(default, None, None) if default else None
+        return route_limit
+
+    def _check_request(self) -> None:
+        if not current_app.config.get('RATELIMIT_ENABLED', True):
+            return
+        route_limit = self._route_limit()
+        if route_limit is None:
+            return
+        spec = route_limit.limits() if callable(route_limit.limits) else route_limit.limits
+        key = (route_limit.key_func or self.key_func)()
+        self.hit(parse_limits(spec), route_limit.scope or request.endpoint, key)
+
+    def hit(self, limits: List[RateLimit], scope: str, key: str) -> None:
+        """Spend one request of ``key``'s budget or raise RateLimitExceeded."""
+        state = current_app.extensions['rate_limiter']
+        base = f'{state.prefix}{scope}:{key}'
+        lease_size = min(state.lease_size, min(l.amount for l in limits) // 10)
+
+        want = 1
+        if lease_size > 1:
+            refunds = []
+            now = time.monotonic()
+            with state.lock:
+                lease = state.leases.get(base)
+                if lease is not None and lease.remaining > 0 and lease.expires_at > now:
+                    lease.remaining -= 1
+                    return
+                if lease is not None:
+                    del state.leases[base]
+                    if lease.remaining > 0:
+                        refunds.append(lease)
+                if self._sustained(state, base, lease, lease_size, now):
+                    want = lease_size
+                if now >= state.next_sweep:
+                    refunds += self._expired_leases(state, now)
+            self._release(state, refunds)
+
+        if time.monotonic() < state.retry_at:
+            return self._unavailable(state)
+
+        now = time.time()
+        keys, args = _window_keys(base, limits, now)
+        try:
+            grant, binding = state.backend.acquire(keys, want, args)
+        except redis.RedisError as e:
+            state.retry_at = time.monotonic() + state.retry_interval
+            current_app.logger.warning(f'Rate limit storage unavailable: {str(e)}')
+            return self._unavailable(state)
+
+        if grant < 1:
+            window = limits[binding - 1].window if binding else limits[0].window
+            raise RateLimitExceeded(max(1, math.ceil(window - now % window)))
+
+        if grant > 1:
+            with state.lock:
+                if len(state.leases) > 10000:
+                    self._release(state, list(state.leases.values()))
+                    state.leases.clear()
+                state.leases[base] = _Lease(
+                    keys[::2], grant - 1, time.monotonic() + state.lease_ttl
+                )
+
+    @staticmethod
+    def _sustained(state: _LimiterState, base: str, lease: Optional[_Lease],
+                   lease_size: int, now: float) -> bool:
+        """Whether ``base`` would spend a whole lease before it expires.
+
+        True right after a lease was used up; otherwise once ``lease_size``
+        single-unit requests arrive within RATELIMIT_LEASE_TTL.
+        """
+        if lease is not None and lease.remaining == 0:
+            return True
+        rate = state.rates.get(base)
+        if rate is None or now - rate[1] > state.lease_ttl:
+            if len(state.rates) > 10000:
+                state.rates.clear()
+            rate = state.rates[base] = [0, now]
+        rate[0] += 1
+        if rate[0] < lease_size:
+            return False
+        del state.rates[base]
+        return True
+
+    @staticmethod
+    def _expired_leases(state: _LimiterState, now: float) -> List[_Lease]:
+        # Keys that went quiet would otherwise keep their leftover forever
+        state.next_sweep = now + state.lease_ttl
+        expired = [base for base, lease in state.leases.items() if lease.expires_at <= now]
+        return [lease for lease in map(state.leases.pop, expired) if lease.remaining > 0]
+
+    @staticmethod
+    def _release(state: _LimiterState, leases: List[_Lease]) -> None:
+        """Credit the unused part of ``leases`` back to the storage."""
+        for lease in leases:
+            if lease.remaining <= 0:
+                continue
+            try:
+                state.backend.release(lease.keys, lease.remaining)
+            except redis.RedisError as e:
+                current_app.logger.warning(f'Rate limit lease not released: {str(e)}')
+                return
+
+    @staticmethod
+    def _unavailable(state: _LimiterState) -> None:
+        if not state.fail_open:
+            raise RateLimitUnavailable(max(1, math.ceil(state.retry_at - time.monotonic())))
+
+
+limiter = RateLimiter(key_func=get_remote_address)
@@ -0,0 +1,211 @@
+"""Read-replica routing with lag checks and read-your-writes stickiness.
+
+Replica engines (SQLALCHEMY_REPLICA_URIS) are built with the primary's
+engine options; ``replica_engines`` exposes them to the metrics, profiler
+and fork hooks. Views decorated with ``replica_read``
+pick one replica per request; RoutingSession sends that request's reads to
+it and everything else (flushes, DML, any other request) to the primary.
+
+A replica is skipped while its measured lag exceeds REPLICA_MAX_LAG or its
+lag check fails. A user who has just written is pinned to the primary for
+REPLICA_STICKY_SECONDS, tracked in Redis so that every worker sees it.
+"""
+import itertools
+import threading
+import time
+from functools import wraps
+from typing import Any, Callable, Dict, List, Optional
+
+import redis
+from flask import Flask, current_app, g, has_app_context
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import Engine
+
+# Zero on a primary or on a replica that has replayed everything it
+# received; otherwise the age of the last replayed transaction
+POSTGRES_LAG_SQL = """
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+"""
+
+
+class RoutingSession(Session):
+    """Session that reads from the replica chosen for the request."""
+
+    def get_bind(self, mapper: Any = None, clause: Any = None, bind: Any = None,
+                 **kwargs: Any) -> Any:
+        if bind is None and not self._flushing and has_app_context():
+            replica = g.get('db_replica')
+            if replica is not None and not getattr(clause, 'is_dml', False):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+# Requests that wrote pin their user to the primary (see _after_request)
+@event.listens_for(RoutingSession, 'after_flush')
+def _flag_flush(session: Any, flush_context: Any) -> None:
+    if has_app_context():
+        g.db_wrote = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _flag_dml(state: Any) -> None:
+    if (state.is_insert or state.is_update or state.is_delete) and has_app_context():
+        g.db_wrote = True
+
+
+class _Replica:
+    def __init__(self, key: str):
+        self.key = key
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+        self.checking = threading.Lock()
+
+
+class _RouterState:
+    """Per-application replica state stored in ``app.extensions``."""
+
+    def __init__(self, engines: Dict[str, Engine], config: Dict[str, Any]):
+        self.engines = engines
+        self.replicas = [_Replica(key) for key in engines]
+        self.max_lag = config.get('REPLICA_MAX_LAG', 5)
+        self.check_interval = config.get('REPLICA_LAG_CHECK_INTERVAL', 2)
+        self.sticky_seconds = config.get('REPLICA_STICKY_SECONDS', 5)
+        self.prefix = config.get('CACHE_KEY_PREFIX', 'tm:')
+        self.redis = None
+        # Fallback and fast path: writes seen by this process
+        self.local_sticky: Dict[Any, float] = {}
+        self.counter = itertools.count()
+
+
+class ReplicaRouter:
+    """Flask extension choosing a replica for read-only requests."""
+
+    def __init__(self, app: Optional[Flask] = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        """Create the replica engines; call before init_metrics/init_profiler."""
+        uris = app.config.get('SQLALCHEMY_REPLICA_URIS') or []
+        if isinstance(uris, str):
+            uris = [uri.strip() for uri in uris.split(',') if uri.strip()]
+        options = {
+            'echo': app.config.get('SQLALCHEMY_ECHO', False),
+            **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}),
+        }
+        engines = {
+            f'replica_{i}': create_engine(uri, **options) for i, uri in enumerate(uris)
+        }
+        state = app.extensions['replica_router'] = _RouterState(engines, app.config)
+        url = app.config.get('REPLICA_STICKY_REDIS_URL')
+        if url:
+            # Imported here: app.utils imports this module
+            from ..utils import redis_pool
+            state.redis = redis.Redis(connection_pool=redis_pool(app, 'replicas', url, 0.25))
+        app.after_request(self._after_request)
+
+    @staticmethod
+    def _state() -> Optional[_RouterState]:
+        state = current_app.extensions.get('replica_router')
+        if state is None or not state.replicas:
+            return None
+        return state
+
+    def _measure(self, replica: _Replica, engine: Engine) -> None:
+        try:
+            with engine.connect() as conn:
+                if engine.dialect.name == 'postgresql':
+                    replica.lag = float(conn.execute(text(POSTGRES_LAG_SQL)).scalar() or 0)
+                else:
+                    conn.execute(text('SELECT 1'))
+                    replica.lag = 0.0
+        except Exception as e:
+            replica.lag = None
+            current_app.logger.warning(f'Replica {replica.key} unavailable: {str(e)}')
+        replica.checked_at = time.monotonic()
+
+    def _usable(self, state: _RouterState, replica: _Replica, engine: Engine) -> bool:
+        if time.monotonic() - replica.checked_at >= state.check_interval:
+            # One request refreshes; the others use the last measurement
+            if replica.checking.acquire(blocking=False):
+                try:
+                    self._measure(replica, engine)
+                finally:
+                    replica.checking.release()
+        return replica.lag is not None and replica.lag <= state.max_lag
+
+    def is_sticky(self, user_id: Any) -> bool:
+        state = self._state()
+        if state is None or user_id is None:
+            return False
+        if state.local_sticky.get(user_id, 0) > time.monotonic():
+            return True
+        if state.redis is None:
+            return False
+        try:
+            return bool(state.redis.exists(f'{state.prefix}sticky:{user_id}'))
+        except redis.RedisError:
+            # Without the shared record, play safe and read from the primary
+            return True
+
+    def mark_sticky(self, user_id: Any) -> None:
+        state = self._state()
+        if state is None or user_id is None:
+            return
+        state.local_sticky[user_id] = time.monotonic() + state.sticky_seconds
+        if len(state.local_sticky) > 10000:
+            now = time.monotonic()
+            state.local_sticky = {k: v for k, v in state.local_sticky.items() if v > now}
+        if state.redis is not None:
+            try:
+                state.redis.set(f'{state.prefix}sticky:{user_id}', 1,
+                                px=int(state.sticky_seconds * 1000))
+            except redis.RedisError as e:
+                current_app.logger.warning(f'Replica stickiness not recorded: {str(e)}')
+
+    def choose(self, user_id: Any = None) -> Optional[Engine]:
+        """Engine of a fresh enough replica, or None to use the primary."""
+        state = self._state()
+        if state is None or self.is_sticky(user_id):
+            return None
+        start = next(state.counter)
+        for i in range(len(state.replicas)):
+            replica = state.replicas[(start + i) % len(state.replicas)]
+            engine = state.engines[replica.key]
+            if self._usable(state, replica, engine):
+                return engine
+        return None
+
+    def _after_request(self, response: Any) -> Any:
+        if g.get('db_wrote'):
+            try:
+                user_id = get_jwt_identity()
+            except Exception:
+                user_id = None
+            self.mark_sticky(user_id)
+        return response
+
+
+replica_router = ReplicaRouter()
+
+
+def replica_engines(app: Optional[Flask] = None) -> List[Engine]:
+    state = (app or current_app).extensions.get('replica_router')
+    return list(state.engines.values()) if state is not None else []
+
+
+def replica_read(view: Callable) -> Callable:
+    """Serve a read-only view from a replica (place under ``jwt_required``)."""
+
+    @wraps(view)
+    def wrapper(*args: Any, **kwargs: Any) -> Any:
+        g.db_replica = replica_router.choose(get_jwt_identity())
+        return view(*args, **kwargs)
+
+    return wrapper
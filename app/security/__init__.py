@@ -0,0 +1,116 @@
+"""Password hashing on a bounded worker pool.
+
+PBKDF2 is deliberately slow, and hashlib releases the GIL while it runs,
+so a small per-process thread pool caps how many CPU cores hashing can
+take. Requests waiting on the pool hold a slot; once every slot is taken
+new requests fail fast with ``HashingOverloaded`` (503 + Retry-After)
+instead of piling up behind a login storm.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from flask import Flask, current_app
+from werkzeug.security import (
+    DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+)
+
+
+class HashingOverloaded(Exception):
+    """Raised when the hashing pool has no free slot."""
+
+    def __init__(self, retry_after: int):
+        super().__init__('Password hashing pool is saturated')
+        self.retry_after = retry_after
+
+
+def hash_parameters(method: str) -> Tuple[str, ...]:
+    """Algorithm and cost of a method string, with werkzeug's defaults filled in.
+
+    ``pbkdf2:sha256`` and the ``pbkdf2:sha256:600000`` prefix of the hashes
+    it produces map to the same tuple.
+    """
+    name, *args = method.split(':')
+    if name == 'pbkdf2':
+        return (name, args[0] if args else 'sha256',
+                str(int(args[1]) if len(args) > 1 else DEFAULT_PBKDF2_ITERATIONS))
+    if name == 'scrypt':
+        defaults = ('32768', '8', '1')
+        return (name, *(str(int(arg)) for arg in args), *defaults[len(args):])
+    return (name, *args)
+
+
+class _HasherState:
+    """Per-application pool, rebuilt lazily in every forked worker."""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.method = config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+        self.workers = config.get('PASSWORD_HASH_WORKERS', 2)
+        self.queue_size = config.get('PASSWORD_HASH_QUEUE_SIZE', 16)
+        self.timeout = config.get('PASSWORD_HASH_TIMEOUT', 10)
+        self.retry_after = config.get('PASSWORD_HASH_RETRY_AFTER', 1)
+        self.lock = threading.Lock()
+        self.pid: Optional[int] = None
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.slots: Optional[threading.BoundedSemaphore] = None
+
+    def pool(self) -> ThreadPoolExecutor:
+        if self.pid != os.getpid():
+            with self.lock:
+                if self.pid != os.getpid():
+                    # Threads do not survive fork; start a fresh pool here
+                    self.executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix='password-hash'
+                    )
+                    self.slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+                    self.pid = os.getpid()
+        return self.executor
+
+
+class PasswordHasher:
+    """Flask extension exposing hash/verify through the bounded pool."""
+
+    def __init__(self, app: Optional[Flask] = None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app: Flask) -> None:
+        app.extensions['password_hasher'] = _HasherState(app.config)
+
+    @staticmethod
+    def _state() -> _HasherState:
+        return current_app.extensions['password_hasher']
+
+    def _run(self, func: Callable, *args: Any) -> Any:
+        state = self._state()
+        pool = state.pool()
+        if not state.slots.acquire(blocking=False):
+            raise HashingOverloaded(state.retry_after)
+        try:
+            future = pool.submit(func, *args)
+        except BaseException:
+            state.slots.release()
+            raise
+        # The slot is held until the hash finishes, even if the caller gave up
+        future.add_done_callback(lambda _: state.slots.release())
+        try:
+            return future.result(timeout=state.timeout)
+        except TimeoutError:
+            raise HashingOverloaded(state.retry_after)
+
+    def hash(self, password: str) -> str:
+        """Hash a password with the configured method."""
+        return self._run(generate_password_hash, password, self._state().method)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        """Check a password against a stored hash."""
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash: str) -> bool:
+        """True when the hash was made with other parameters than configured."""
+        return hash_parameters(pwhash.split('$', 1)[0]) != \
+            hash_parameters(self._state().method)
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,189 @@
+"""Synthetic dataset generator behind ``flask seed``.
+
+Rows come from one ``random.Random(seed)``, so the same seed and anchor
+date always produce the same dataset. Distributions follow what real
+accounts look like: tasks per user are Pareto-skewed (a few heavy users,
+a long tail), older tasks are more often completed, about a third have no
+due date and description sizes are log-normal.
+
+Rows are streamed in batches of ``batch_size``, one transaction each, so
+memory stays flat: ``COPY ... FROM STDIN`` on PostgreSQL, multi-row
+INSERTs elsewhere.
+"""
+import csv
+import io
+import random
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from ..models import SQLITE_SEARCH_DDL, Task, User, db
+from ..security import password_hasher
+
+# Every seeded user logs in with this password
+SEED_PASSWORD = 'Senha@123'
+
+# validate_task_data rejects longer descriptions
+DESCRIPTION_MAX_LENGTH = 1000
+
+TASK_SEED_COLUMNS = (
+    'title', 'description', 'completed', 'created_at', 'updated_at',
+    'due_date', 'priority', 'user_id',
+)
+
+WORDS = (
+    'revisar', 'enviar', 'relatório', 'reunião', 'cliente', 'orçamento', 'projeto',
+    'entrega', 'contrato', 'planilha', 'apresentação', 'equipe', 'pagamento',
+    'fornecedor', 'documentação', 'agenda', 'atualizar', 'sistema', 'backup',
+    'corrigir', 'erro', 'testar', 'versão', 'publicar', 'ligar', 'comprar',
+    'material', 'escritório', 'mensal', 'semanal', 'pendente', 'urgente',
+    'prazo', 'análise', 'proposta', 'e-mail', 'financeiro', 'marketing',
+    'campanha', 'treinamento', 'migração', 'banco', 'dados', 'servidor',
+    'consulta', 'médico', 'academia', 'mercado', 'viagem', 'passagem',
+)
+
+PRIORITY_WEIGHTS = (2, 5, 3)  # 1: Alta, 2: Média, 3: Baixa
+
+
+def tasks_per_user(rng: random.Random, users: int, tasks: int) -> List[int]:
+    """Split ``tasks`` among ``users`` with a Pareto-shaped skew."""
+    weights = [rng.paretovariate(1.2) for _ in range(users)]
+    total = sum(weights)
+    counts = [int(tasks * weight / total) for weight in weights]
+    for i in rng.sample(range(users), tasks - sum(counts)):
+        counts[i] += 1
+    return counts
+
+
+def _text(rng: random.Random, length: int) -> str:
+    # Words average under 8 characters, so this always overshoots ``length``
+    return ' '.join(rng.choices(WORDS, k=length // 4 + 1))[:length]
+
+
+def generate_tasks(rng: random.Random, user_ids: Sequence[int], counts: Sequence[int],
+                   anchor: datetime) -> Iterator[Tuple[Any, ...]]:
+    """Yield task rows (in TASK_SEED_COLUMNS order) for each user in turn."""
+    year = 365 * 86400
+    for user_id, count in zip(user_ids, counts):
+        for _ in range(count):
+            age = rng.randrange(year)
+            created_at = anchor - timedelta(seconds=age)
+            completed = rng.random() < 0.15 + 0.7 * age / year
+            updated_at = created_at + timedelta(seconds=rng.randrange(age + 1)) \
+                if completed else created_at
+            due_date = None if rng.random() < 0.35 else \
+                created_at + timedelta(days=rng.randint(1, 90))
+            description = None if rng.random() < 0.3 else \
+                _text(rng, min(DESCRIPTION_MAX_LENGTH, int(rng.lognormvariate(4.5, 1.0)) + 10))
+            yield (
+                _text(rng, rng.randint(10, 60)).capitalize(),
+                description,
+                completed,
+                created_at,
+                updated_at,
+                due_date,
+                rng.choices((1, 2, 3), PRIORITY_WEIGHTS)[0],
+                user_id,
+            )
+
+
+def _batches(rows: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _copy_rows(connection: Any, table: str, columns: Sequence[str],
+               rows: List[Tuple[Any, ...]]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        # Unquoted empty fields are NULL in COPY's csv format
+        writer.writerow(['t' if value is True else 'f' if value is False else value
+                         for value in row])
+    buffer.seek(0)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(
+            f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)', buffer
+        )
+    finally:
+        cursor.close()
+
+
+def _insert_rows(connection: Any, table: str, columns: Sequence[str],
+                 rows: List[Tuple[Any, ...]]) -> None:
+    connection.execute(
+        db.metadata.tables[table].insert(), [dict(zip(columns, row)) for row in rows]
+    )
+
+
+def seed_database(users: int, tasks: int, seed: int = 42, batch_size: int = 10000,
+                  anchor: Optional[datetime] = None, prefix: str = 'seed',
+                  progress: Optional[Callable[[str, int], None]] = None) -> None:
+    """Insert ``users`` users and ``tasks`` tasks; call inside an app context.
+
+    Users are named ``<prefix><n>`` (``<prefix><n>@example.com``) and share
+    SEED_PASSWORD. ``anchor`` is the "now" of the dataset (default: today
+    at midnight UTC); pass it explicitly for byte-identical reruns.
+    """
+    if db.session.scalar(db.select(User.id).where(User.email == f'{prefix}0@example.com')):
+        raise ValueError(f'Já existem usuários com o prefixo {prefix!r}')
+    rng = random.Random(seed)
+    anchor = anchor or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    password_hash = password_hasher.hash(SEED_PASSWORD)
+    engine = db.engine
+    users_table = User.__table__
+
+    user_ids: List[int] = []
+    for batch in _batches(range(users), batch_size):
+        rows = [{
+            'username': f'{prefix}{i}',
+            'email': f'{prefix}{i}@example.com',
+            'password_hash': password_hash,
+            'created_at': anchor - timedelta(days=400, seconds=rng.randrange(365 * 86400)),
+        } for i in batch]
+        with engine.begin() as connection:
+            user_ids += connection.execute(
+                users_table.insert().returning(users_table.c.id,
+                                               sort_by_parameter_order=True),
+                rows,
+            ).scalars().all()
+        if progress:
+            progress('users', len(user_ids))
+
+    write = _copy_rows if engine.dialect.name == 'postgresql' else _insert_rows
+    # Feeding FTS5 row by row costs more than the inserts themselves: drop
+    # the insert trigger for the load and rebuild the index once at the end
+    with engine.connect() as connection:
+        rebuild_fts = engine.dialect.name == 'sqlite' and connection.exec_driver_sql(
+            "SELECT 1 FROM sqlite_master WHERE name = 'tasks_fts_insert'"
+        ).scalar() is not None
+    if rebuild_fts:
+        with engine.begin() as connection:
+            connection.exec_driver_sql('DROP TRIGGER tasks_fts_insert')
+
+    counts = tasks_per_user(rng, users, tasks) if users else []
+    written = 0
+    try:
+        for batch in _batches(generate_tasks(rng, user_ids, counts, anchor), batch_size):
+            with engine.begin() as connection:
+                write(connection, Task.__tablename__, TASK_SEED_COLUMNS, batch)
+            written += len(batch)
+            if progress:
+                progress('tasks', written)
+    finally:
+        if rebuild_fts:
+            with engine.begin() as connection:
+                connection.exec_driver_sql(SQLITE_SEARCH_DDL[1])  # tasks_fts_insert
+                connection.exec_driver_sql(
+                    "INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')"
+                )
+
+    # Só os usuários criados aqui: os demais já têm contadores corretos
+    for batch in _batches(user_ids, batch_size):
+        User.recount_task_stats(batch)
+    db.session.commit()
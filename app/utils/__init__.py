@@ -1,59 +1,143 @@
 """Utility functions for the application."""
+import atexit
+import copy
+import json
 import logging
 import os
+import queue
+import smtplib
 import sys
-from logging.handlers import RotatingFileHandler
-from typing import Dict, Any, Tuple
+import threading
+import time
+import weakref
+from datetime import date, datetime
+from email.message import EmailMessage
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Any, Optional, Tuple
 
-import psycopg2
 import redis
-from flask import jsonify, current_app
-from psycopg2.extensions import connection as PgConnection
+from flask import Response, jsonify, current_app
+from sqlalchemy import text
 
-def get_db_connection() -> PgConnection:
-    """Get a database connection."""
+from ..models import db
+from ..replicas import replica_engines
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - falls back to the stdlib encoder
+    orjson = None
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f'Object of type {type(value).__name__} is not JSON serializable')
+
+def dumps_json(payload: Any) -> bytes:
+    """Serialize to JSON bytes, encoding datetimes as ISO 8601 natively.
+
+    Uses orjson when available (several times faster than the stdlib encoder
+    behind jsonify); the fallback produces the same document.
+    """
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, default=_json_default, ensure_ascii=False,
+                      separators=(',', ':')).encode()
+
+def json_response(payload: Any, status: int = 200) -> Response:
+    """Build a JSON response with dumps_json, bypassing Flask's JSON provider."""
+    return current_app.response_class(
+        dumps_json(payload), status=status, mimetype='application/json'
+    )
+
+def get_db_connection() -> Any:
+    """Borrow a raw DBAPI connection from the SQLAlchemy engine pool.
+
+    Calling ``close()`` on the returned connection hands it back to the pool
+    configured by SQLALCHEMY_ENGINE_OPTIONS instead of tearing it down.
+    """
     try:
-        conn = psycopg2.connect(
-            dbname=current_app.config.get('POSTGRES_DB'),
-            user=current_app.config.get('POSTGRES_USER'),
-            password=current_app.config.get('POSTGRES_PASSWORD'),
-            host=current_app.config.get('POSTGRES_HOST', 'db'),
-            port=current_app.config.get('POSTGRES_PORT', 5432)
-        )
-        return conn
+        return db.engine.raw_connection()
     except Exception as e:
         current_app.logger.error(f"Database connection error: {str(e)}")
         raise
 
+def redis_pool(app, name: str, url: str, socket_timeout: float,
+               decode_responses: bool = False) -> redis.ConnectionPool:
+    """Return the application's Redis pool for ``name``, creating it once.
+
+    Extensions that need their own database, timeouts or raw bytes get a
+    pool of their own, but every pool is registered here: each is bounded
+    by REDIS_MAX_CONNECTIONS and ``init_connection_pools`` resets all of
+    them in a forked child.
+    """
+    pools = app.extensions.setdefault('redis_pools', {})
+    pool = pools.get(name)
+    if pool is None:
+        pool = pools[name] = redis.ConnectionPool.from_url(
+            url,
+            max_connections=app.config.get('REDIS_MAX_CONNECTIONS', 20),
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_timeout,
+            decode_responses=decode_responses
+        )
+    return pool
+
+def get_redis_pool() -> redis.ConnectionPool:
+    """Return the application's shared Redis connection pool.
+
+    The pool is created once per application; redis-py checks the PID on
+    every checkout and drops connections inherited across a fork, so each
+    gunicorn worker transparently ends up with its own sockets.
+    """
+    return redis_pool(
+        current_app,
+        'default',
+        current_app.config.get('REDIS_URL', 'redis://redis:6379/0'),
+        current_app.config.get('REDIS_SOCKET_TIMEOUT', 1),
+        decode_responses=True
+    )
+
 def get_redis_connection() -> redis.Redis:
-    """Get a Redis connection."""
+    """Get a Redis client backed by the shared connection pool."""
     try:
-        return redis.Redis(
-            host=current_app.config.get('REDIS_HOST', 'redis'),
-            port=current_app.config.get('REDIS_PORT', 6379),
-            password=current_app.config.get('REDIS_PASSWORD', ''),
-            db=0,
-            decode_responses=True
-        )
+        return redis.Redis(connection_pool=get_redis_pool())
     except Exception as e:
         current_app.logger.error(f"Redis connection error: {str(e)}")
         raise
 
+def init_connection_pools(app) -> None:
+    """Make the application's connection pools safe to use after fork.
+
+    SQLAlchemy and Redis pools must not share sockets between processes:
+    when the app is loaded before forking (e.g. ``gunicorn --preload``), the
+    child discards the inherited connections without closing them, leaving
+    the parent's sockets untouched.
+    """
+    if not hasattr(os, 'register_at_fork'):
+        return
+    app_ref = weakref.ref(app)
+
+    def reset_pools_in_child() -> None:
+        app = app_ref()
+        if app is None:
+            return
+        with app.app_context():
+            for engine in [*db.engines.values(), *replica_engines(app)]:
+                engine.dispose(close=False)
+        for pool in app.extensions.get('redis_pools', {}).values():
+            pool.reset()
+
+    os.register_at_fork(after_in_child=reset_pools_in_child)
+
 def check_database_health() -> Tuple[bool, str]:
-    """Check if the database is healthy."""
+    """Check if the database is healthy using a pooled connection."""
     try:
-        conn = get_db_connection()
-        with conn.cursor() as cursor:
-            cursor.execute('SELECT 1')
-            result = cursor.fetchone()
-            if result and result[0] == 1:
+        with db.engine.connect() as conn:
+            if conn.execute(text('SELECT 1')).scalar() == 1:
                 return True, "Database is healthy"
         return False, "Database query failed"
     except Exception as e:
         return False, f"Database error: {str(e)}"
-    finally:
-        if 'conn' in locals():
-            conn.close()
 
 def check_redis_health() -> Tuple[bool, str]:
     """Check if Redis is healthy."""
@@ -86,8 +170,320 @@ def check_health() -> Dict[str, Any]:
         }
     }
 
+class JsonFormatter(logging.Formatter):
+    """Render records as one JSON object per line."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            'timestamp': datetime.utcfromtimestamp(record.created).isoformat() + 'Z',
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'line': record.lineno,
+            'process': record.process,
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            payload['exception'] = record.exc_text
+        return json.dumps(payload, ensure_ascii=False)
+
+class BatchStreamHandler(logging.StreamHandler):
+    """StreamHandler that leaves flushing to the listener, once per batch."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+class BatchRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler that leaves flushing to the listener, once per batch."""
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            if self.shouldRollover(record):
+                self.doRollover()
+            if self.stream is None:
+                self.stream = self._open()
+            self.stream.write(self.format(record) + self.terminator)
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that never blocks: a full queue drops records instead.
+
+    ``overflow`` is ``drop_new`` (discard the incoming record) or
+    ``drop_oldest`` (make room by discarding the oldest queued one).
+    """
+
+    def __init__(self, log_queue: queue.Queue, overflow: str = 'drop_new'):
+        super().__init__(log_queue)
+        self.overflow = overflow
+        self.enqueued = 0
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike QueueHandler.prepare, do not format here: only merge the
+        # args into the message (they may change once the request moves
+        # on) and leave formatting, traceback included, to the listener
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            if self.overflow == 'drop_oldest':
+                try:
+                    self.queue.get_nowait()
+                    self.queue.put_nowait(record)
+                except (queue.Empty, queue.Full):
+                    pass
+            self.dropped += 1
+            return
+        self.enqueued += 1
+
+class BatchingQueueListener(QueueListener):
+    """Drain the queue in batches and flush each target handler once per batch."""
+
+    def __init__(self, log_queue: queue.Queue, *handlers: logging.Handler,
+                 source: NonBlockingQueueHandler, batch_size: int = 256):
+        super().__init__(log_queue, *handlers, respect_handler_level=True)
+        self.source = source
+        self.batch_size = batch_size
+        self.reported_drops = 0
+
+    def enqueue_sentinel(self) -> None:
+        # The queue may be full; wait for room rather than losing the sentinel
+        self.queue.put(self._sentinel)
+
+    def _monitor(self) -> None:
+        stop = False
+        while not stop:
+            batch = []
+            record = self.queue.get()
+            while True:
+                if record is self._sentinel:
+                    stop = True
+                    break
+                batch.append(record)
+                if len(batch) >= self.batch_size:
+                    break
+                try:
+                    record = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self.handle_batch(batch)
+
+    def handle_batch(self, batch: list) -> None:
+        dropped = self.source.dropped
+        if dropped > self.reported_drops:
+            batch.append(logging.makeLogRecord({
+                'name': __name__, 'levelno': logging.WARNING, 'levelname': 'WARNING',
+                'msg': f'Log queue saturated: {dropped - self.reported_drops} '
+                       f'records dropped ({dropped} total)',
+            }))
+            self.reported_drops = dropped
+        for handler in self.handlers:
+            handler.acquire()
+            try:
+                for record in batch:
+                    if record.levelno >= handler.level and handler.filter(record):
+                        handler.emit(record)
+                handler.flush()
+            finally:
+                handler.release()
+
+class ErrorDigestHandler(logging.Handler):
+    """Mail error records as deduplicated digests from a background thread.
+
+    emit() only computes the fingerprint and puts the raw record on a bounded
+    queue (dropping it when full), so a failing request neither formats a
+    traceback nor touches the network. The worker groups records by
+    fingerprint over ``window`` seconds, formats the first record of each
+    and sends one mail per fingerprint with the number of occurrences and
+    that traceback.
+    """
+
+    def __init__(self, mailhost: Tuple[str, int], fromaddr: str, toaddrs: list,
+                 subject: str, credentials: Optional[Tuple[str, str]] = None,
+                 secure: Optional[tuple] = None,
+                 window: float = 60, queue_size: int = 1000, timeout: float = 10):
+        super().__init__(logging.ERROR)
+        self.mailhost = mailhost
+        self.fromaddr = fromaddr
+        self.toaddrs = toaddrs
+        self.subject = subject
+        self.credentials = credentials
+        self.secure = secure
+        self.window = window
+        self.timeout = timeout
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.dropped = 0
+        self.sent = 0
+        self._sentinel = object()
+        self._thread = None
+        self.start()
+
+    @staticmethod
+    def fingerprint(record: logging.LogRecord) -> Tuple:
+        # The call site, not the message: messages are f-strings carrying ids
+        exc_type = record.exc_info[0].__name__ if record.exc_info else None
+        return (record.name, record.pathname, record.lineno, exc_type)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(
+            target=self._run, name='error-digest', daemon=True
+        )
+        self._thread.start()
+        _error_digest_handlers.add(self)
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            item = (self.fingerprint(record), record)
+        except Exception:
+            self.handleError(record)
+            return
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        pending = {}
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            try:
+                item = self.queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            if item is self._sentinel:
+                self._send_digests(pending)
+                return
+            if item is not None:
+                fingerprint, record = item
+                entry = pending.get(fingerprint)
+                if entry is None:
+                    pending[fingerprint] = {
+                        'count': 1, 'first': record.created, 'last': record.created,
+                        'text': self._format_safely(record)
+                    }
+                else:
+                    # Repeats only count: their tracebacks are never formatted
+                    entry['count'] += 1
+                    entry['last'] = record.created
+                if deadline is None:
+                    deadline = time.monotonic() + self.window
+            # A steady stream of errors must not postpone the digest forever
+            if deadline is not None and time.monotonic() >= deadline:
+                self._send_digests(pending)
+                pending, deadline = {}, None
+
+    def _format_safely(self, record: logging.LogRecord) -> str:
+        try:
+            return self.format(record)
+        except Exception as e:
+            return f'{record.name}: record could not be formatted ({e})'
+
+    def _send_digests(self, pending: Dict[Tuple, Dict[str, Any]]) -> None:
+        for fingerprint, entry in pending.items():
+            try:
+                self.send(self.build_message(fingerprint, entry))
+                self.sent += 1
+            except Exception as e:
+                sys.stderr.write(f'Error digest delivery failed: {e}\n')
+
+    def build_message(self, fingerprint: Tuple, entry: Dict[str, Any]) -> EmailMessage:
+        logger_name, pathname, lineno, exc_type = fingerprint
+        first = datetime.utcfromtimestamp(entry['first']).isoformat()
+        last = datetime.utcfromtimestamp(entry['last']).isoformat()
+        message = EmailMessage()
+        message['From'] = self.fromaddr
+        message['To'] = ', '.join(self.toaddrs)
+        message['Subject'] = (
+            f"{self.subject}: {exc_type or logger_name} x{entry['count']} "
+            f"[{os.path.basename(pathname)}:{lineno}]"
+        )
+        message.set_content(
+            f"Occurrences: {entry['count']}\n"
+            f"First seen: {first}Z\n"
+            f"Last seen: {last}Z\n"
+            f"Dropped (queue full): {self.dropped}\n\n"
+            f"{entry['text']}\n"
+        )
+        return message
+
+    def send(self, message: EmailMessage) -> None:
+        host, port = self.mailhost
+        with smtplib.SMTP(host, port, timeout=self.timeout) as smtp:
+            if self.secure is not None:
+                smtp.starttls(*self.secure)
+            if self.credentials:
+                smtp.login(*self.credentials)
+            smtp.send_message(message)
+
+    def close(self) -> None:
+        """Send what is pending and stop the worker."""
+        if self._thread is not None and self._thread.is_alive():
+            self.queue.put(self._sentinel)
+            self._thread.join(self.timeout)
+        self._thread = None
+        _error_digest_handlers.discard(self)
+        super().close()
+
+_error_digest_handlers = weakref.WeakSet()
+
+_queue_handlers = weakref.WeakSet()
+
+def _stop_log_listeners(logger: logging.Logger) -> None:
+    for handler in logger.handlers:
+        listener = getattr(handler, 'listener', None)
+        if listener is not None and listener._thread is not None:
+            listener.stop()
+        _queue_handlers.discard(handler)
+
+def _restart_log_listeners() -> None:
+    """Threads and queue locks do not survive fork: start over in the child."""
+    for handler in list(_queue_handlers):
+        listener = handler.listener
+        handler.queue = listener.queue = queue.Queue(maxsize=handler.queue.maxsize)
+        listener._thread = None
+        listener.start()
+    for handler in list(_error_digest_handlers):
+        handler.queue = queue.Queue(maxsize=handler.queue.maxsize)
+        handler.start()
+
+def _stop_all_log_listeners() -> None:
+    for handler in list(_queue_handlers):
+        if handler.listener._thread is not None:
+            handler.listener.stop()
+    for handler in list(_error_digest_handlers):
+        handler.close()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_restart_log_listeners)
+atexit.register(_stop_all_log_listeners)
+
 def setup_logging(app):
-    """Configure logging for the application."""
+    """Configure logging for the application.
+
+    Request threads only put records on a bounded queue; a background
+    listener formats them (plain text or JSON) and writes them to the
+    rotating file and stdout in batches. When the queue is full records
+    are dropped according to LOG_QUEUE_OVERFLOW and counted, so logging
+    never blocks a request on disk.
+    """
     # Create logs directory if it doesn't exist
     logs_dir = os.path.join(app.root_path, '..', 'logs')
     os.makedirs(logs_dir, exist_ok=True)
@@ -96,29 +492,50 @@ def setup_logging(app):
     log_level = getattr(logging, app.config.get('LOG_LEVEL', 'INFO'))
     
     # Configure the root logger
-    app.logger.handlers.clear()
+    # Keep the error digest installed by ProductionConfig.init_app
+    _stop_log_listeners(app.logger)
+    app.logger.handlers[:] = [
+        h for h in app.logger.handlers if isinstance(h, ErrorDigestHandler)
+    ]
+    
+    if app.config.get('LOG_JSON'):
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
+        )
     
     # File handler for all logs
-    file_handler = RotatingFileHandler(
+    file_handler = BatchRotatingFileHandler(
         os.path.join(logs_dir, 'app.log'),
         maxBytes=1024 * 1024 * 10,  # 10MB
         backupCount=10
     )
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
+    file_handler.setFormatter(formatter)
     file_handler.setLevel(log_level)
     
     # Console handler for development
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'
-    ))
+    console_handler = BatchStreamHandler(sys.stdout)
+    console_handler.setFormatter(formatter)
     console_handler.setLevel(log_level)
     
+    # Request threads only enqueue; the listener thread does the I/O
+    queue_handler = NonBlockingQueueHandler(
+        queue.Queue(maxsize=app.config.get('LOG_QUEUE_SIZE', 10000)),
+        overflow=app.config.get('LOG_QUEUE_OVERFLOW', 'drop_new')
+    )
+    queue_handler.setLevel(log_level)
+    
+    queue_handler.listener = BatchingQueueListener(
+        queue_handler.queue, file_handler, console_handler,
+        source=queue_handler,
+        batch_size=app.config.get('LOG_BATCH_SIZE', 256)
+    )
+    queue_handler.listener.start()
+    _queue_handlers.add(queue_handler)
+    
     # Add handlers to the application's logger
-    app.logger.addHandler(file_handler)
-    app.logger.addHandler(console_handler)
+    app.logger.addHandler(queue_handler)
     app.logger.setLevel(log_level)
     
     # Set SQLAlchemy logging
@@ -0,0 +1 @@
+"""Performance benchmarks for the Task Manager API."""
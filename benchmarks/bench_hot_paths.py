@@ -0,0 +1,90 @@
+"""Microbenchmarks of the pure-Python work done on every request.
+
+Covers payload validation, model serialization, JSON encoding of task
+lists and JWT issue/verification. See pytest.ini for running and
+comparing saved results across commits.
+"""
+from datetime import datetime, timedelta
+
+import pytest
+from flask import jsonify
+from flask_jwt_extended import decode_token
+
+from app.api import validate_task_data
+from app.auth import validate_password
+from app.models import Task
+from app.utils import dumps_json
+
+FUTURE = (datetime.utcnow() + timedelta(days=30)).isoformat()
+
+
+def make_tasks(count):
+    """Transient tasks shaped like real rows (no database involved)"""
+    base = datetime(2030, 1, 1)
+    return [Task(
+        id=i + 1,
+        title=f'Tarefa {i}',
+        description='Descrição de tamanho médio para a tarefa ' * (i % 4),
+        completed=i % 3 == 0,
+        created_at=base + timedelta(seconds=i),
+        updated_at=base + timedelta(seconds=i),
+        due_date=base + timedelta(days=i % 30) if i % 4 else None,
+        priority=i % 3 + 1,
+        user_id=1,
+    ) for i in range(count)]
+
+
+@pytest.mark.benchmark(group='validate_task_data')
+@pytest.mark.parametrize('payload', [
+    pytest.param({'title': 'Revisar relatório', 'description': 'x' * 200,
+                  'due_date': FUTURE, 'priority': 1}, id='valid'),
+    pytest.param({'title': 'x', 'description': 'x' * 2000,
+                  'due_date': 'amanhã', 'priority': 7}, id='invalid'),
+])
+def bench_validate_task_data(benchmark, payload):
+    benchmark(validate_task_data, payload)
+
+
+@pytest.mark.benchmark(group='validate_password')
+@pytest.mark.parametrize('password', ['Senha@123', 'senhafraca'], ids=['valid', 'invalid'])
+def bench_validate_password(benchmark, password):
+    benchmark(validate_password, password)
+
+
+@pytest.mark.benchmark(group='to_dict')
+def bench_task_to_dict(benchmark):
+    task = make_tasks(2)[1]
+    benchmark(task.to_dict)
+
+
+@pytest.mark.benchmark(group='to_dict')
+def bench_user_to_dict(benchmark, user):
+    benchmark(user.to_dict)
+
+
+@pytest.mark.benchmark(group='update_from_dict')
+def bench_task_update_from_dict(benchmark):
+    task = make_tasks(1)[0]
+    benchmark(task.update_from_dict, {'title': 'Atualizada', 'completed': True, 'priority': 1})
+
+
+@pytest.mark.benchmark(group='serialize')
+@pytest.mark.parametrize('count', [10, 1000, 100000])
+@pytest.mark.parametrize('serializer', ['dumps_json', 'jsonify'])
+def bench_serialize_task_list(benchmark, app, count, serializer):
+    payload = {'tasks': [task.to_dict() for task in make_tasks(count)], 'next_cursor': None}
+    if serializer == 'dumps_json':
+        benchmark(dumps_json, payload)
+    else:
+        benchmark(lambda: jsonify(payload).get_data())
+
+
+@pytest.mark.benchmark(group='jwt')
+def bench_generate_auth_token(benchmark, app, user):
+    benchmark(user.generate_auth_token)
+
+
+@pytest.mark.benchmark(group='jwt')
+def bench_verify_access_token(benchmark, app, user):
+    token = user.generate_auth_token()['access_token']
+    benchmark(decode_token, token)
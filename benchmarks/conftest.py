@@ -0,0 +1,21 @@
+from datetime import datetime
+
+import pytest
+
+from app import create_app
+from app.models import User
+
+
+@pytest.fixture(scope='session')
+def app():
+    app = create_app('testing')
+    with app.test_request_context():
+        yield app
+
+
+@pytest.fixture
+def user():
+    return User(id=1, username='bench', email='bench@example.com',
+                is_active=True, created_at=datetime(2030, 1, 1),
+                tasks_total=120, tasks_completed=40, tasks_priority_1=30,
+                tasks_priority_2=60, tasks_priority_3=30)
@@ -0,0 +1,92 @@
+"""Microbenchmark of the task read path.
+
+Compares the original pipeline (ORM objects, ``Task.to_dict`` and Flask's
+``jsonify``) with the column projection used by the read-only endpoints
+(plain tuples serialized by ``dumps_json``).
+
+Usage::
+
+    python -m benchmarks.task_serialization --rows 20000 --repeat 5
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+
+from flask import jsonify
+
+from app import create_app
+from app.api import TASK_COLUMNS, task_row_dict
+from app.models import db, Task, User
+from app.utils import dumps_json
+
+
+def seed(rows):
+    user = User(username='bench', email='bench@example.com', password_hash='x')
+    db.session.add(user)
+    db.session.commit()
+    base = datetime(2030, 1, 1)
+    db.session.execute(db.insert(Task), [{
+        'title': f'Tarefa {i}',
+        'description': 'Descrição de tamanho médio para a tarefa ' * 3,
+        'completed': i % 3 == 0,
+        'created_at': base + timedelta(seconds=i),
+        'updated_at': base + timedelta(seconds=i),
+        'due_date': base + timedelta(days=i % 30) if i % 4 else None,
+        'priority': i % 3 + 1,
+        'user_id': user.id,
+    } for i in range(rows)])
+    db.session.commit()
+    return user.id
+
+
+def orm_pipeline(user_id):
+    tasks = Task.query.filter_by(user_id=user_id).order_by(Task.created_at.desc()).all()
+    body = jsonify([task.to_dict() for task in tasks]).get_data()
+    db.session.expunge_all()
+    return body
+
+
+def projection_pipeline(user_id):
+    rows = db.session.execute(
+        db.select(*TASK_COLUMNS)
+        .where(Task.user_id == user_id)
+        .order_by(Task.created_at.desc())
+    ).all()
+    return dumps_json([task_row_dict(row) for row in rows])
+
+
+def best_of(func, user_id, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(user_id)
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app('testing')
+    with app.test_request_context():
+        db.create_all()
+        user_id = seed(args.rows)
+
+        assert json.loads(orm_pipeline(user_id)) == json.loads(projection_pipeline(user_id))
+
+        results = {
+            'orm + to_dict + jsonify': best_of(orm_pipeline, user_id, args.repeat),
+            'projection + dumps_json': best_of(projection_pipeline, user_id, args.repeat),
+        }
+        baseline = results['orm + to_dict + jsonify']
+        for name, elapsed in results.items():
+            print(f'{name:<26} {elapsed * 1000:9.1f} ms  '
+                  f'{args.rows / elapsed:12,.0f} rows/s  {baseline / elapsed:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
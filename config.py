@@ -37,6 +37,15 @@ class Config:
     SECURITY_RECOVERABLE = True
     SECURITY_CHANGEABLE = True
     SECURITY_SEND_REGISTER_EMAIL = False
+    # Consulta DNS do domínio do email no registro
+    EMAIL_CHECK_DELIVERABILITY = os.getenv('EMAIL_CHECK_DELIVERABILITY', 'true').lower() in ('true', '1', 't')
+    
+    # Hashing de senhas: método completo (algoritmo e iterações) e pool limitado
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv('PASSWORD_HASH_QUEUE_SIZE', 16))
+    PASSWORD_HASH_TIMEOUT = 10  # segundos aguardando o pool
+    PASSWORD_HASH_RETRY_AFTER = 1  # segundos, cabeçalho Retry-After do 503
     
     # Configurações de email
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
@@ -45,27 +54,96 @@ class Config:
     MAIL_USERNAME = os.getenv('MAIL_USERNAME', '')
     MAIL_PASSWORD = os.getenv('MAIL_PASSWORD', '')
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@example.com')
+    ERROR_MAIL_WINDOW = int(os.getenv('ERROR_MAIL_WINDOW', 60))  # segundos de agregação
+    ERROR_MAIL_QUEUE_SIZE = int(os.getenv('ERROR_MAIL_QUEUE_SIZE', 1000))
+    ERROR_MAIL_TIMEOUT = int(os.getenv('ERROR_MAIL_TIMEOUT', 10))
     
     # Configurações de upload
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf'}
     
+    # Paginação
+    TASKS_PAGE_SIZE = int(os.getenv('TASKS_PAGE_SIZE', 50))
+    TASKS_MAX_PAGE_SIZE = int(os.getenv('TASKS_MAX_PAGE_SIZE', 200))
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 1000))
+    BATCH_MAX_OPERATIONS = int(os.getenv('BATCH_MAX_OPERATIONS', 1000))
+    # Stream de mudanças (SSE) e notificações via pub/sub do Redis
+    EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'redis')  # redis ou memory (um processo)
+    EVENTS_REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+    EVENTS_REDIS_SOCKET_TIMEOUT = float(os.getenv('EVENTS_REDIS_SOCKET_TIMEOUT', 0.25))
+    TASKS_STREAM_HEARTBEAT = int(os.getenv('TASKS_STREAM_HEARTBEAT', 15))  # segundos
+    TASKS_STREAM_MAX_DURATION = int(os.getenv('TASKS_STREAM_MAX_DURATION', 300))  # segundos
+    TASKS_STREAM_RETRY_MS = 3000
+    TASKS_STREAM_BUFFER = 16  # notificações pendentes por conexão
+    # Streams abertos por processo; cada um ocupa uma thread do worker gthread.
+    # Acima disso, 503 + Retry-After. 0 desliga (workers gevent)
+    TASKS_STREAM_MAX_PER_WORKER = int(os.getenv('TASKS_STREAM_MAX_PER_WORKER', 1))
+    # Lápides de tarefas removidas (sincronização incremental) mais antigas são
+    # apagadas por `flask prune-tombstones`; tokens anteriores recebem 410
+    TASKS_TOMBSTONE_RETENTION_DAYS = int(os.getenv('TASKS_TOMBSTONE_RETENTION_DAYS', 30))
+    # Tarefas removidas por transação ao excluir uma conta (flask delete-user)
+    USER_DELETE_BATCH_SIZE = int(os.getenv('USER_DELETE_BATCH_SIZE', 5000))
+    
+    # Réplicas de leitura (separadas por vírgula); vazio usa só o primário
+    SQLALCHEMY_REPLICA_URIS = [
+        uri.strip() for uri in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if uri.strip()
+    ]
+    REPLICA_MAX_LAG = float(os.getenv('REPLICA_MAX_LAG', 5))  # segundos
+    REPLICA_LAG_CHECK_INTERVAL = 2  # segundos entre medições de atraso
+    REPLICA_STICKY_SECONDS = float(os.getenv('REPLICA_STICKY_SECONDS', 5))  # leitura das próprias escritas
+    REPLICA_STICKY_REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+    
+    # Redis compartilhado (health checks e utilitários)
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+    REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', 20))
+    REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', 1))
+    
+    # Health checks
+    HEALTH_CHECK_TTL = int(os.getenv('HEALTH_CHECK_TTL', 5))  # segundos em cache
+    HEALTH_CHECK_MAX_STALE = 30  # acima disso o probe espera a nova verificação
+    HEALTH_CHECK_TIMEOUT = float(os.getenv('HEALTH_CHECK_TIMEOUT', 2))  # por verificação
+    
     # Configurações de cache
-    CACHE_TYPE = 'redis'
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'redis')  # redis, simple ou null
     CACHE_REDIS_URL = os.getenv('REDIS_URL', 'redis://redis:6379/0')
+    CACHE_REDIS_SOCKET_TIMEOUT = float(os.getenv('CACHE_REDIS_SOCKET_TIMEOUT', 0.25))
+    CACHE_KEY_PREFIX = 'tm:'
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 30))  # segundos
+    CACHE_MAX_ENTRY_BYTES = 256 * 1024  # respostas maiores não são cacheadas
+    CACHE_THRESHOLD = 500  # máximo de entradas no backend simple
+    CACHE_RETRY_INTERVAL = 5  # segundos sem usar o Redis após uma falha
     
     # Configurações de rate limiting
-    RATELIMIT_DEFAULT = os.getenv('RATELIMIT_DEFAULT', '200 per day')
-    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'redis://redis:6379/1')
+    RATELIMIT_DEFAULT = os.getenv('RATELIMIT_DEFAULT', '200 per day;50 per hour')
+    RATELIMIT_STORAGE_URL = os.getenv('RATELIMIT_STORAGE_URL', 'redis://redis:6379/1')  # ou memory://
+    RATELIMIT_SOCKET_TIMEOUT = float(os.getenv('RATELIMIT_SOCKET_TIMEOUT', 0.25))
+    RATELIMIT_FAIL_OPEN = os.getenv('RATELIMIT_FAIL_OPEN', 'true').lower() in ('true', '1', 't')
+    RATELIMIT_RETRY_INTERVAL = 5  # segundos sem usar o Redis após uma falha
+    RATELIMIT_LEASE_SIZE = int(os.getenv('RATELIMIT_LEASE_SIZE', 20))  # 0 desliga o lease local
+    RATELIMIT_LEASE_TTL = float(os.getenv('RATELIMIT_LEASE_TTL', 1.0))  # segundos
+    RATELIMIT_AUTH_LOGIN = os.getenv('RATELIMIT_AUTH_LOGIN', '5 per minute;20 per hour')
+    RATELIMIT_TASKS = os.getenv('RATELIMIT_TASKS', '300 per minute')
+    # Proxies confiáveis na frente da aplicação (Traefik = 1). O rate limit por
+    # endereço usa o X-Forwarded-For deixado por eles; 0 ignora o cabeçalho
+    PROXY_FIX_X_FOR = int(os.getenv('PROXY_FIX_X_FOR', 0))
     
     # CORS
     CORS_HEADERS = 'Content-Type'
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', '*').split(',')
     
+    # Profiler de SQL por requisição (amostragem ou cabeçalho X-Profile de admin)
+    PROFILER_ENABLED = os.getenv('PROFILER_ENABLED', 'false').lower() in ('true', '1', 't')
+    PROFILER_SAMPLE_RATE = float(os.getenv('PROFILER_SAMPLE_RATE', 0.01))
+    PROFILER_N_PLUS_ONE_THRESHOLD = int(os.getenv('PROFILER_N_PLUS_ONE_THRESHOLD', 5))
+    
     # Logging
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+    LOG_JSON = os.getenv('LOG_JSON', 'false').lower() in ('true', '1', 't')
+    LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', 10000))
+    LOG_QUEUE_OVERFLOW = os.getenv('LOG_QUEUE_OVERFLOW', 'drop_new')  # or drop_oldest
+    LOG_BATCH_SIZE = int(os.getenv('LOG_BATCH_SIZE', 256))
     
     @staticmethod
     def init_app(app):
@@ -87,6 +165,14 @@ class TestingConfig(Config):
     """Configurações para ambiente de teste"""
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    SQLALCHEMY_ENGINE_OPTIONS = {}  # SQLite não aceita pool_size/max_overflow
+    RATELIMIT_ENABLED = False
+    RATELIMIT_STORAGE_URL = 'memory://'
+    CACHE_TYPE = 'null'
+    EVENTS_BACKEND = 'memory'
+    REPLICA_STICKY_REDIS_URL = None
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'  # barato para os testes
+    EMAIL_CHECK_DELIVERABILITY = False
     WTF_CSRF_ENABLED = False
     PRESERVE_CONTEXT_ON_EXCEPTION = False
     LOGIN_DISABLED = True
@@ -104,25 +190,32 @@ class ProductionConfig(Config):
         Config.init_app(app)
         # Configurações específicas para produção
         import logging
-        from logging.handlers import SMTPHandler
+        from app.utils import ErrorDigestHandler
         
-        # Envia erros por email
+        # Envia erros por email, agrupados e fora da thread da requisição
         credentials = None
         secure = None
-        if getattr(cls, 'MAIL_USERNAME', None) is not None:
+        if getattr(cls, 'MAIL_USERNAME', None):
             credentials = (cls.MAIL_USERNAME, cls.MAIL_PASSWORD)
             if getattr(cls, 'MAIL_USE_TLS', None):
                 secure = ()
         
-        mail_handler = SMTPHandler(
+        for handler in [h for h in app.logger.handlers if isinstance(h, ErrorDigestHandler)]:
+            app.logger.removeHandler(handler)
+            handler.close()
+        
+        mail_handler = ErrorDigestHandler(
             mailhost=(cls.MAIL_SERVER, cls.MAIL_PORT),
             fromaddr=cls.MAIL_DEFAULT_SENDER,
             toaddrs=[cls.MAIL_DEFAULT_SENDER],
             subject='Falha na Aplicação',
             credentials=credentials,
-            secure=secure
+            secure=secure,
+            window=cls.ERROR_MAIL_WINDOW,
+            queue_size=cls.ERROR_MAIL_QUEUE_SIZE,
+            timeout=cls.ERROR_MAIL_TIMEOUT
         )
-        mail_handler.setLevel(logging.ERROR)
+        mail_handler.setFormatter(logging.Formatter(cls.LOG_FORMAT))
         app.logger.addHandler(mail_handler)
 
 
@@ -0,0 +1,40 @@
+"""Gunicorn hooks, loaded automatically from the working directory.
+
+When PROMETHEUS_MULTIPROC_DIR is set every worker writes its metrics to
+that directory; it is emptied when the master starts and the files of
+dead workers are marked so their live gauges stop counting.
+
+The task stream (/api/v1/tasks/stream) holds a connection open per client.
+On gthread workers each stream pins a thread, so a worker serves at most
+TASKS_STREAM_MAX_PER_WORKER of them (503 + Retry-After past that) and
+keeps its other threads for the API. To hold many streams, the ``stream``
+service in docker-compose.yml runs gevent workers, where an idle stream is
+a parked greenlet instead of a thread, with TASKS_STREAM_MAX_PER_WORKER=0;
+traefik routes /api/v1/tasks/stream there and everything else to ``app``.
+
+Keep the rest of the API on gthread: password hashing is CPU-bound and
+would stall the gevent hub.
+"""
+import glob
+import os
+
+
+def on_starting(server):
+    path = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        os.makedirs(path, exist_ok=True)
+        for stale in glob.glob(os.path.join(path, '*.db')):
+            os.remove(stale)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    # psycopg2 talks to PostgreSQL in C; make it yield to other greenlets
+    if server.cfg.worker_class_str == 'gevent':
+        from psycogreen.gevent import patch_psycopg
+        patch_psycopg()
@@ -0,0 +1,29 @@
+"""Versão das tarefas do usuário
+
+Acrescenta users.task_version, incrementada a cada escrita nas tarefas do
+usuário; é dela que saem o ETag e a chave de cache da listagem.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 22:51:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('task_version', sa.Integer(), nullable=False,
+                                     server_default='0'))
+
+
+def downgrade():
+    # Sem batch: no SQLite, recriar users esbarraria nas chaves de tasks
+    op.drop_column('users', 'task_version')
@@ -0,0 +1,53 @@
+"""Contadores de tarefas por usuário
+
+Acrescenta a users o total de tarefas, as concluídas e as de cada
+prioridade, preenchidos a partir das tarefas existentes; /tasks/stats passa
+a ler uma linha em vez de contar as tarefas.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 22:51:10.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+COUNTERS = ('tasks_total', 'tasks_completed', 'tasks_priority_1', 'tasks_priority_2',
+            'tasks_priority_3')
+
+
+def backfill_counters():
+    users = sa.table('users', sa.column('id'), *(sa.column(name) for name in COUNTERS))
+    tasks = sa.table('tasks', sa.column('user_id'), sa.column('completed', sa.Boolean),
+                     sa.column('priority'))
+
+    def count(*conditions):
+        return sa.select(sa.func.count()).where(
+            tasks.c.user_id == users.c.id, *conditions
+        ).scalar_subquery()
+
+    op.execute(users.update().values(
+        tasks_total=count(),
+        tasks_completed=count(tasks.c.completed == sa.true()),
+        **{f'tasks_priority_{p}': count(tasks.c.priority == p) for p in (1, 2, 3)},
+    ))
+
+
+def upgrade():
+    for name in COUNTERS:
+        op.add_column('users', sa.Column(name, sa.Integer(), nullable=False,
+                                         server_default='0'))
+    backfill_counters()
+
+
+def downgrade():
+    # Sem batch: no SQLite, recriar users esbarraria nas chaves de tasks
+    for name in reversed(COUNTERS):
+        op.drop_column('users', name)
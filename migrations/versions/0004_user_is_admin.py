@@ -0,0 +1,28 @@
+"""Administradores
+
+Acrescenta users.is_admin, que libera o cabeçalho X-Profile do profiler.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 22:51:20.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('is_admin', sa.Boolean(), server_default=sa.false(),
+                                     nullable=False))
+
+
+def downgrade():
+    # Sem batch: no SQLite, recriar users esbarraria nas chaves de tasks
+    op.drop_column('users', 'is_admin')
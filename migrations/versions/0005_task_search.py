@@ -0,0 +1,70 @@
+"""Busca textual nas tarefas
+
+Coluna tsvector gerada e índice GIN no PostgreSQL; tabela FTS5 externa com
+triggers no SQLite, reconstruída com as tarefas existentes.
+
+O DDL fica copiado aqui, e não importado de app.models, para que mudanças
+futuras nos modelos não reescrevam esta revisão.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 22:51:30.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+POSTGRES_SEARCH_DDL = (
+    """ALTER TABLE tasks ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('portuguese', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('portuguese', coalesce(description, '')), 'B')
+    ) STORED""",
+    'CREATE INDEX IF NOT EXISTS ix_tasks_search_vector ON tasks USING gin (search_vector)',
+)
+
+SQLITE_SEARCH_DDL = (
+    """CREATE VIRTUAL TABLE IF NOT EXISTS tasks_fts USING fts5(
+        title, description, content='tasks', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    # Indexa as tarefas que já existiam
+    "INSERT INTO tasks_fts (tasks_fts) VALUES ('rebuild')",
+)
+
+
+def upgrade():
+    ddl = {'postgresql': POSTGRES_SEARCH_DDL, 'sqlite': SQLITE_SEARCH_DDL}
+    for statement in ddl.get(op.get_bind().dialect.name, ()):
+        op.execute(statement)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute('DROP INDEX IF EXISTS ix_tasks_search_vector')
+        op.execute('ALTER TABLE tasks DROP COLUMN IF EXISTS search_vector')
+    elif dialect == 'sqlite':
+        for trigger in ('tasks_fts_insert', 'tasks_fts_delete', 'tasks_fts_update'):
+            op.execute(f'DROP TRIGGER IF EXISTS {trigger}')
+        op.execute('DROP TABLE IF EXISTS tasks_fts')
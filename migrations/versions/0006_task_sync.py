@@ -0,0 +1,51 @@
+"""Sincronização incremental
+
+Acrescenta users.sync_floor, tasks.change_seq (a task_version da última
+escrita em cada tarefa, zero nas que já existiam) e task_tombstones, as
+lápides das tarefas removidas.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 22:51:40.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('sync_floor', sa.Integer(), nullable=False,
+                                     server_default='0'))
+    op.add_column('tasks', sa.Column('change_seq', sa.Integer(), nullable=False,
+                                     server_default='0'))
+    op.create_index('ix_tasks_user_id_change_seq', 'tasks', ['user_id', 'change_seq', 'id'])
+
+    op.create_table('task_tombstones',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('task_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('change_seq', sa.Integer(), nullable=False),
+    sa.Column('deleted_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_task_tombstones_deleted_at', 'task_tombstones', ['deleted_at'])
+    op.create_index('ix_task_tombstones_user_id_change_seq', 'task_tombstones',
+                    ['user_id', 'change_seq', 'task_id'])
+
+
+def downgrade():
+    op.drop_table('task_tombstones')
+
+    op.drop_index('ix_tasks_user_id_change_seq', table_name='tasks')
+    # Sem batch: no SQLite, recriar tasks descartaria os triggers da busca
+    op.drop_column('tasks', 'change_seq')
+    # Sem batch: no SQLite, recriar users esbarraria nas chaves de tasks
+    op.drop_column('users', 'sync_floor')
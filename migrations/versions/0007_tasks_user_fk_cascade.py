@@ -0,0 +1,69 @@
+"""Exclusão em cascata das tarefas
+
+Troca a chave estrangeira tasks.user_id por uma com ON DELETE CASCADE, para
+que remover um usuário não precise carregar as suas tarefas.
+
+O DDL dos triggers da busca fica copiado aqui, e não importado de
+app.models, para que mudanças futuras nos modelos não reescrevam esta
+revisão.
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17 22:51:50.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0007'
+down_revision = '0006'
+branch_labels = None
+depends_on = None
+
+# Nome que o PostgreSQL dá à chave sem nome de 0001; no SQLite, o batch o
+# atribui pela convenção
+TASKS_USER_FK = 'tasks_user_id_fkey'
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+# Recriar tasks no SQLite descarta os triggers da busca (revisão 0005);
+# a tabela FTS5 continua indexando os mesmos ids
+SQLITE_SEARCH_TRIGGERS = (
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF title, description ON tasks BEGIN
+        INSERT INTO tasks_fts (tasks_fts, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO tasks_fts (rowid, title, description)
+        VALUES (new.id, new.title, new.description);
+    END""",
+)
+
+
+def restore_search_triggers():
+    if op.get_bind().dialect.name == 'sqlite':
+        for statement in SQLITE_SEARCH_TRIGGERS:
+            op.execute(statement)
+
+
+def upgrade():
+    # No SQLite, trocar a chave estrangeira recria a tabela
+    with op.batch_alter_table('tasks', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(TASKS_USER_FK, type_='foreignkey')
+        batch_op.create_foreign_key(TASKS_USER_FK, 'users', ['user_id'], ['id'],
+                                    ondelete='CASCADE')
+    restore_search_triggers()
+
+
+def downgrade():
+    with op.batch_alter_table('tasks', naming_convention=NAMING_CONVENTION) as batch_op:
+        batch_op.drop_constraint(TASKS_USER_FK, type_='foreignkey')
+        batch_op.create_foreign_key(TASKS_USER_FK, 'users', ['user_id'], ['id'])
+    restore_search_triggers()
@@ -0,0 +1,50 @@
+"""Índices compostos e parcial da listagem de tarefas
+
+Substitui o índice simples em tasks.user_id por índices (user_id, filtro,
+coluna de ordenação, id) que entregam cada página de GET /tasks já
+ordenada. No PostgreSQL os índices são criados com CONCURRENTLY, sem
+bloquear as escritas em tasks durante a construção.
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-17 22:55:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+INDEXES = (
+    ('ix_tasks_user_id_created_at', ['user_id', 'created_at', 'id'], {}),
+    ('ix_tasks_user_id_completed_created_at', ['user_id', 'completed', 'created_at', 'id'], {}),
+    ('ix_tasks_user_id_due_date', ['user_id', 'due_date', 'id'], {}),
+    ('ix_tasks_user_id_open_due_date', ['user_id', 'due_date', 'id'], {
+        'postgresql_where': sa.text('completed = false'),
+        'sqlite_where': sa.text('completed = 0'),
+    }),
+    ('ix_tasks_user_id_priority', ['user_id', 'priority', 'id'], {}),
+    ('ix_tasks_user_id_completed_priority', ['user_id', 'completed', 'priority', 'id'], {}),
+)
+
+
+def upgrade():
+    # CONCURRENTLY não roda dentro de uma transação. Se a construção falhar,
+    # o PostgreSQL deixa o índice como INVALID: remova-o antes de repetir
+    with op.get_context().autocommit_block():
+        for name, columns, options in INDEXES:
+            op.create_index(name, 'tasks', columns, postgresql_concurrently=True, **options)
+        # Todos os novos começam por user_id e atendem a chave estrangeira
+        op.drop_index('ix_tasks_user_id', table_name='tasks', postgresql_concurrently=True)
+
+
+def downgrade():
+    with op.get_context().autocommit_block():
+        op.create_index('ix_tasks_user_id', 'tasks', ['user_id'], postgresql_concurrently=True)
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name='tasks', postgresql_concurrently=True)
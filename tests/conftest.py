@@ -0,0 +1,34 @@
+import pytest
+
+from app import create_app
+from app.models import db, User
+
+
+@pytest.fixture
+def app():
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def user(app):
+    user = User(username='tester', email='tester@example.com')
+    user.set_password('Senha@123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def auth_headers(user):
+    token = user.generate_auth_token()['access_token']
+    return {'Authorization': f'Bearer {token}'}
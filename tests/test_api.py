@@ -0,0 +1,525 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import event
+
+from app import create_app
+from app.api import encode_cursor
+from app.models import db, Task, User
+from config import TestingConfig, config
+
+
+@pytest.fixture
+def many_tasks(user):
+    """25 tarefas com created_at repetido e due_date parcialmente nulo"""
+    base = datetime(2030, 1, 1)
+    tasks = []
+    for i in range(25):
+        tasks.append(Task(
+            title=f'Tarefa {i:02d}',
+            user_id=user.id,
+            priority=(i % 3) + 1,
+            completed=i % 2 == 0,
+            created_at=base + timedelta(hours=i // 2),
+            due_date=base + timedelta(days=i % 4) if i % 5 else None,
+        ))
+    db.session.add_all(tasks)
+    db.session.commit()
+    return tasks
+
+
+def fetch_all_pages(client, headers, **params):
+    ids, cursor, pages = [], None, 0
+    while True:
+        query = dict(params)
+        if cursor:
+            query['cursor'] = cursor
+        response = client.get('/api/v1/tasks', headers=headers, query_string=query)
+        assert response.status_code == 200
+        body = response.get_json()
+        ids.extend(task['id'] for task in body['tasks'])
+        cursor = body['next_cursor']
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+
+@pytest.mark.parametrize('sort_by', ['created_at', 'due_date', 'priority'])
+@pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+def test_cursor_pagination_matches_full_ordering(client, auth_headers, many_tasks,
+                                                 sort_by, sort_order):
+    ids, pages = fetch_all_pages(client, auth_headers, sort_by=sort_by,
+                                 sort_order=sort_order, limit=4)
+
+    descending = sort_order == 'desc'
+    present = [t for t in many_tasks if getattr(t, sort_by) is not None]
+    missing = [t for t in many_tasks if getattr(t, sort_by) is None]
+    # Nulos ficam por último nos dois sentidos, desempatados pelo id
+    expected = sorted(present, key=lambda t: (getattr(t, sort_by), t.id), reverse=descending)
+    expected += sorted(missing, key=lambda t: t.id, reverse=descending)
+    assert ids == [task.id for task in expected]
+    assert pages == 7
+
+
+def test_cursor_pagination_with_filters(client, auth_headers, many_tasks):
+    ids, _ = fetch_all_pages(client, auth_headers, completed='true', priority=1, limit=2)
+    expected = {t.id for t in many_tasks if t.completed and t.priority == 1}
+    assert sorted(ids) == sorted(expected)
+    assert len(ids) == len(set(ids))
+
+
+@pytest.mark.parametrize('sort_order', ['asc', 'desc'])
+def test_cursor_pagination_when_filter_fixes_sort_column(client, auth_headers, many_tasks,
+                                                         sort_order):
+    ids, _ = fetch_all_pages(client, auth_headers, priority=2, sort_by='priority',
+                             sort_order=sort_order, limit=3)
+    expected = sorted((t.id for t in many_tasks if t.priority == 2),
+                      reverse=sort_order == 'desc')
+    assert ids == expected
+
+
+def test_limit_is_capped_by_server_max(app, client, auth_headers, many_tasks):
+    app.config['TASKS_MAX_PAGE_SIZE'] = 10
+    response = client.get('/api/v1/tasks?limit=1000', headers=auth_headers)
+    body = response.get_json()
+    assert body['limit'] == 10
+    assert len(body['tasks']) == 10
+    assert body['next_cursor'] is not None
+
+
+def test_list_without_limit_or_cursor_keeps_array_contract(app, client, auth_headers,
+                                                           many_tasks):
+    app.config['TASKS_PAGE_SIZE'] = 5
+    response = client.get('/api/v1/tasks?sort_by=priority&sort_order=asc',
+                          headers=auth_headers)
+    body = response.get_json()
+    assert isinstance(body, list)
+    assert len(body) == len(many_tasks)
+    assert [task['id'] for task in body] == [
+        t.id for t in sorted(many_tasks, key=lambda t: (t.priority, t.id))
+    ]
+
+
+def test_invalid_cursor_is_rejected(client, auth_headers, many_tasks):
+    response = client.get('/api/v1/tasks?cursor=nao-e-um-cursor', headers=auth_headers)
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('value', [5, ['2030-01-01'], 'ontem'])
+def test_cursor_with_invalid_value_is_rejected(client, auth_headers, many_tasks, value):
+    cursor = encode_cursor('created_at', 'desc', value, 1)
+    response = client.get('/api/v1/tasks', query_string={'cursor': cursor},
+                          headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_cursor_from_other_ordering_is_rejected(client, auth_headers, many_tasks):
+    first = client.get('/api/v1/tasks?limit=2&sort_by=priority', headers=auth_headers)
+    cursor = first.get_json()['next_cursor']
+    response = client.get(f'/api/v1/tasks?limit=2&sort_by=created_at&cursor={cursor}',
+                          headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_export_ndjson_streams_every_task(app, client, auth_headers, many_tasks):
+    app.config['EXPORT_BATCH_SIZE'] = 7
+    response = client.get('/api/v1/tasks/export?format=ndjson', headers=auth_headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    assert response.is_streamed
+
+    lines = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    assert [row['id'] for row in lines] == sorted(t.id for t in many_tasks)
+    assert lines[0]['created_at'] == many_tasks[0].created_at.isoformat()
+
+
+def test_export_csv_applies_filters(client, auth_headers, many_tasks):
+    response = client.get('/api/v1/tasks/export?format=csv&completed=true',
+                          headers=auth_headers)
+    assert response.mimetype == 'text/csv'
+
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert {int(row['id']) for row in rows} == {t.id for t in many_tasks if t.completed}
+
+
+def test_export_rejects_unknown_format(client, auth_headers):
+    response = client.get('/api/v1/tasks/export?format=xml', headers=auth_headers)
+    assert response.status_code == 400
+
+
+def test_batch_applies_every_operation_in_one_request(client, auth_headers, user):
+    existing = [Task(title=f'Existente {i}', user_id=user.id) for i in range(3)]
+    db.session.add_all(existing)
+    db.session.commit()
+    ids = [task.id for task in existing]
+
+    response = client.post('/api/v1/tasks/batch', headers=auth_headers, json={
+        'operations': [
+            {'op': 'create', 'data': {'title': 'Nova tarefa 1', 'priority': 1}},
+            {'op': 'update', 'id': ids[0], 'data': {'title': 'Atualizada', 'completed': True}},
+            {'op': 'toggle', 'id': ids[1]},
+            {'op': 'delete', 'id': ids[2]},
+            {'op': 'create', 'data': {'title': 'Nova tarefa 2'}},
+            {'op': 'delete', 'id': 999999},
+        ]
+    })
+    assert response.status_code == 200
+    results = response.get_json()['results']
+
+    assert [r['status'] for r in results] == [201, 200, 200, 200, 201, 404]
+    assert results[2]['completed'] is True
+
+    db.session.expire_all()
+    assert db.session.get(Task, results[0]['id']).priority == 1
+    assert db.session.get(Task, results[4]['id']).title == 'Nova tarefa 2'
+    assert results[0]['id'] < results[4]['id']
+    updated = db.session.get(Task, ids[0])
+    assert (updated.title, updated.completed) == ('Atualizada', True)
+    assert db.session.get(Task, ids[2]) is None
+
+
+def test_batch_is_rejected_as_a_whole_when_any_item_is_invalid(client, auth_headers, user):
+    response = client.post('/api/v1/tasks/batch', headers=auth_headers, json={
+        'operations': [
+            {'op': 'create', 'data': {'title': 'Válida'}},
+            {'op': 'create', 'data': {'title': 'x'}},
+            {'op': 'rename', 'id': 1},
+        ]
+    })
+    assert response.status_code == 400
+    assert set(response.get_json()['errors']) == {'1', '2'}
+    assert Task.query.count() == 0
+
+
+def test_batch_cannot_touch_other_users_tasks(client, auth_headers, user):
+    other = User(username='outro', email='outro@example.com')
+    other.set_password('Senha@123')
+    db.session.add(other)
+    db.session.commit()
+    foreign = Task(title='Alheia', user_id=other.id)
+    db.session.add(foreign)
+    db.session.commit()
+
+    response = client.post('/api/v1/tasks/batch', headers=auth_headers, json={
+        'operations': [
+            {'op': 'update', 'id': foreign.id, 'data': {'title': 'Invadida'}},
+            {'op': 'toggle', 'id': foreign.id + 1000},
+        ]
+    })
+    assert [r['status'] for r in response.get_json()['results']] == [404, 404]
+    response = client.post('/api/v1/tasks/batch', headers=auth_headers, json={
+        'operations': [{'op': 'delete', 'id': foreign.id}]
+    })
+    assert response.get_json()['results'][0]['status'] == 404
+    db.session.expire_all()
+    assert db.session.get(Task, foreign.id).title == 'Alheia'
+
+
+def test_list_returns_304_while_nothing_changes(client, auth_headers, many_tasks):
+    first = client.get('/api/v1/tasks', headers=auth_headers)
+    etag = first.headers['ETag']
+
+    again = client.get('/api/v1/tasks', headers={**auth_headers, 'If-None-Match': etag})
+    assert again.status_code == 304
+    assert again.data == b''
+
+    client.post(f'/api/v1/tasks/toggle/{many_tasks[0].id}', headers=auth_headers)
+    changed = client.get('/api/v1/tasks', headers={**auth_headers, 'If-None-Match': etag})
+    assert changed.status_code == 200
+    assert changed.headers['ETag'] != etag
+
+
+def test_task_etag_and_if_match(client, auth_headers, many_tasks):
+    task_id = many_tasks[0].id
+    etag = client.get(f'/api/v1/tasks/{task_id}', headers=auth_headers).headers['ETag']
+    response = client.get(f'/api/v1/tasks/{task_id}',
+                          headers={**auth_headers, 'If-None-Match': etag})
+    assert response.status_code == 304
+
+    updated = client.put(f'/api/v1/tasks/{task_id}', json={'title': 'Primeira edição'},
+                         headers={**auth_headers, 'If-Match': etag})
+    assert updated.status_code == 200
+    assert updated.headers['ETag'] != etag
+
+    stale = client.put(f'/api/v1/tasks/{task_id}', json={'title': 'Edição atrasada'},
+                       headers={**auth_headers, 'If-Match': etag})
+    assert stale.status_code == 412
+    stale = client.delete(f'/api/v1/tasks/{task_id}',
+                          headers={**auth_headers, 'If-Match': etag})
+    assert stale.status_code == 412
+
+    deleted = client.delete(f'/api/v1/tasks/{task_id}',
+                            headers={**auth_headers, 'If-Match': updated.headers['ETag']})
+    assert deleted.status_code == 200
+
+
+def test_concurrent_toggles_do_not_lose_updates(tmp_path, monkeypatch):
+    """Várias conexões alternando a mesma tarefa: nenhuma alternância se perde"""
+    class FileTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "tasks.db"}'
+
+    monkeypatch.setitem(config, 'file-testing', FileTestingConfig)
+    app = create_app('file-testing')
+    with app.app_context():
+        db.create_all()
+        user = User(username='tester', email='tester@example.com')
+        db.session.add(user)
+        db.session.flush()
+        task = Task(title='Disputada', user_id=user.id, priority=1)
+        db.session.add(task)
+        db.session.commit()
+        User.recount_task_stats()
+        db.session.commit()
+        task_id, user_id = task.id, user.id
+        headers = {'Authorization': f'Bearer {user.generate_auth_token()["access_token"]}'}
+
+    def toggle_many(_):
+        client = app.test_client()
+        return [client.post(f'/api/v1/tasks/toggle/{task_id}', headers=headers).status_code
+                for _ in range(5)]
+
+    with ThreadPoolExecutor(max_workers=7) as pool:
+        statuses = [status for batch in pool.map(toggle_many, range(7)) for status in batch]
+
+    assert statuses == [200] * 35
+    with app.app_context():
+        assert db.session.get(Task, task_id).completed is True
+        user = db.session.get(User, user_id)
+        assert (user.tasks_completed, user.task_version) == (1, 35)
+        db.session.remove()
+
+
+@pytest.mark.parametrize('method, path, body', [
+    ('post', '/api/v1/tasks/toggle/{id}', None),
+    ('put', '/api/v1/tasks/{id}', {'title': 'Editada', 'priority': 3, 'completed': True}),
+    ('delete', '/api/v1/tasks/{id}', None),
+])
+def test_single_task_writes_use_two_statements(client, auth_headers, user, method, path, body):
+    """A escrita da tarefa (com o estado anterior) e um UPDATE em users"""
+    created = client.post('/api/v1/tasks', headers=auth_headers,
+                          json={'title': 'Medida', 'priority': 1}).get_json()['task']
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if 'tasks' in statement or 'users' in statement:
+            statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        response = getattr(client, method)(path.format(id=created['id']),
+                                           headers=auth_headers, json=body)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    assert response.status_code == 200
+    writes = [s for s in statements if not s.lstrip().startswith('INSERT INTO task_tombstones')]
+    # O SELECT da autenticação não conta
+    writes = [s for s in writes if not s.lstrip().startswith('SELECT')]
+    assert len(writes) == 2, writes
+
+    db.session.expire_all()
+    before = user.task_stats()
+    User.recount_task_stats()
+    db.session.expire_all()
+    assert user.task_stats() == before
+
+
+def test_counters_follow_every_write_path(client, auth_headers, user):
+    ids = []
+    for priority in (1, 2, 2, 3):
+        response = client.post('/api/v1/tasks', headers=auth_headers,
+                               json={'title': f'Prioridade {priority}', 'priority': priority})
+        ids.append(response.get_json()['task']['id'])
+
+    client.post(f'/api/v1/tasks/toggle/{ids[0]}', headers=auth_headers)
+    client.put(f'/api/v1/tasks/{ids[1]}', headers=auth_headers,
+               json={'title': 'Agora alta', 'priority': 1, 'completed': True})
+    client.delete(f'/api/v1/tasks/{ids[3]}', headers=auth_headers)
+    client.post('/api/v1/tasks/batch', headers=auth_headers, json={'operations': [
+        {'op': 'create', 'data': {'title': 'Em lote', 'priority': 3}},
+        {'op': 'toggle', 'id': ids[0]},
+        {'op': 'update', 'id': ids[2], 'data': {'title': 'Concluída', 'completed': True}},
+        {'op': 'delete', 'id': ids[1]},
+    ]})
+
+    stats = client.get('/api/v1/tasks/stats', headers=auth_headers).get_json()
+    assert stats == {'total': 3, 'completed': 1, 'pending': 2, 'overdue': 0,
+                     'by_priority': {'1': 1, '2': 1, '3': 1}}
+
+    # Os contadores devem bater com uma recontagem completa
+    db.session.expire_all()
+    before = user.task_stats()
+    User.recount_task_stats()
+    db.session.expire_all()
+    assert user.task_stats() == before
+
+
+def test_overdue_is_counted_from_open_tasks(client, auth_headers, user):
+    past = datetime.utcnow() - timedelta(days=1)
+    db.session.add_all([
+        Task(title='Atrasada', user_id=user.id, due_date=past),
+        Task(title='Atrasada mas concluída', user_id=user.id, due_date=past, completed=True),
+        Task(title='No prazo', user_id=user.id, due_date=past + timedelta(days=10)),
+    ])
+    db.session.commit()
+
+    stats = client.get('/api/v1/tasks/stats', headers=auth_headers).get_json()
+    assert stats['overdue'] == 1
+
+
+def test_user_to_dict_does_not_query_tasks(app, user):
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        data = user.to_dict()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert not any('FROM tasks' in statement for statement in statements)
+    assert data['tasks_count'] == 0
+
+
+def test_projection_serializer_matches_to_dict(client, auth_headers, many_tasks):
+    body = client.get('/api/v1/tasks?limit=100', headers=auth_headers).get_json()
+    by_id = {task.id: task.to_dict() for task in many_tasks}
+    assert len(body['tasks']) == len(many_tasks)
+    for task in body['tasks']:
+        assert task == by_id[task['id']]
+
+    single = client.get(f'/api/v1/tasks/{many_tasks[3].id}', headers=auth_headers)
+    assert single.get_json() == many_tasks[3].to_dict()
+
+
+@pytest.fixture
+def searchable_tasks(user):
+    other = User(username='outro', email='outro@example.com')
+    db.session.add(other)
+    db.session.flush()
+    db.session.add_all([
+        Task(title='Comprar pão', description='Padaria da esquina', user_id=user.id),
+        Task(title='Receita de pão de queijo', description='Pão, pão e mais pão',
+             user_id=user.id, completed=True),
+        Task(title='Pagar contas', description='Luz e água', user_id=user.id),
+        Task(title='Pão do vizinho', user_id=other.id),
+    ])
+    db.session.commit()
+
+
+def test_search_ranks_matches_and_ignores_accents(client, auth_headers, searchable_tasks):
+    response = client.get('/api/v1/tasks/search?q=pao', headers=auth_headers)
+    assert response.status_code == 200
+    tasks = response.get_json()['tasks']
+    # A tarefa de outro usuário não aparece; a que mais cita "pão" vem primeiro
+    assert [task['title'] for task in tasks] == ['Receita de pão de queijo', 'Comprar pão']
+    assert tasks[0]['rank'] > tasks[1]['rank']
+
+
+def test_search_combines_filters_and_paginates(client, auth_headers, searchable_tasks):
+    response = client.get('/api/v1/tasks/search?q=pão&completed=false', headers=auth_headers)
+    assert [task['title'] for task in response.get_json()['tasks']] == ['Comprar pão']
+
+    first = client.get('/api/v1/tasks/search?q=pão&limit=1', headers=auth_headers).get_json()
+    second = client.get('/api/v1/tasks/search', headers=auth_headers, query_string={
+        'q': 'pão', 'limit': 1, 'cursor': first['next_cursor']
+    }).get_json()
+    assert [t['title'] for t in first['tasks'] + second['tasks']] == [
+        'Receita de pão de queijo', 'Comprar pão'
+    ]
+    assert second['next_cursor'] is None
+
+
+def test_search_index_follows_writes(client, auth_headers, searchable_tasks):
+    task = Task.query.filter_by(title='Pagar contas').one()
+    client.put(f'/api/v1/tasks/{task.id}', headers=auth_headers,
+               json={'title': 'Pagar boleto', 'description': 'Luz e água'})
+    search = lambda q: [t['id'] for t in client.get(
+        '/api/v1/tasks/search', headers=auth_headers, query_string={'q': q}
+    ).get_json()['tasks']]
+    assert search('contas') == []
+    assert search('boleto') == [task.id]
+
+    client.delete(f'/api/v1/tasks/{task.id}', headers=auth_headers)
+    assert search('boleto') == []
+
+
+def test_search_requires_query(client, auth_headers):
+    assert client.get('/api/v1/tasks/search?q=', headers=auth_headers).status_code == 400
+    response = client.get('/api/v1/tasks/search?q=%22%2A', headers=auth_headers)
+    assert response.get_json()['tasks'] == []
+
+
+def sync(client, headers, since=None, **params):
+    if since:
+        params['since'] = since
+    response = client.get('/api/v1/tasks/changes', headers=headers, query_string=params)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_changes_returns_only_writes_after_the_token(client, auth_headers, many_tasks):
+    full = sync(client, auth_headers, limit=200)
+    assert len(full['tasks']) == 25 and full['deleted'] == [] and not full['has_more']
+    assert sync(client, auth_headers, full['sync_token'])['tasks'] == []
+
+    first, second, third = [task.id for task in many_tasks[:3]]
+    client.put(f'/api/v1/tasks/{first}', headers=auth_headers, json={'title': 'Editada'})
+    client.post(f'/api/v1/tasks/toggle/{second}', headers=auth_headers)
+    client.delete(f'/api/v1/tasks/{third}', headers=auth_headers)
+    created = client.post('/api/v1/tasks', headers=auth_headers,
+                          json={'title': 'Nova'}).get_json()['task']
+
+    delta = sync(client, auth_headers, full['sync_token'])
+    assert [task['id'] for task in delta['tasks']] == [first, second, created['id']]
+    assert delta['tasks'][0]['title'] == 'Editada'
+    assert delta['deleted'] == [third]
+    assert sync(client, auth_headers, delta['sync_token']) == {
+        'tasks': [], 'deleted': [], 'sync_token': delta['sync_token'], 'has_more': False
+    }
+
+
+def test_changes_cover_batch_writes_and_paginate(client, auth_headers, many_tasks):
+    token = sync(client, auth_headers, limit=200)['sync_token']
+    toggled, removed = many_tasks[0], many_tasks[1].id
+    client.post('/api/v1/tasks/batch', headers=auth_headers, json={'operations': [
+        {'op': 'create', 'data': {'title': 'Lote 1'}},
+        {'op': 'create', 'data': {'title': 'Lote 2'}},
+        {'op': 'toggle', 'id': toggled.id},
+        {'op': 'delete', 'id': removed},
+    ]})
+
+    tasks, deleted, pages = [], [], 0
+    while True:
+        page = sync(client, auth_headers, token, limit=2)
+        tasks += [task['title'] for task in page['tasks']]
+        deleted += page['deleted']
+        token, pages = page['sync_token'], pages + 1
+        if not page['has_more']:
+            break
+    assert sorted(tasks) == sorted(['Lote 1', 'Lote 2', toggled.title])
+    assert deleted == [removed]
+    assert pages == 2
+
+
+def test_changes_rejects_foreign_and_pruned_tokens(app, client, auth_headers, many_tasks):
+    from app.api import encode_sync_token
+    from app.models import TaskTombstone
+
+    foreign = encode_sync_token(many_tasks[0].user_id + 1, 0, 0)
+    response = client.get(f'/api/v1/tasks/changes?since={foreign}', headers=auth_headers)
+    assert response.status_code == 400
+
+    token = sync(client, auth_headers, limit=200)['sync_token']
+    client.delete(f'/api/v1/tasks/{many_tasks[0].id}', headers=auth_headers)
+    client.delete(f'/api/v1/tasks/{many_tasks[1].id}', headers=auth_headers)
+    assert TaskTombstone.prune(datetime.utcnow() + timedelta(seconds=1)) == 2
+    db.session.commit()
+
+    response = client.get(f'/api/v1/tasks/changes?since={token}', headers=auth_headers)
+    assert response.status_code == 410
@@ -0,0 +1,136 @@
+from werkzeug.security import generate_password_hash
+
+from app.models import db
+from app.security import HashingOverloaded, password_hasher
+
+
+def login(client, password='Senha@123'):
+    return client.post('/auth/login', json={'email': 'tester@example.com',
+                                            'password': password})
+
+
+def test_hash_uses_configured_method(app, user):
+    assert user.password_hash.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert not user.password_needs_rehash()
+
+
+def test_method_without_explicit_cost_matches_its_hashes(app, user):
+    app.config['PASSWORD_HASH_METHOD'] = 'pbkdf2:sha256'
+    password_hasher.init_app(app)
+    user.password_hash = generate_password_hash('Senha@123', 'pbkdf2:sha256')
+    assert not user.password_needs_rehash()
+    user.password_hash = generate_password_hash('Senha@123', 'pbkdf2:sha256:1000')
+    assert user.password_needs_rehash()
+
+
+def test_login_succeeds_when_rehash_is_overloaded(client, user, monkeypatch):
+    user.password_hash = generate_password_hash('Senha@123', 'pbkdf2:sha256:500')
+    db.session.commit()
+
+    def overloaded(password):
+        raise HashingOverloaded(1)
+
+    monkeypatch.setattr(password_hasher, 'hash', overloaded)
+    assert login(client).status_code == 200
+    db.session.expire_all()
+    assert user.password_hash.startswith('pbkdf2:sha256:500$')
+
+
+def test_register_returns_503_when_hashing_is_overloaded(client, monkeypatch):
+    def overloaded(function, *args):
+        raise HashingOverloaded(1)
+
+    monkeypatch.setattr(password_hasher, '_run', overloaded)
+    response = client.post('/auth/register', json={
+        'email': 'novo@example.com', 'username': 'novo', 'password': 'Senha@123'
+    })
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_login_rehashes_outdated_hash(app, client, user):
+    user.password_hash = generate_password_hash('Senha@123', 'pbkdf2:sha256:500')
+    db.session.commit()
+
+    assert login(client).status_code == 200
+
+    db.session.expire_all()
+    assert user.password_hash.startswith(app.config['PASSWORD_HASH_METHOD'] + '$')
+    assert login(client).status_code == 200
+
+
+def test_wrong_password_does_not_rehash(client, user):
+    user.password_hash = generate_password_hash('Senha@123', 'pbkdf2:sha256:500')
+    db.session.commit()
+
+    assert login(client, 'Errada@123').status_code == 401
+    db.session.expire_all()
+    assert user.password_hash.startswith('pbkdf2:sha256:500$')
+
+
+def test_saturated_pool_returns_503_with_retry_after(app, client, user):
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_SIZE=0,
+                      PASSWORD_HASH_RETRY_AFTER=3)
+    password_hasher.init_app(app)
+    state = app.extensions['password_hasher']
+    state.pool()
+    state.slots.acquire()
+    try:
+        response = login(client)
+        assert response.status_code == 503
+        assert response.headers['Retry-After'] == '3'
+    finally:
+        state.slots.release()
+
+    assert login(client).status_code == 200
+
+
+def test_deleting_user_cascades_in_the_database(app, user):
+    from sqlalchemy import event
+    from app.models import Task, TaskTombstone
+
+    db.session.add_all([Task(title=f'T{i}', user_id=user.id) for i in range(5)])
+    db.session.add(TaskTombstone(task_id=99, user_id=user.id, change_seq=1))
+    db.session.commit()
+
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        db.session.delete(user)
+        db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert not any('FROM tasks' in statement for statement in statements)
+    assert db.session.scalar(db.select(db.func.count(Task.id))) == 0
+    assert db.session.scalar(db.select(db.func.count(TaskTombstone.id))) == 0
+
+
+def test_delete_user_command_removes_tasks_in_batches(app, user):
+    from app.models import Task, TaskTombstone, User
+
+    other = User(username='outro', email='outro@example.com')
+    db.session.add(other)
+    db.session.flush()
+    db.session.add_all([Task(title=f'T{i}', user_id=user.id) for i in range(7)])
+    db.session.add(Task(title='Alheia', user_id=other.id))
+    db.session.add(TaskTombstone(task_id=99, user_id=user.id, change_seq=1))
+    db.session.commit()
+    User.record_task_changes(user.id, added=[(False, 2)] * 7)
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(
+        args=['delete-user', 'tester@example.com', '--batch-size', '3']
+    )
+    assert result.exit_code == 0
+    assert '3/7 tarefas removidas' in result.output
+    assert '7/7 tarefas removidas' in result.output
+    db.session.expire_all()
+    assert db.session.get(User, other.id) is not None
+    assert User.query.filter_by(email='tester@example.com').first() is None
+    assert [t.title for t in Task.query.all()] == ['Alheia']
+    assert TaskTombstone.query.count() == 0
@@ -0,0 +1,79 @@
+import pytest
+import redis
+
+from app.cache import task_cache
+from app.models import db, Task, User
+
+
+@pytest.fixture
+def cached_app(app):
+    app.config['CACHE_TYPE'] = 'simple'
+    task_cache.init_app(app)
+    return app
+
+
+def test_list_is_served_from_cache_until_a_write(cached_app, client, auth_headers, user):
+    db.session.add(Task(title='Primeira', user_id=user.id))
+    db.session.commit()
+
+    first = client.get('/api/v1/tasks', headers=auth_headers)
+    second = client.get('/api/v1/tasks', headers=auth_headers)
+    assert first.headers['X-Cache'] == 'MISS'
+    assert second.headers['X-Cache'] == 'HIT'
+    assert first.get_json() == second.get_json()
+
+    client.post('/api/v1/tasks', headers=auth_headers, json={'title': 'Segunda'})
+
+    third = client.get('/api/v1/tasks', headers=auth_headers)
+    assert third.headers['X-Cache'] == 'MISS'
+    assert len(third.get_json()) == 2
+
+
+def test_cache_key_depends_on_filters(cached_app, client, auth_headers, user):
+    client.get('/api/v1/tasks?completed=true', headers=auth_headers)
+    response = client.get('/api/v1/tasks?completed=false', headers=auth_headers)
+    assert response.headers['X-Cache'] == 'MISS'
+
+
+def test_single_task_is_invalidated_by_toggle(cached_app, client, auth_headers, user):
+    task = Task(title='Alternar', user_id=user.id)
+    db.session.add(task)
+    db.session.commit()
+
+    client.get(f'/api/v1/tasks/{task.id}', headers=auth_headers)
+    client.post(f'/api/v1/tasks/toggle/{task.id}', headers=auth_headers)
+    response = client.get(f'/api/v1/tasks/{task.id}', headers=auth_headers)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['completed'] is True
+
+
+def test_falls_back_to_database_when_backend_is_down(cached_app, client, auth_headers,
+                                                     user, monkeypatch):
+    backend = cached_app.extensions['task_cache'].backend
+
+    def unavailable(*args, **kwargs):
+        raise redis.ConnectionError('down')
+
+    monkeypatch.setattr(backend, 'get_many', unavailable)
+    monkeypatch.setattr(backend, 'incr', unavailable)
+
+    response = client.get('/api/v1/tasks', headers=auth_headers)
+    assert response.status_code == 200
+    assert 'X-Cache' not in response.headers
+
+    # Escritas durante a indisponibilidade são reaplicadas na volta do backend
+    client.post('/api/v1/tasks', headers=auth_headers, json={'title': 'Offline'})
+    assert cached_app.extensions['task_cache'].pending == {user.id}
+
+
+def test_cached_body_is_never_older_than_its_etag(cached_app, client, auth_headers, user):
+    first = client.get('/api/v1/tasks', headers=auth_headers)
+    # Escrita cuja invalidação no cache ainda não aconteceu
+    db.session.add(Task(title='Sem invalidar', user_id=user.id))
+    User.record_task_changes(user.id, added=[(False, 2)])
+    db.session.commit()
+
+    second = client.get('/api/v1/tasks', headers=auth_headers)
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert second.headers['X-Cache'] == 'MISS'
+    assert len(second.get_json()) == 1
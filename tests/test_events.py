@@ -0,0 +1,196 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import threading
+import time
+
+import pytest
+
+from app.events import Listener, _Broker, task_events
+
+
+def read_events(response):
+    """Lê o stream até o fim e separa os eventos SSE"""
+    events = []
+    for block in b''.join(response.response).decode().split('\n\n'):
+        if block.startswith('id:'):
+            fields = dict(line.split(': ', 1) for line in block.splitlines())
+            events.append((fields['id'], fields['event'], json.loads(fields['data'])))
+        elif block:
+            events.append(block)
+    return events
+
+
+def test_stream_resumes_from_last_event_id(app, client, auth_headers):
+    app.config['TASKS_STREAM_MAX_DURATION'] = 0
+    token = client.get('/api/v1/tasks/changes', headers=auth_headers).get_json()['sync_token']
+    created = client.post('/api/v1/tasks', headers=auth_headers,
+                          json={'title': 'Perdida'}).get_json()['task']
+
+    response = client.get('/api/v1/tasks/stream',
+                          headers={**auth_headers, 'Last-Event-ID': token})
+    assert response.mimetype == 'text/event-stream'
+    events = read_events(response)
+    assert events[0] == 'retry: 3000'
+    event_id, name, data = events[1]
+    assert name == 'changes'
+    assert [task['id'] for task in data['tasks']] == [created['id']]
+
+    # O id do evento é um token válido para a sincronização incremental
+    delta = client.get(f'/api/v1/tasks/changes?since={event_id}', headers=auth_headers)
+    assert delta.get_json()['tasks'] == []
+
+
+def test_stream_pushes_writes_and_heartbeats(app, client, auth_headers):
+    app.config.update(TASKS_STREAM_MAX_DURATION=1, TASKS_STREAM_HEARTBEAT=0.05)
+    response = client.get('/api/v1/tasks/stream', headers=auth_headers, buffered=False)
+
+    def write_later():
+        time.sleep(0.2)
+        client.post('/api/v1/tasks', headers=auth_headers, json={'title': 'Ao vivo'})
+
+    writer = threading.Thread(target=write_later)
+    writer.start()
+    events = read_events(response)
+    writer.join()
+
+    assert ': heartbeat' in events
+    changes = [event for event in events if isinstance(event, tuple)]
+    assert len(changes) == 1
+    assert changes[0][2]['tasks'][0]['title'] == 'Ao vivo'
+    # A conexão encerrada deixa de receber notificações
+    assert app.extensions['task_events'].listeners == {}
+
+
+def test_listener_buffer_is_bounded(app):
+    app.config['TASKS_STREAM_BUFFER'] = 2
+    listener = task_events.listen(1)
+    for change_seq in range(10):
+        task_events.publish(1, change_seq)
+    assert listener.queue.qsize() == 2
+    assert listener.wait(0) is True and listener.queue.empty()
+    listener.close()
+    listener.close()
+    assert app.extensions['task_events'].listeners == {}
+
+
+def test_streams_over_the_worker_cap_get_503(app, client, auth_headers):
+    app.config['TASKS_STREAM_MAX_PER_WORKER'] = 1
+    app.extensions['task_events'].max_streams = 1
+    listener = task_events.listen(2)
+    response = client.get('/api/v1/tasks/stream', headers=auth_headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '3'
+
+    # Fechar o stream libera a vaga, uma vez só
+    listener.close()
+    listener.close()
+    app.config['TASKS_STREAM_MAX_DURATION'] = 0
+    response = client.get('/api/v1/tasks/stream', headers=auth_headers)
+    assert response.status_code == 200
+    read_events(response)
+    assert app.extensions['task_events'].streams == 0
+
+
+class FakePubSub:
+    """PubSub que registra a thread de cada chamada"""
+
+    def __init__(self):
+        self.threads = set()
+        self.messages = []
+
+    def subscribe(self, *channels):
+        self.threads.add(threading.current_thread().name)
+        self.messages += [{'type': 'subscribe', 'channel': c.encode(), 'data': 1}
+                          for c in channels]
+
+    def unsubscribe(self, *channels):
+        self.threads.add(threading.current_thread().name)
+
+    def get_message(self, timeout):
+        self.threads.add(threading.current_thread().name)
+        if self.messages:
+            return self.messages.pop(0)
+        time.sleep(timeout)
+
+
+class FakeRedis:
+    def __init__(self):
+        self.pubsub_object = FakePubSub()
+
+    def pubsub(self):
+        return self.pubsub_object
+
+
+def test_only_the_reader_thread_uses_the_pubsub():
+    client = FakeRedis()
+    broker = _Broker(client, 'tm:')
+    broker.poll_interval = 0.01
+    listener = Listener(broker, 7, 4)
+    broker.add(listener)
+    # A confirmação da inscrição acorda o stream para reler o banco
+    assert listener.wait(1.0) is True
+    listener.close()
+    deadline = time.monotonic() + 1.0
+    while not broker.commands.empty() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert client.pubsub_object.threads == {'task-events'}
+
+
+GEVENT_SMOKE = textwrap.dedent("""
+    from gevent import monkey
+    monkey.patch_all()
+
+    import time
+
+    from app.events import Listener, _Broker
+
+    class PubSub:
+        def __init__(self):
+            self.messages = []
+
+        def subscribe(self, *channels):
+            self.messages += [{'type': 'subscribe', 'channel': c, 'data': 1}
+                              for c in channels]
+
+        def unsubscribe(self, *channels):
+            pass
+
+        def get_message(self, timeout):
+            if self.messages:
+                return self.messages.pop(0)
+            time.sleep(timeout)
+
+    class Redis:
+        def __init__(self):
+            self.pubsub_object = PubSub()
+
+        def pubsub(self):
+            return self.pubsub_object
+
+    client = Redis()
+    broker = _Broker(client, 'tm:')
+    broker.poll_interval = 0.01
+    listener = Listener(broker, 7, 4)
+    broker.add(listener)
+    # Com o patch, o leitor é um greenlet: só roda se a espera ceder o hub
+    assert listener.wait(2.0) is True
+    client.pubsub_object.messages.append(
+        {'type': 'message', 'channel': 'tm:events:7', 'data': b'5'})
+    assert listener.wait(2.0) is True
+    listener.close()
+    print('ok')
+""")
+
+
+def test_reader_thread_works_under_gevent_monkey_patching():
+    pytest.importorskip('gevent')
+    # Em outro processo: o patch_all não pode vazar para os demais testes
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    result = subprocess.run([sys.executable, '-c', GEVENT_SMOKE], cwd=root,
+                            capture_output=True, text=True, timeout=30)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'ok'
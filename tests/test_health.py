@@ -0,0 +1,82 @@
+import threading
+import time
+
+import pytest
+
+from app.health import HealthMonitor
+
+
+@pytest.fixture
+def calls():
+    return {'database': 0, 'redis': 0}
+
+
+@pytest.fixture
+def monitor(app, calls):
+    def database():
+        calls['database'] += 1
+        return True, 'Database is healthy'
+
+    def redis():
+        calls['redis'] += 1
+        return True, 'Redis is healthy'
+
+    app.config.update(HEALTH_CHECK_TTL=60, HEALTH_CHECK_TIMEOUT=0.2)
+    monitor = HealthMonitor(app, {'database': database, 'redis': redis})
+    app.extensions['health'] = monitor
+    return monitor
+
+
+def test_liveness_does_no_io(client, monitor, calls):
+    response = client.get('/health/live')
+    assert response.status_code == 200
+    assert calls == {'database': 0, 'redis': 0}
+
+
+def test_burst_of_probes_runs_checks_once(client, monitor, calls):
+    threads = [threading.Thread(target=client.get, args=('/health/ready',))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    response = client.get('/health')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'healthy'
+    assert calls == {'database': 1, 'redis': 1}
+
+
+def test_hanging_check_times_out_without_blocking_others(app, client):
+    release = threading.Event()
+
+    def hanging():
+        release.wait(5)
+        return True, 'late'
+
+    app.config.update(HEALTH_CHECK_TIMEOUT=0.2)
+    app.extensions['health'] = HealthMonitor(app, {
+        'database': lambda: (True, 'ok'),
+        'redis': hanging,
+    })
+    start = time.monotonic()
+    response = client.get('/health/ready')
+    release.set()
+
+    assert time.monotonic() - start < 2
+    assert response.status_code == 503
+    services = response.get_json()['services']
+    assert services['database']['status'] == 'healthy'
+    assert 'timed out' in services['redis']['message']
+
+
+def test_stale_result_is_served_while_refreshing(client, monitor, calls):
+    client.get('/health/ready')
+    monitor.checked_at -= monitor.ttl + 1
+
+    response = client.get('/health/ready')
+    assert response.status_code == 200
+    refresh = monitor.refreshing
+    if refresh is not None:
+        refresh.result()
+    assert calls['database'] == 2
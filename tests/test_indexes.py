@@ -0,0 +1,199 @@
+"""Confere, pelo EXPLAIN, que cada combinação filtro/ordenação de GET /tasks
+lê a página por um índice e sem etapa de ordenação.
+
+Roda no SQLite; para conferir também no PostgreSQL, aponte
+TEST_POSTGRES_URL para um banco descartável (as tabelas são recriadas).
+"""
+import os
+from datetime import datetime
+from itertools import product
+
+import pytest
+from flask_migrate import check, downgrade, upgrade
+
+from app import create_app
+from app.api import encode_cursor
+from app.models import db, Task, User
+from app.seed import seed_database
+from config import TestingConfig, config
+
+FILTERS = [{}, {'completed': 'false'}, {'completed': 'true'}, {'priority': 1},
+           {'completed': 'false', 'priority': 3}, {'completed': 'true', 'priority': 2}]
+SORTS = list(product(('created_at', 'due_date', 'priority'), ('asc', 'desc')))
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def empty_app(request, tmp_path, monkeypatch):
+    if request.param == 'sqlite':
+        uri = f'sqlite:///{tmp_path / "indexes.db"}'
+    else:
+        uri = os.getenv('TEST_POSTGRES_URL')
+        if not uri:
+            pytest.skip('defina TEST_POSTGRES_URL para conferir os planos no PostgreSQL')
+
+    class IndexesConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = uri
+
+    monkeypatch.setitem(config, 'indexes', IndexesConfig)
+    app = create_app('indexes')
+    with app.app_context():
+        db.drop_all()
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql('DROP TABLE IF EXISTS alembic_version')
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def seeded_app(empty_app):
+    db.create_all()
+    seed_database(40, 20000, seed=3, batch_size=5000, anchor=datetime(2030, 1, 1))
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql('ANALYZE')
+    return empty_app
+
+
+def task_queries(client, headers, path, query_string=None):
+    """SELECTs em tasks executados pela requisição, com seus parâmetros"""
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().startswith('SELECT') and 'FROM tasks' in statement:
+            statements.append((statement, parameters))
+
+    db.event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        response = client.get(path, query_string=query_string, headers=headers)
+    finally:
+        db.event.remove(db.engine, 'before_cursor_execute', capture)
+    assert response.status_code == 200
+    return response.get_json(), statements
+
+
+def plan_of(statement, parameters):
+    with db.engine.connect() as connection:
+        if connection.dialect.name == 'sqlite':
+            rows = connection.exec_driver_sql('EXPLAIN QUERY PLAN ' + statement, parameters)
+            return '\n'.join(row[-1] for row in rows)
+        rows = connection.exec_driver_sql('EXPLAIN ' + statement, parameters)
+        return '\n'.join(row[0] for row in rows)
+
+
+def assert_index_only_order(plan, dialect):
+    """Varredura de um índice que começa por user_id, sem ordenação"""
+    if dialect == 'sqlite':
+        assert 'USING INDEX' in plan or 'USING COVERING INDEX' in plan, plan
+        assert '(user_id=?' in plan, plan
+        assert 'TEMP B-TREE' not in plan, plan
+    else:
+        assert 'Index Cond: ((user_id =' in plan or 'Index Cond: (user_id =' in plan, plan
+        assert 'Seq Scan' not in plan and 'Sort' not in plan, plan
+
+
+def test_task_listing_reads_pages_in_index_order(seeded_app):
+    client = seeded_app.test_client()
+    dialect = db.engine.dialect.name
+    # O usuário com mais tarefas: é onde ordenar custaria mais
+    user_id = db.session.scalar(
+        db.select(Task.user_id).group_by(Task.user_id)
+        .order_by(db.func.count().desc()).limit(1)
+    )
+    user = db.session.get(User, user_id)
+    headers = {'Authorization': f'Bearer {user.generate_auth_token()["access_token"]}'}
+
+    checked = 0
+    for filters, (sort_by, sort_order) in product(FILTERS, SORTS):
+        query_string = dict(filters, sort_by=sort_by, sort_order=sort_order, limit=20)
+        body, statements = task_queries(client, headers, '/api/v1/tasks', query_string)
+        # A segunda página exercita a condição do cursor
+        cursors = [body['next_cursor']]
+        if sort_by == 'due_date':
+            # e, no prazo, também o bloco final de tarefas sem prazo
+            cursors.append(encode_cursor(sort_by, sort_order, None, 10000))
+        for cursor in cursors:
+            statements += task_queries(client, headers, '/api/v1/tasks',
+                                       dict(query_string, cursor=cursor))[1]
+        for statement, parameters in statements:
+            plan = plan_of(statement, parameters)
+            assert_index_only_order(plan, dialect)
+            checked += 1
+    assert checked >= 2 * len(FILTERS) * len(SORTS)
+
+
+def test_overdue_count_uses_open_tasks_index(seeded_app):
+    client = seeded_app.test_client()
+    user = db.session.scalar(db.select(User).limit(1))
+    headers = {'Authorization': f'Bearer {user.generate_auth_token()["access_token"]}'}
+    _, statements = task_queries(client, headers, '/api/v1/tasks/stats')
+    [(statement, parameters)] = statements
+    assert 'ix_tasks_user_id_open_due_date' in plan_of(statement, parameters)
+
+
+def test_migrations_build_the_models_schema(empty_app):
+    upgrade(MIGRATIONS)
+    # Sai com SystemExit se o banco migrado divergir dos modelos
+    check(MIGRATIONS)
+    indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('tasks')}
+    assert 'ix_tasks_user_id_open_due_date' in indexes
+    assert 'ix_tasks_user_id' not in indexes
+
+    downgrade(MIGRATIONS, '0007')
+    indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('tasks')}
+    assert 'ix_tasks_user_id' in indexes
+    assert 'ix_tasks_user_id_open_due_date' not in indexes
+
+    def user_fk_ondelete():
+        [fk] = db.inspect(db.engine).get_foreign_keys('tasks')
+        return fk['options'].get('ondelete')
+
+    assert user_fk_ondelete() == 'CASCADE'
+    downgrade(MIGRATIONS, '0006')
+    assert user_fk_ondelete() is None
+    downgrade(MIGRATIONS, 'base')
+    assert db.inspect(db.engine).get_table_names() == ['alembic_version']
+
+
+def test_baseline_database_upgrades_with_its_data(empty_app):
+    upgrade(MIGRATIONS, '0001')
+    with db.engine.begin() as connection:
+        connection.exec_driver_sql(
+            "INSERT INTO users (id, username, email, is_active) "
+            "VALUES (1, 'antigo', 'antigo@example.com', true)"
+        )
+        for i, (completed, priority) in enumerate([(True, 1), (False, 1), (False, 3)]):
+            connection.exec_driver_sql(
+                'INSERT INTO tasks (title, description, completed, priority, user_id) '
+                'VALUES (%s, %s, %s, %s, 1)' % (
+                    f"'Relatório {i}'", "'criada antes das migrações'",
+                    'true' if completed else 'false', priority,
+                )
+            )
+
+    upgrade(MIGRATIONS)
+    check(MIGRATIONS)
+    user = db.session.get(User, 1)
+    assert (user.tasks_total, user.tasks_completed, user.tasks_priority_1,
+            user.tasks_priority_2, user.tasks_priority_3) == (3, 1, 2, 0, 1)
+
+    # As tarefas antigas entram na busca e na sincronização completa
+    headers = {'Authorization': f'Bearer {user.generate_auth_token()["access_token"]}'}
+    client = empty_app.test_client()
+    found = client.get('/api/v1/tasks/search', query_string={'q': 'relatório'},
+                       headers=headers).get_json()
+    assert len(found['tasks']) == 3
+    # Os triggers da busca sobrevivem às revisões que recriam tasks no SQLite
+    created = client.post('/api/v1/tasks', json={'title': 'Relatório novo'}, headers=headers)
+    assert created.status_code == 201
+    found = client.get('/api/v1/tasks/search', query_string={'q': 'relatório'},
+                       headers=headers).get_json()
+    assert len(found['tasks']) == 4
+    changes = client.get('/api/v1/tasks/changes', headers=headers).get_json()
+    assert len(changes['tasks']) == 4
+    db.session.remove()
+
+    downgrade(MIGRATIONS, '0001')
+    with db.engine.connect() as connection:
+        assert connection.exec_driver_sql('SELECT count(*) FROM tasks').scalar() == 4
+    downgrade(MIGRATIONS, 'base')
@@ -0,0 +1,75 @@
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+from app import create_app
+from app.metrics import InstrumentedQueuePool, use_instrumented_pool
+from app.models import db
+from app.replicas import replica_engines
+from config import TestingConfig, config
+
+
+def sample(body, name, **labels):
+    """Valor de uma amostra no formato de exposição do Prometheus"""
+    for line in body.splitlines():
+        if not line.startswith(name + '{') and line.split(' ')[0] != name:
+            continue
+        if all(f'{key}="{value}"' in line for key, value in labels.items()):
+            return float(line.rsplit(' ', 1)[1])
+    return 0.0
+
+
+def test_api_requests_and_queries_are_measured(client, auth_headers):
+    before = client.get('/metrics').get_data(as_text=True)
+    client.get('/api/v1/tasks', headers=auth_headers)
+    after = client.get('/metrics').get_data(as_text=True)
+
+    labels = {'endpoint': 'api.get_tasks', 'method': 'GET', 'status': '200'}
+    name = 'http_request_duration_seconds_count'
+    assert sample(after, name, **labels) == sample(before, name, **labels) + 1
+    assert sample(after, 'db_queries_total', operation='select') > \
+        sample(before, 'db_queries_total', operation='select')
+    assert sample(after, 'http_requests_in_progress', endpoint='api.get_tasks') == 0
+
+
+def test_failed_queries_leave_no_timing_state_behind(app):
+    with db.engine.connect() as conn:
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM tabela_inexistente')
+        assert conn.exec_driver_sql('SELECT 1').scalar() == 1
+        assert not conn.info.get('metrics_query_start')
+
+
+def test_unlisted_blueprints_are_not_measured(client):
+    client.get('/health/live')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'health.liveness_check' not in body
+    assert 'metrics.metrics' not in body
+
+
+def test_server_databases_use_instrumented_pool(app):
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'postgresql://u:p@localhost/db'
+    use_instrumented_pool(app)
+    assert app.config['SQLALCHEMY_ENGINE_OPTIONS']['poolclass'] is InstrumentedQueuePool
+    assert issubclass(InstrumentedQueuePool, QueuePool)
+
+
+def test_pool_gauges_are_labelled_by_engine(tmp_path, monkeypatch):
+    class PoolTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "primary.db"}'
+        SQLALCHEMY_REPLICA_URIS = [f'sqlite:///{tmp_path / "replica.db"}']
+
+    monkeypatch.setitem(config, 'pool-testing', PoolTestingConfig)
+    app = create_app('pool-testing')
+    client = app.test_client()
+    with app.app_context():
+        primary = db.engine.connect()
+        replica = replica_engines()[0].connect()
+        replica.close()
+        body = client.get('/metrics').get_data(as_text=True)
+        primary.close()
+    # A réplica, configurada por último, não sobrescreve o primário
+    assert sample(body, 'db_pool_checked_out_connections', engine='primary') == 1
+    assert sample(body, 'db_pool_checked_out_connections', engine='replica_0') == 0
+    assert sample(body, 'db_pool_size', engine='replica_0') == 5
@@ -0,0 +1,64 @@
+import json
+import logging
+
+import pytest
+from flask import g
+from sqlalchemy.exc import OperationalError
+
+from app.models import db, Task
+from app.profiler import RequestProfile, statement_shape
+
+
+def test_statement_shape_collapses_parameter_lists():
+    assert statement_shape('SELECT * FROM tasks WHERE id IN (?, ?, ?)') == \
+        statement_shape('SELECT * FROM tasks\n WHERE id IN (?)')
+    assert statement_shape('INSERT INTO t (a, b) VALUES (?, ?), (?, ?)') == \
+        'INSERT INTO t (a, b) VALUES (...)'
+
+
+def test_profile_header_requires_admin(client, auth_headers, user):
+    headers = {**auth_headers, 'X-Profile': '1'}
+    response = client.get('/api/v1/tasks', headers=headers)
+    assert 'Server-Timing' not in response.headers
+
+    user.is_admin = True
+    db.session.commit()
+    response = client.get('/api/v1/tasks', headers=headers)
+    assert response.headers['Server-Timing'].startswith('db;dur=')
+    assert 'queries' in response.headers['Server-Timing']
+
+
+def test_sampled_request_flags_n_plus_one(app, client, user, caplog):
+    app.config.update(PROFILER_ENABLED=True, PROFILER_SAMPLE_RATE=1.0,
+                      PROFILER_N_PLUS_ONE_THRESHOLD=5)
+    db.session.add_all(Task(title=f'Tarefa {i}', user_id=user.id) for i in range(6))
+    db.session.commit()
+    ids = [task.id for task in Task.query.all()]
+
+    @app.route('/_n_plus_one')
+    def n_plus_one():
+        db.session.expire_all()
+        titles = [db.session.get(Task, task_id).title for task_id in ids]
+        return {'titles': titles}
+
+    with caplog.at_level(logging.INFO, logger=app.logger.name):
+        response = client.get('/_n_plus_one')
+    assert 'Server-Timing' in response.headers
+
+    records = [json.loads(r.getMessage()) for r in caplog.records
+               if r.getMessage().startswith('{"event": "sql_profile"')]
+    assert len(records) == 1
+    assert records[0]['queries'] >= 6
+    assert records[0]['n_plus_one'][0]['count'] == 6
+    assert caplog.records[-1].levelno == logging.WARNING
+
+
+def test_failed_queries_leave_no_timing_state_behind(app):
+    with app.test_request_context(), db.engine.connect() as conn:
+        g.sql_profile = RequestProfile()
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.exec_driver_sql('SELECT * FROM tabela_inexistente')
+        conn.exec_driver_sql('SELECT 1')
+        assert not conn.info.get('profiler_query_start')
+        assert g.sql_profile.queries == 1
@@ -0,0 +1,170 @@
+import time
+
+import pytest
+import redis
+
+from app import create_app
+from app.models import db
+from app.ratelimit import MemoryBackend, RateLimit, parse_limits
+from config import TestingConfig, config
+
+
+@pytest.fixture
+def limited_app(app):
+    app.config['RATELIMIT_ENABLED'] = True
+    return app
+
+
+def test_parse_limits():
+    assert parse_limits('5 per minute; 20/hour') == [RateLimit(5, 60), RateLimit(20, 3600)]
+    assert parse_limits('10 per 2 seconds') == [RateLimit(10, 2)]
+    with pytest.raises(ValueError):
+        parse_limits('muitas por minuto')
+
+
+def test_login_is_limited_per_address(limited_app, client, user):
+    credentials = {'email': 'tester@example.com', 'password': 'errada'}
+    statuses = [client.post('/auth/login', json=credentials).status_code for _ in range(6)]
+    assert statuses == [401] * 5 + [429]
+
+    response = client.post('/auth/login', json=credentials)
+    assert 1 <= int(response.headers['Retry-After']) <= 60
+
+    # Outro endereço tem o próprio orçamento
+    other = client.post('/auth/login', json=credentials,
+                        environ_base={'REMOTE_ADDR': '10.0.0.2'})
+    assert other.status_code == 401
+
+
+@pytest.fixture
+def proxied_app(monkeypatch):
+    """Atrás de um proxy confiável, como o Traefik"""
+    class ProxiedTestingConfig(TestingConfig):
+        RATELIMIT_ENABLED = True
+        PROXY_FIX_X_FOR = 1
+
+    monkeypatch.setitem(config, 'proxied-testing', ProxiedTestingConfig)
+    app = create_app('proxied-testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+def test_login_is_limited_per_forwarded_address(proxied_app):
+    client = proxied_app.test_client()
+    credentials = {'email': 'ninguem@example.com', 'password': 'errada'}
+    # Todas as requisições chegam do mesmo proxy
+    proxy = {'REMOTE_ADDR': '172.18.0.2'}
+
+    def login(address):
+        return client.post('/auth/login', json=credentials, environ_base=proxy,
+                           headers={'X-Forwarded-For': address}).status_code
+
+    assert [login('203.0.113.7') for _ in range(6)] == [401] * 5 + [429]
+    assert login('203.0.113.8') == 401
+    # Só o último salto é confiável: o que o cliente põe antes não troca a chave
+    assert login('198.51.100.1, 203.0.113.7') == 429
+
+
+def test_forwarded_header_is_ignored_without_trusted_proxies(limited_app, client, user):
+    credentials = {'email': 'tester@example.com', 'password': 'errada'}
+    statuses = [client.post('/auth/login', json=credentials,
+                            headers={'X-Forwarded-For': f'203.0.113.{i}'}).status_code
+                for i in range(6)]
+    assert statuses == [401] * 5 + [429]
+
+
+def test_tasks_budget_is_shared_per_user(limited_app, client, auth_headers):
+    limited_app.config['RATELIMIT_TASKS'] = '3 per minute'
+    assert client.get('/api/v1/tasks', headers=auth_headers).status_code == 200
+    assert client.get('/api/v1/tasks/stats', headers=auth_headers).status_code == 200
+    assert client.get('/api/v1/tasks', headers=auth_headers).status_code == 200
+    assert client.get('/api/v1/tasks/stats', headers=auth_headers).status_code == 429
+
+
+def test_lease_spends_budget_locally(limited_app, client, auth_headers, monkeypatch):
+    limited_app.config['RATELIMIT_TASKS'] = '1000 per minute'
+    state = limited_app.extensions['rate_limiter']
+    state.lease_size = 20
+    calls = []
+    acquire = state.backend.acquire
+
+    def counting_acquire(keys, want, args):
+        calls.append(want)
+        return acquire(keys, want, args)
+
+    monkeypatch.setattr(state.backend, 'acquire', counting_acquire)
+    for _ in range(45):
+        assert client.get('/api/v1/tasks', headers=auth_headers).status_code == 200
+    # Leases só depois de 20 requisições dentro do TTL; cada lease gasto renova
+    assert calls == [1] * 19 + [20, 20]
+
+
+def test_spaced_requests_keep_the_whole_budget(limited_app, client, auth_headers):
+    limited_app.config['RATELIMIT_TASKS'] = '200 per minute'
+    state = limited_app.extensions['rate_limiter']
+    state.lease_size = 20
+    state.lease_ttl = 0.05
+    statuses = []
+    # Rajadas que pegam um lease e o deixam expirar pela metade
+    for _ in range(8):
+        statuses += [client.get('/api/v1/tasks', headers=auth_headers).status_code
+                     for _ in range(25)]
+        time.sleep(state.lease_ttl + 0.01)
+    assert statuses == [200] * 200
+    assert client.get('/api/v1/tasks', headers=auth_headers).status_code == 429
+
+
+def test_release_credits_unused_units_back():
+    backend = MemoryBackend()
+    keys = ['rl:k:60:1', 'rl:k:60:0']
+    assert backend.acquire(keys, 8, [10, 0.0, 120]) == (8, 0)
+    backend.release(keys[::2], 6)
+    assert backend.acquire(keys, 10, [10, 0.0, 120]) == (8, 1)
+    # Nunca abaixo de zero
+    backend.release(keys[::2], 50)
+    assert backend.acquire(keys, 10, [10, 0.0, 120]) == (10, 0)
+
+
+def test_lease_never_exceeds_a_tenth_of_the_limit(limited_app, client, user, monkeypatch):
+    state = limited_app.extensions['rate_limiter']
+    state.lease_size = 20
+    calls = []
+    monkeypatch.setattr(state.backend, 'acquire', lambda keys, want, args: (
+        calls.append(want) or (1, 0)
+    ))
+    client.post('/auth/login', json={'email': 'tester@example.com', 'password': 'x'})
+    assert calls == [1]
+
+
+@pytest.mark.parametrize('fail_open, status', [(True, 200), (False, 503)])
+def test_storage_failure_policy(limited_app, client, auth_headers, monkeypatch,
+                                fail_open, status):
+    state = limited_app.extensions['rate_limiter']
+    state.fail_open = fail_open
+
+    def unavailable(*args, **kwargs):
+        raise redis.ConnectionError('down')
+
+    monkeypatch.setattr(state.backend, 'acquire', unavailable)
+    response = client.get('/api/v1/tasks', headers=auth_headers)
+    assert response.status_code == status
+    if not fail_open:
+        assert 'Retry-After' in response.headers
+
+
+def test_sliding_window_weights_previous_window():
+    backend = MemoryBackend()
+    keys = ['rl:k:60:1', 'rl:k:60:0']
+    # 10 requisições na janela anterior, ainda 50% dentro da janela deslizante
+    assert backend.acquire(['rl:k:60:0', 'rl:k:60:-1'], 10, [10, 1.0, 120]) == (10, 0)
+    assert backend.acquire(keys, 10, [10, 0.5, 120]) == (5, 1)
+    assert backend.acquire(keys, 1, [10, 0.5, 120]) == (0, 1)
+
+
+def test_health_probes_are_exempt(limited_app, client):
+    limited_app.config['RATELIMIT_DEFAULT'] = '1 per minute'
+    statuses = {client.get('/health/live').status_code for _ in range(3)}
+    assert statuses == {200}
@@ -0,0 +1,89 @@
+import pytest
+
+from app import create_app
+from app.models import db, Task, User
+from app.replicas import replica_engines, replica_router
+from config import TestingConfig, config
+
+
+@pytest.fixture
+def replicated_app(tmp_path, monkeypatch):
+    """Primário e réplica em dois arquivos SQLite; a "replicação" é manual"""
+    class ReplicaTestingConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "primary.db"}'
+        SQLALCHEMY_REPLICA_URIS = [f'sqlite:///{tmp_path / "replica.db"}']
+
+    monkeypatch.setitem(config, 'replica-testing', ReplicaTestingConfig)
+    app = create_app('replica-testing')
+    with app.app_context():
+        db.create_all()
+        db.metadata.create_all(replica_engines()[0])
+        yield app
+        db.session.remove()
+
+
+@pytest.fixture
+def replica_user(replicated_app):
+    user = User(username='tester', email='tester@example.com')
+    user.set_password('Senha@123')
+    db.session.add(user)
+    db.session.commit()
+    # Copia o usuário para a réplica, como faria a replicação
+    with replica_engines()[0].begin() as conn:
+        conn.execute(db.insert(User), [{
+            'id': user.id, 'username': user.username, 'email': user.email,
+            'password_hash': user.password_hash
+        }])
+    return user
+
+
+@pytest.fixture
+def replica_headers(replica_user):
+    return {'Authorization': f'Bearer {replica_user.generate_auth_token()["access_token"]}'}
+
+
+def list_titles(client, headers):
+    response = client.get('/api/v1/tasks', headers=headers)
+    assert response.status_code == 200
+    return [task['title'] for task in response.get_json()]
+
+
+def test_reads_go_to_replica_and_writes_to_primary(replicated_app, replica_user,
+                                                    replica_headers):
+    client = replicated_app.test_client()
+    with replica_engines()[0].begin() as conn:
+        conn.execute(db.insert(Task), [{'title': 'Só na réplica', 'user_id': replica_user.id}])
+
+    assert list_titles(client, replica_headers) == ['Só na réplica']
+    assert client.get('/auth/me', headers=replica_headers).status_code == 200
+
+    client.post('/api/v1/tasks', headers=replica_headers, json={'title': 'No primário'})
+    # Fora de uma view replica_read, a sessão usa o primário
+    assert db.session.scalars(db.select(Task.title)).all() == ['No primário']
+
+
+def test_own_writes_are_read_from_primary_for_a_while(replicated_app, replica_headers,
+                                                      monkeypatch):
+    client = replicated_app.test_client()
+    client.post('/api/v1/tasks', headers=replica_headers, json={'title': 'Recém-criada'})
+    # Dentro da janela, a réplica (ainda sem a tarefa) não é usada
+    assert list_titles(client, replica_headers) == ['Recém-criada']
+
+    state = replicated_app.extensions['replica_router']
+    state.local_sticky.clear()
+    assert list_titles(client, replica_headers) == []
+
+
+def test_lagging_replica_falls_back_to_primary(replicated_app, replica_user, replica_headers,
+                                               monkeypatch):
+    client = replicated_app.test_client()
+    db.session.add(Task(title='Primário', user_id=replica_user.id))
+    db.session.commit()
+    replicated_app.extensions['replica_router'].local_sticky.clear()
+
+    def lagging(replica, engine):
+        replica.lag = 60.0
+
+    monkeypatch.setattr(replica_router, '_measure', lagging)
+    replicated_app.extensions['replica_router'].replicas[0].checked_at = 0
+    assert list_titles(client, replica_headers) == ['Primário']
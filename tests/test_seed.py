@@ -0,0 +1,79 @@
+import random
+from datetime import datetime
+
+from app.api import validate_task_data
+from app.models import db, Task, User
+from app.seed import SEED_PASSWORD, generate_tasks, seed_database
+
+ANCHOR = datetime(2030, 1, 1)
+
+
+def seeded_tasks(prefix):
+    rows = db.session.execute(
+        db.select(User.username, Task.title, Task.description, Task.completed,
+                  Task.priority, Task.created_at, Task.due_date)
+        .join(Task, Task.user_id == User.id)
+        .where(User.username.startswith(prefix))
+        .order_by(Task.id)
+    ).all()
+    return [(username[len(prefix):],) + tuple(rest) for username, *rest in rows]
+
+
+def test_seed_is_reproducible_and_keeps_counters(app):
+    seed_database(20, 500, seed=7, batch_size=64, anchor=ANCHOR, prefix='a')
+    seed_database(20, 500, seed=7, batch_size=200, anchor=ANCHOR, prefix='b')
+    seed_database(20, 500, seed=8, batch_size=200, anchor=ANCHOR, prefix='c')
+
+    first = seeded_tasks('a')
+    assert len(first) == 500
+    assert first == seeded_tasks('b')
+    assert first != seeded_tasks('c')
+
+    users = User.query.filter(User.username.startswith('a')).all()
+    assert sum(user.tasks_total for user in users) == 500
+    for user in users:
+        assert user.tasks_total == user.tasks.count()
+        assert user.tasks_completed == user.tasks.filter_by(completed=True).count()
+    assert users[0].check_password(SEED_PASSWORD)
+
+
+def test_seed_recounts_only_the_seeded_users(app, user):
+    # Contador propositalmente errado: o seed não deve tocar neste usuário
+    user.tasks_total = 99
+    db.session.commit()
+    seed_database(5, 50, batch_size=2, anchor=ANCHOR, prefix='r')
+
+    db.session.refresh(user)
+    assert user.tasks_total == 99
+    seeded = User.query.filter(User.username.startswith('r')).all()
+    assert sum(u.tasks_total for u in seeded) == 50
+
+
+def test_seeded_tasks_pass_api_validation():
+    rows = list(generate_tasks(random.Random(1), [1], [5000], ANCHOR))
+    for title, description, *_ in rows:
+        data = {'title': title, 'description': description or ''}
+        assert validate_task_data(data) is None, data
+    # A cauda da distribuição chega ao limite da API
+    assert max(len(row[1] or '') for row in rows) == 1000
+
+
+def test_seed_command_indexes_tasks_for_search(app, client):
+    result = app.test_cli_runner().invoke(
+        args=['seed', '--users', '3', '--tasks', '50', '--anchor', '2030-01-01']
+    )
+    assert result.exit_code == 0
+    assert 'tasks: 50/50' in result.output
+
+    response = client.post('/auth/login', json={'email': 'seed0@example.com',
+                                                'password': SEED_PASSWORD})
+    token = response.get_json()['access_token']
+    body = client.get('/api/v1/tasks/search', query_string={'q': 'relatorio'},
+                      headers={'Authorization': f'Bearer {token}'}).get_json()
+    own = User.query.filter_by(email='seed0@example.com').one()
+    assert 0 < len(body['tasks']) == own.tasks.filter(
+        db.or_(Task.title.contains('relatório'), Task.description.contains('relatório'))
+    ).count()
+
+    again = app.test_cli_runner().invoke(args=['seed', '--users', '1', '--tasks', '1'])
+    assert 'Já existem usuários' in again.output
@@ -0,0 +1,267 @@
+import email.policy
+import json
+import logging
+import os
+import queue
+import socketserver
+import threading
+from email import message_from_bytes
+
+import pytest
+
+from app import create_app
+from app.utils import (
+    BatchingQueueListener, BatchRotatingFileHandler, ErrorDigestHandler, JsonFormatter,
+    NonBlockingQueueHandler,
+    check_database_health, get_db_connection, get_redis_connection, get_redis_pool
+)
+from config import TestingConfig, config
+
+
+def test_database_health_uses_engine_pool(app):
+    healthy, message = check_database_health()
+    assert healthy, message
+
+    conn = get_db_connection()
+    dbapi_connection = conn.dbapi_connection
+    conn.close()
+    # A conexão devolvida ao pool é reaproveitada, não recriada
+    conn = get_db_connection()
+    assert conn.dbapi_connection is dbapi_connection
+    conn.close()
+
+
+def test_redis_clients_share_one_pool(app):
+    first, second = get_redis_connection(), get_redis_connection()
+    assert first.connection_pool is second.connection_pool is get_redis_pool()
+    assert get_redis_pool().max_connections == app.config['REDIS_MAX_CONNECTIONS']
+
+
+def test_extension_redis_clients_use_registered_pools(monkeypatch):
+    class RedisTestingConfig(TestingConfig):
+        CACHE_TYPE = 'redis'
+        EVENTS_BACKEND = 'redis'
+        RATELIMIT_STORAGE_URL = 'redis://localhost:6379/1'
+        REPLICA_STICKY_REDIS_URL = 'redis://localhost:6379/0'
+
+    monkeypatch.setitem(config, 'redis-testing', RedisTestingConfig)
+    app = create_app('redis-testing')
+    pools = app.extensions['redis_pools']
+    clients = {
+        'cache': app.extensions['task_cache'].backend.client,
+        'ratelimit': app.extensions['rate_limiter'].backend.client,
+        'events': app.extensions['task_events'].client,
+        'replicas': app.extensions['replica_router'].redis,
+    }
+    for name, client in clients.items():
+        assert client.connection_pool is pools[name]
+        assert pools[name].max_connections == app.config['REDIS_MAX_CONNECTIONS']
+
+
+def test_queue_handler_drops_instead_of_blocking():
+    handler = NonBlockingQueueHandler(queue.Queue(maxsize=2))
+    logger = logging.getLogger('tests.queue_handler')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for i in range(5):
+            logger.warning('registro %d', i)
+    finally:
+        logger.removeHandler(handler)
+
+    assert (handler.enqueued, handler.dropped) == (2, 3)
+    assert [handler.queue.get_nowait().getMessage() for _ in range(2)] == [
+        'registro 0', 'registro 1'
+    ]
+
+
+def test_listener_writes_json_batches_and_reports_drops(tmp_path):
+    log_queue = queue.Queue(maxsize=10)
+    source = NonBlockingQueueHandler(log_queue, overflow='drop_oldest')
+    target = BatchRotatingFileHandler(tmp_path / 'app.log')
+    target.setFormatter(JsonFormatter())
+    logger = logging.getLogger('tests.listener')
+    logger.propagate = False
+    logger.addHandler(source)
+    try:
+        for i in range(12):
+            logger.warning('registro %d', i)
+        listener = BatchingQueueListener(log_queue, target, source=source, batch_size=4)
+        listener.start()
+        listener.stop()
+    finally:
+        logger.removeHandler(source)
+        target.close()
+
+    lines = [json.loads(line) for line in (tmp_path / 'app.log').read_text().splitlines()]
+    messages = [line['message'] for line in lines]
+    assert messages[0] == 'registro 2'
+    assert 'registro 11' in messages
+    assert any('2 records dropped' in message for message in messages)
+    assert {line['level'] for line in lines} == {'WARNING'}
+
+
+def test_queue_handler_leaves_formatting_to_the_listener(tmp_path):
+    class CountingFormatter(logging.Formatter):
+        calls = 0
+
+        def format(self, record):
+            CountingFormatter.calls += 1
+            return super().format(record)
+
+    log_queue = queue.Queue()
+    source = NonBlockingQueueHandler(log_queue)
+    source.setFormatter(CountingFormatter())
+    target = BatchRotatingFileHandler(tmp_path / 'app.log')
+    target.setFormatter(JsonFormatter())
+    logger = logging.getLogger('tests.prepare')
+    logger.propagate = False
+    logger.addHandler(source)
+    values = ['antes']
+    try:
+        try:
+            raise KeyError('chave')
+        except KeyError:
+            logger.exception('falha com %s', values)
+        values.append('depois')
+        assert CountingFormatter.calls == 0
+        listener = BatchingQueueListener(log_queue, target, source=source)
+        listener.start()
+        listener.stop()
+    finally:
+        logger.removeHandler(source)
+        target.close()
+
+    [line] = [json.loads(line) for line in (tmp_path / 'app.log').read_text().splitlines()]
+    assert line['message'] == "falha com ['antes']"
+    assert 'KeyError' in line['exception'] and 'Traceback' in line['exception']
+
+
+def test_setup_logging_uses_queue_handler(app):
+    handlers = app.logger.handlers
+    assert len(handlers) == 1 and isinstance(handlers[0], NonBlockingQueueHandler)
+    assert handlers[0].listener._thread.is_alive()
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='requer fork')
+def test_logging_listener_restarts_after_fork(app):
+    log_file = os.path.join(app.root_path, '..', 'logs', 'app.log')
+    pid = os.fork()
+    if pid == 0:  # pragma: no cover - processo filho
+        app.logger.warning('registro do filho %d', os.getpid())
+        app.logger.handlers[0].listener.stop()
+        os._exit(0 if app.logger.handlers[0].listener.queue.empty() else 1)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    with open(log_file) as fh:
+        assert f'registro do filho {pid}' in fh.read()
+
+
+class _SMTPStandIn(socketserver.ThreadingTCPServer):
+    """Servidor SMTP mínimo que guarda as mensagens recebidas."""
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self):
+        self.messages = []
+        super().__init__(('127.0.0.1', 0), _SMTPSession)
+
+
+class _SMTPSession(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b'\r\n')
+
+    def handle(self):
+        self.reply('220 localhost')
+        while True:
+            line = self.rfile.readline().decode().rstrip('\r\n')
+            command = line[:4].upper()
+            if not line or command == 'QUIT':
+                self.reply('221 bye')
+                return
+            if command == 'DATA':
+                self.reply('354 go ahead')
+                data = []
+                while (chunk := self.rfile.readline()) not in (b'.\r\n', b''):
+                    data.append(chunk)
+                self.server.messages.append(
+                    message_from_bytes(b''.join(data), policy=email.policy.default)
+                )
+            self.reply('250 ok')
+
+
+def test_error_digest_groups_errors_per_fingerprint():
+    server = _SMTPStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    handler = ErrorDigestHandler(
+        mailhost=server.server_address, fromaddr='app@example.com',
+        toaddrs=['ops@example.com'], subject='Falha', window=30, timeout=5
+    )
+    logger = logging.getLogger('tests.error_digest')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for task_id in range(50):
+            try:
+                raise ValueError(f'quebrou {task_id}')
+            except ValueError as e:
+                logger.exception(f'Falha ao processar tarefa {task_id}: {str(e)}')
+        logger.error('Outra falha')
+        assert handler.sent == 0  # nada sai antes do fim da janela
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+        server.shutdown()
+        server.server_close()
+
+    assert handler.sent == 2
+    subjects = sorted(message['Subject'] for message in server.messages)
+    assert subjects[0].startswith('Falha: ValueError x50')
+    assert subjects[1].startswith('Falha: tests.error_digest x1')
+    body = next(m for m in server.messages if 'ValueError' in m['Subject']).get_content()
+    assert 'Occurrences: 50' in body and 'quebrou 0' in body
+
+
+def test_error_digest_never_blocks_when_queue_is_full():
+    handler = ErrorDigestHandler(
+        mailhost=('127.0.0.1', 9), fromaddr='app@example.com',
+        toaddrs=['ops@example.com'], subject='Falha', window=30, queue_size=1
+    )
+    handler.close()  # sem worker, a fila enche
+    handler.queue = queue.Queue(maxsize=1)
+    record = logging.makeLogRecord({'levelno': logging.ERROR, 'msg': 'erro'})
+    for _ in range(3):
+        handler.emit(record)
+    assert handler.dropped == 2
+
+
+def test_error_digest_formats_in_the_worker_once_per_fingerprint():
+    threads = []
+
+    class RecordingFormatter(logging.Formatter):
+        def format(self, record):
+            threads.append(threading.current_thread().name)
+            return super().format(record)
+
+    handler = ErrorDigestHandler(
+        mailhost=('127.0.0.1', 9), fromaddr='app@example.com',
+        toaddrs=['ops@example.com'], subject='Falha', window=30, timeout=1
+    )
+    handler.setFormatter(RecordingFormatter())
+    handler.send = lambda message: None
+    logger = logging.getLogger('tests.error_digest_format')
+    logger.propagate = False
+    logger.addHandler(handler)
+    try:
+        for _ in range(5):
+            try:
+                raise ValueError('quebrou')
+            except ValueError:
+                logger.exception('Falha')
+    finally:
+        logger.removeHandler(handler)
+        handler.close()
+
+    # Só a primeira ocorrência é formatada, e fora da thread que registrou
+    assert threads == ['error-digest']
+    assert handler.sent == 1